@@ -25,10 +25,29 @@ async def lifespan(app: FastAPI):
     await init_data()
 
     # 启动图像生成 Worker（在主事件循环中运行）
-    from app.core.image_worker import worker_loop
+    # 独立部署 Worker（python worker.py）时设置 WORKER_EMBEDDED=false，API 进程只负责接收请求；
+    # 此时须同时设置 TASK_EVENTS_BACKEND=database，Worker 的推送和新任务通知才能跨进程送达
     import asyncio
 
-    asyncio.create_task(worker_loop())
+    background_jobs = []
+
+    # 跨进程事件（独立部署 Worker 时）：新任务通知写入事件表，转发 Worker 的 WebSocket 推送
+    from app.core import task_events
+
+    if task_events.is_enabled():
+        task_events.setup_api_process()
+        background_jobs.append(asyncio.create_task(task_events.relay_loop()))
+
+    if settings.WORKER_EMBEDDED:
+        from app.core.image_worker import worker_loop
+
+        background_jobs.append(asyncio.create_task(worker_loop()))
+
+        # 启动批量通道（非紧急任务合并提交 Gemini Batch API）
+        if settings.BATCH_LANE_ENABLED:
+            from app.core.batch_lane import batch_loop
+
+            background_jobs.append(asyncio.create_task(batch_loop()))
 
     # 启动 WebSocket 心跳
     from app.core.ws_manager import ws_manager
@@ -38,6 +57,11 @@ async def lifespan(app: FastAPI):
 
     yield
 
+    # 停止 Worker：等待处理中的任务完成，未完成的放回队列
+    for job in background_jobs:
+        job.cancel()
+    await asyncio.gather(*background_jobs, return_exceptions=True)
+
     # 关闭 WebSocket 心跳
     await ws_manager.stop_heartbeat()
     await Tortoise.close_connections()
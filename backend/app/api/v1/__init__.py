@@ -1,6 +1,6 @@
 from fastapi import APIRouter
 
-from app.core.dependency import DependPermission, DependAuth
+from app.core.dependency import DependPermission, DependAuth, DependScrape
 
 from .apis import apis_router
 from .auditlog import auditlog_router
@@ -10,6 +10,7 @@ from .depts import depts_router
 from .dicts import dicts_router
 
 from .menus import menus_router
+from .metrics import metrics_router
 from .oss import oss_router
 from .prompt_config import prompt_config_router
 from .recharge import recharge_router
@@ -31,6 +32,7 @@ v1_router.include_router(dicts_router, prefix="/dict", tags=["Dicts"], dependenc
 v1_router.include_router(apis_router, prefix="/api", tags=["Apis"], dependencies=[DependPermission])
 v1_router.include_router(customers_router, prefix="/customer", tags=["Customers"], dependencies=[DependPermission])
 v1_router.include_router(auditlog_router, prefix="/auditlog", tags=["AuditLog"], dependencies=[DependPermission])
+v1_router.include_router(metrics_router, prefix="/metrics", tags=["Metrics"], dependencies=[DependScrape])
 
 # 业务路由
 v1_router.include_router(tasks_router, prefix="/tasks", tags=["Tasks"], dependencies=[DependAuth])
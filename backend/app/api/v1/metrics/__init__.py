@@ -0,0 +1,8 @@
+from fastapi import APIRouter
+
+from .metrics import router
+
+metrics_router = APIRouter()
+metrics_router.include_router(router, tags=["指标模块"])
+
+__all__ = ["metrics_router"]
@@ -0,0 +1,18 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.image_worker import refresh_queue_metrics
+from app.core.metrics import registry
+
+router = APIRouter()
+
+
+@router.get("/", summary="Prometheus 指标", response_class=PlainTextResponse)
+async def get_metrics():
+    """各阶段耗时直方图、队列深度、处理中任务数、重试次数等（Prometheus 文本格式）
+
+    耗时、重试和 in-flight 为当前进程的统计（独立 Worker 进程的统计见 WORKER_METRICS_PORT）；
+    队列深度和 processing 任务数从数据库实时查询。
+    """
+    await refresh_queue_metrics()
+    return PlainTextResponse(registry.render(), media_type="text/plain; version=0.0.4")
@@ -1,16 +1,36 @@
-from fastapi import APIRouter, HTTPException
+import json
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Query, Response
 from fastapi.encoders import jsonable_encoder
 
 from app.models.prompt_config import PromptConfigGroup, PromptConfigOption, PromptConfigSetting
 from app.schemas.prompt_config import (
     PromptConfigGroupCreate, PromptConfigGroupUpdate, PromptConfigGroupResponse,
     PromptConfigOptionCreate, PromptConfigOptionUpdate, PromptConfigOptionResponse,
-    PromptConfigSettingCreate, PromptConfigSettingResponse
+    PromptConfigSettingCreate, PromptConfigSettingResponse,
+    PromptPreviewRequest, PromptPreviewResponse
 )
 from app.schemas import Success, SuccessExtra
+from app.services.prompt_assembler import PromptAssembler
+from app.services.prompt_catalog import get_catalog_payload, get_prompt_catalog, invalidate_prompt_catalog
+from app.utils.etag import etag_matches, make_etag
 
 router = APIRouter()
 
+# --- Catalog ---
+
+
+@router.get("/catalog", summary="获取完整配置目录（启用的配置组及选项）")
+async def get_catalog(if_none_match: Optional[str] = Header(None, alias="If-None-Match")):
+    """一次返回所有启用的配置组及其选项，响应体按目录修订号缓存；目录未变化时返回 304"""
+    payload = await get_catalog_payload()
+    headers = {"ETag": payload.etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, payload.etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=payload.body, media_type="application/json", headers=headers)
+
+
 # --- Groups ---
 
 
@@ -30,6 +50,7 @@ async def get_groups(is_active: bool = True, config_type: str = None):
 @router.post("/groups", summary="创建配置组")
 async def create_group(data: PromptConfigGroupCreate):
     obj = await PromptConfigGroup.create(**data.model_dump())
+    invalidate_prompt_catalog()
     return Success(data=jsonable_encoder(PromptConfigGroupResponse.model_validate(obj).model_dump()))
 
 
@@ -40,6 +61,7 @@ async def update_group(id: int, data: PromptConfigGroupUpdate):
         raise HTTPException(status_code=404, detail="配置组不存在")
     await obj.update_from_dict(data.model_dump(exclude_unset=True))
     await obj.save()
+    invalidate_prompt_catalog()
     return Success(data=jsonable_encoder(PromptConfigGroupResponse.model_validate(obj).model_dump()))
 
 
@@ -60,6 +82,7 @@ async def get_options(group_id: int, is_active: bool = True):
 @router.post("/options", summary="创建配置选项")
 async def create_option(data: PromptConfigOptionCreate):
     obj = await PromptConfigOption.create(**data.model_dump())
+    invalidate_prompt_catalog()
     return Success(data=jsonable_encoder(PromptConfigOptionResponse.model_validate(obj).model_dump()))
 
 
@@ -70,6 +93,7 @@ async def update_option(id: int, data: PromptConfigOptionUpdate):
         raise HTTPException(status_code=404, detail="配置选项不存在")
     await obj.update_from_dict(data.model_dump(exclude_unset=True))
     await obj.save()
+    invalidate_prompt_catalog()
     return Success(data=jsonable_encoder(PromptConfigOptionResponse.model_validate(obj).model_dump()))
 
 
@@ -104,6 +128,7 @@ async def create_setting(data: PromptConfigSettingCreate):
     if existing:
         raise HTTPException(status_code=400, detail="配置 key 已存在")
     obj = await PromptConfigSetting.create(**data.model_dump())
+    invalidate_prompt_catalog()
     return Success(data=jsonable_encoder(PromptConfigSettingResponse.model_validate(obj).model_dump()))
 
 
@@ -117,6 +142,7 @@ async def update_setting(id: int, data: PromptConfigSettingCreate):
         raise HTTPException(status_code=403, detail="该配置不可编辑")
     await obj.update_from_dict(data.model_dump(exclude_unset=True))
     await obj.save()
+    invalidate_prompt_catalog()
     return Success(data=jsonable_encoder(PromptConfigSettingResponse.model_validate(obj).model_dump()))
 
 
@@ -129,4 +155,46 @@ async def delete_setting(id: int):
     if not obj.is_editable:
         raise HTTPException(status_code=403, detail="该配置不可删除")
     await obj.delete()
+    invalidate_prompt_catalog()
     return Success(msg="删除成功")
+
+
+# --- Preview ---
+
+
+@router.get("/preview", summary="预览组装后的提示词")
+async def preview_prompt(
+    task_type: str = Query("tryon", description="任务类型 tryon/model/detail"),
+    prompt_configs: str = Query("{}", description='动态配置 JSON，如 {"style": ["street"]}'),
+    prompt: Optional[str] = Query(None, description="用户自定义提示词"),
+    if_none_match: Optional[str] = Header(None, alias="If-None-Match"),
+):
+    """按当前配置目录组装提示词但不创建任务，供配置页面实时预览
+
+    使用 GET 以便按标准 HTTP 缓存语义重新验证：ETag 由目录内容哈希和请求参数计算，
+    配置与选择都未变化时返回 304，不再组装。
+    """
+    try:
+        data = PromptPreviewRequest(task_type=task_type, prompt_configs=json.loads(prompt_configs), prompt=prompt)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="prompt_configs 须为 JSON 对象 {group_key: [option_key, ...]}")
+
+    catalog = await get_prompt_catalog()
+    etag = make_etag(
+        catalog.fingerprint,
+        json.dumps(data.model_dump(), ensure_ascii=False, sort_keys=True, separators=(",", ":")),
+    )
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=304, headers=headers)
+
+    assembled = PromptAssembler(data.task_type).assemble_with(catalog, data.prompt_configs, data.prompt)
+    response = Success(
+        data=PromptPreviewResponse(
+            positive_prompt=assembled.positive_prompt,
+            negative_prompt=assembled.negative_prompt,
+            raw_selections=assembled.raw_selections,
+        ).model_dump()
+    )
+    response.headers.update(headers)
+    return response
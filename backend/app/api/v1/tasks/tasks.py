@@ -1,33 +1,74 @@
 import uuid
 from datetime import datetime
 from typing import Optional
-from fastapi import APIRouter, HTTPException, Depends, Query
-from app.models.generation_task import GenerationTask, TaskTryon, TaskDetail, TaskModel, TaskType, TaskStatus
+from fastapi import APIRouter, HTTPException, Depends, Header, Query
+from tortoise.exceptions import IntegrityError
+from app.models.generation_task import GenerationTask, TaskTryon, TaskDetail, TaskModel, TaskType, TaskStatus, TaskLane
 from app.models.template import DetailTemplate
 from app.schemas.generation_task import CreateTaskRequest, GenerationTaskResponse, TaskListResponse
 from app.schemas.base import Success, SuccessExtra
 from app.core.dependency import AuthControl
+from app.core.task_notifier import get_task_notifier
+from app.core.task_queue import cancel_task as cancel_queued_task, queue_position
+from app.core.ws_manager import ws_manager
+from app.core.task_scheduler import task_priority
 from app.models import User
+from app.settings.config import settings
 
 router = APIRouter()
 
 
+def _with_relations(query):
+    return query.prefetch_related("tryon", "detail", "detail__template", "model_gen")
+
+
+async def _find_by_idempotency_key(user_id: str, idempotency_key: str) -> Optional[GenerationTask]:
+    return await _with_relations(GenerationTask.filter(user_id=user_id, idempotency_key=idempotency_key)).first()
+
+
 @router.post("/generate", summary="创建生成任务")
-async def create_task(request: CreateTaskRequest, current_user: User = Depends(AuthControl.is_authed)):
+async def create_task(
+    request: CreateTaskRequest,
+    current_user: User = Depends(AuthControl.is_authed),
+    idempotency_key: Optional[str] = Header(
+        None, alias="Idempotency-Key", max_length=64, description="幂等键，重复提交时返回已创建的任务"
+    ),
+):
+    user_id = str(current_user.id)
+
+    # 0. 幂等：同一用户相同幂等键的重复提交（如客户端超时重试）直接返回已创建的任务
+    if idempotency_key:
+        existing = await _find_by_idempotency_key(user_id, idempotency_key)
+        if existing:
+            return Success(data=GenerationTaskResponse.model_validate(existing))
+
     # 1. 创建主任务
     task_id = uuid.uuid4()
-    task = await GenerationTask.create(
-        id=task_id,
-        user_id=str(current_user.id),
-        task_type=request.task_type,
-        status=TaskStatus.QUEUED,
-        prompt=request.prompt,
-        prompt_configs=request.prompt_configs,
-        aspect_ratio=request.aspect_ratio,
-        quality=request.quality,
-        platform=request.platform,
-        started_at=datetime.utcnow(),  # 假设直接开始处理
-    )
+    try:
+        task = await GenerationTask.create(
+            id=task_id,
+            user_id=user_id,
+            task_type=request.task_type,
+            status=TaskStatus.QUEUED,
+            priority=task_priority(request.task_type, current_user),
+            lane=request.lane if settings.BATCH_LANE_ENABLED else TaskLane.INTERACTIVE,
+            use_cache=request.use_cache,
+            idempotency_key=idempotency_key,
+            prompt=request.prompt,
+            prompt_configs=request.prompt_configs,
+            aspect_ratio=request.aspect_ratio,
+            quality=request.quality,
+            platform=request.platform,
+            started_at=datetime.utcnow(),  # 假设直接开始处理
+        )
+    except IntegrityError:
+        # 并发的重复提交已抢先创建；没有幂等键时与幂等无关，直接抛出
+        if not idempotency_key:
+            raise
+        existing = await _find_by_idempotency_key(user_id, idempotency_key)
+        if not existing:
+            raise
+        return Success(data=GenerationTaskResponse.model_validate(existing))
 
     # 2. 创建子任务
     try:
@@ -64,14 +105,19 @@ async def create_task(request: CreateTaskRequest, current_user: User = Depends(A
     # 重新查询以返回完整数据 (包含反向关联)
     # Tortoise ORM 需要 fetch_related 获取关联数据
     # 这里为了返回 response 结构，再次查询
-    created_task = (
-        await GenerationTask.filter(id=task_id)
-        .prefetch_related("tryon", "detail", "detail__template", "model_gen")
-        .first()
+    created_task = await _with_relations(GenerationTask.filter(id=task_id)).first()
+
+    # 推送排队位置（在唤醒 Worker 之前，保证先于 processing 到达）
+    await ws_manager.push_task_update(
+        user_id=user_id,
+        task_id=str(task_id),
+        status=TaskStatus.QUEUED.value,
+        stage="queued",
+        details={"queue_position": await queue_position(created_task)},
     )
 
-    # 实际项目中这里应该触发 Celery/Redis 队列
-    # trigger_background_job(created_task)
+    # 唤醒 Worker 立即认领新任务
+    await get_task_notifier().notify(str(task_id))
 
     return Success(data=GenerationTaskResponse.model_validate(created_task))
 
@@ -118,13 +164,41 @@ async def get_task(task_id: str, current_user: User = Depends(AuthControl.is_aut
     return Success(data=GenerationTaskResponse.model_validate(task))
 
 
+async def _cancel(task: GenerationTask, reason: str) -> bool:
+    """取消未结束的任务并推送通知；正在处理的任务由 Worker 续约时发现并中止"""
+    if not await cancel_queued_task(task, reason):
+        return False
+    await ws_manager.push_task_update(
+        user_id=task.user_id,
+        task_id=str(task.id),
+        status=TaskStatus.CANCELLED.value,
+        error=task.error,
+        finished_at=task.finished_at.isoformat(),
+    )
+    return True
+
+
+@router.post("/{task_id}/cancel", summary="取消任务")
+async def cancel_task(task_id: str, current_user: User = Depends(AuthControl.is_authed)):
+    task = await GenerationTask.get_or_none(id=task_id, user_id=str(current_user.id), is_deleted=False)
+    if not task:
+        raise HTTPException(status_code=404, detail="Task not found")
+
+    if not await _cancel(task, "Cancelled by user"):
+        raise HTTPException(status_code=400, detail="Task already finished")
+
+    task = await _with_relations(GenerationTask.filter(id=task.id)).first()
+    return Success(data=GenerationTaskResponse.model_validate(task))
+
+
 @router.delete("/{task_id}", summary="删除任务 (软删除)")
 async def delete_task(task_id: str, current_user: User = Depends(AuthControl.is_authed)):
     task = await GenerationTask.get_or_none(id=task_id, user_id=str(current_user.id))
     if not task:
         raise HTTPException(status_code=404, detail="Task not found")
 
-    task.is_deleted = True
-    await task.save()
+    # 未结束的任务先取消，不再为已删除的任务生成图片
+    await _cancel(task, "Task deleted")
+    await GenerationTask.filter(id=task.id).update(is_deleted=True)
 
     return Success(msg="Deleted successfully (soft delete)")
@@ -0,0 +1,243 @@
+"""
+批量通道（Gemini Batch API）
+
+创建任务时标记为 batch 通道的非紧急任务（如按模版批量生成的详情页）不进入实时 Worker，
+由这里合并提交为 Gemini 批量任务（半价，24 小时内完成）：
+
+1. 收集：batch 通道积压达到 BATCH_LANE_MIN_SIZE，或最早的任务等待超过 BATCH_LANE_MAX_WAIT_SECONDS 时，
+   认领最多 BATCH_LANE_MAX_SIZE 个任务，上传参考图后提交一个批量任务，任务记录 batch_job 并释放租约
+2. 轮询：定期查询未完成的批量任务，结束后把每个请求的结果上传 OSS、写回对应任务并通过 WebSocket 推送
+
+批量任务整体失败 / 过期时，任务重新入队（执行次数达到上限则标记失败）。
+多个进程同时轮询时，写回每个任务前先通过条件 UPDATE 给它加租约，只有加成功的进程负责写回该任务的结果。
+"""
+
+import asyncio
+from typing import Any, Dict, List, Optional
+
+from tortoise import timezone
+
+from app.core.image_client import (
+    BATCH_FAILURE_STATES,
+    BATCH_SUCCESS_STATES,
+    BatchImageClient,
+    get_image_client,
+)
+from app.core.image_worker import complete_task, fail_task, prepare_tasks_inputs
+from app.core.task_queue import WORKER_ID, claim_tasks, lease_deadline, release_tasks
+from app.core.ws_manager import ws_manager
+from app.models.generation_task import GenerationTask, TaskLane, TaskStatus
+from app.settings.config import settings
+
+# 批量通道配置
+CONFIG = {
+    "min_size": settings.BATCH_LANE_MIN_SIZE,  # 积压达到该数量立即提交
+    "max_size": settings.BATCH_LANE_MAX_SIZE,  # 单个批量任务最多请求数
+    "max_wait": settings.BATCH_LANE_MAX_WAIT_SECONDS,  # 最早任务最长等待（秒）
+    "poll_interval": settings.BATCH_LANE_POLL_SECONDS,  # 收集与查询状态的间隔（秒）
+    "max_attempts": settings.IMAGE_WORKER_MAX_ATTEMPTS,  # 批量任务整体失败后最多重新提交次数
+}
+
+# 进程级 BatchImageClient（懒加载）
+_batch_client: Optional[BatchImageClient] = None
+
+
+def get_batch_client() -> BatchImageClient:
+    """获取进程级共享的 BatchImageClient"""
+    global _batch_client
+    if _batch_client is None:
+        _batch_client = BatchImageClient()
+    return _batch_client
+
+
+def _request_key(task: GenerationTask) -> str:
+    return str(task.id)
+
+
+async def should_submit() -> bool:
+    """判断是否该提交批量任务：积压足够多，或最早的任务已等待太久"""
+    query = GenerationTask.filter(status=TaskStatus.QUEUED, lane=TaskLane.BATCH)
+    if await query.count() >= CONFIG["min_size"]:
+        return True
+    oldest = await query.order_by("created_at").first()
+    if oldest is None:
+        return False
+    return (timezone.now() - oldest.created_at).total_seconds() >= CONFIG["max_wait"]
+
+
+async def _build_request(
+    client: BatchImageClient, index: int, task: GenerationTask, prompt: str, reference_images: List[str]
+):
+    """上传参考图，构建任务对应的批量请求项"""
+    reference_files = await get_image_client()._aprepare_references(reference_images, verbose=False)
+    return client._build_request_item(
+        prompt,
+        index,
+        aspect_ratio=task.aspect_ratio or "1:1",
+        resolution=task.quality or "1K",
+        reference_files=reference_files,
+        key=_request_key(task),
+    )
+
+
+async def submit_batch() -> Optional[str]:
+    """认领 batch 通道的任务并提交为一个批量任务
+
+    Returns:
+        批量任务名称；没有任务或提交失败时返回 None
+    """
+    tasks = await claim_tasks(CONFIG["max_size"], lane=TaskLane.BATCH)
+    if not tasks:
+        return None
+
+    client = get_batch_client()
+    try:
+        inputs = await prepare_tasks_inputs(tasks)
+    except Exception as e:
+        print(f"[BatchLane] Prepare inputs failed: {e}")
+        await _requeue_or_fail(tasks, "PREPARE_FAILED", str(e))
+        return None
+
+    # 单个任务准备失败（如参考图失效、上传超时）不影响其余任务提交；
+    # 失败的任务不退还执行次数，反复失败的任务最终标记失败，不会一直卡住批量通道
+    built = await asyncio.gather(
+        *(
+            _build_request(client, i, task, prompt, reference_images)
+            for i, (task, (prompt, reference_images)) in enumerate(zip(tasks, inputs))
+        ),
+        return_exceptions=True,
+    )
+    requests = []
+    for task, item in zip(list(tasks), built):
+        if isinstance(item, Exception):
+            print(f"[BatchLane] Task {task.id} prepare failed: {item}")
+            await _requeue_or_fail([task], "PREPARE_FAILED", str(item))
+            tasks.remove(task)
+        else:
+            requests.append(item)
+    if not tasks:
+        return None
+
+    try:
+        submitted = await client.asubmit_requests(requests, display_name=f"tasks_{tasks[0].id.hex[:8]}")
+    except Exception as e:
+        submitted = {"status": "error", "error": str(e)}
+
+    if submitted["status"] != "success":
+        # 提交本身失败（配额、网络等）与任务无关，放回队列并退还执行次数
+        print(f"[BatchLane] Submit failed: {submitted['error']}")
+        await release_tasks(tasks)
+        return None
+
+    batch_name = submitted["batch_name"]
+    # 等待 Gemini 处理期间不持有租约（可能长达 24 小时），由 batch_job 标识任务去向
+    await GenerationTask.filter(id__in=[task.id for task in tasks], worker_id=WORKER_ID).update(
+        batch_job=batch_name, lease_expires_at=None
+    )
+    print(f"[BatchLane] Submitted {len(tasks)} tasks as {batch_name}")
+
+    for task in tasks:
+        await ws_manager.push_task_update(user_id=task.user_id, task_id=str(task.id), status="processing")
+    return batch_name
+
+
+async def _take_over(task: GenerationTask, batch_name: str) -> bool:
+    """给批量任务下未结束的单个任务加租约，成功时由本进程负责写回它的结果
+
+    写回前逐个加租约：一次性给所有任务加租约时，写回耗时超过租约时长会被回收，结果被丢弃。
+    """
+    lease_expires_at = lease_deadline()
+    updated = await GenerationTask.filter(
+        id=task.id, batch_job=batch_name, status=TaskStatus.PROCESSING, lease_expires_at__isnull=True
+    ).update(worker_id=WORKER_ID, lease_expires_at=lease_expires_at)
+    if updated:
+        task.worker_id = WORKER_ID
+        task.lease_expires_at = lease_expires_at
+    return bool(updated)
+
+
+async def _requeue_or_fail(tasks: List[GenerationTask], code: str, message: str):
+    """任务重新入队（不退还执行次数），执行次数达到上限的标记失败"""
+    for task in tasks:
+        if task.attempts >= CONFIG["max_attempts"]:
+            await fail_task(task, {"code": code, "message": message})
+        else:
+            await release_tasks([task], refund_attempt=False)
+
+
+async def apply_batch_results(batch_name: str, job: Dict[str, Any]) -> int:
+    """把已结束的批量任务结果写回对应任务
+
+    Returns:
+        处理的任务数
+    """
+    tasks = await GenerationTask.filter(
+        batch_job=batch_name, status=TaskStatus.PROCESSING, lease_expires_at__isnull=True
+    )
+    failed = job["state"] in BATCH_FAILURE_STATES
+    if failed:
+        print(f"[BatchLane] {batch_name} ended with {job['state']}")
+
+    results = {item["key"]: item for item in job.get("results") or []}
+    applied = 0
+    for task in tasks:
+        # 其他进程已接手的任务跳过
+        if not await _take_over(task, batch_name):
+            continue
+        applied += 1
+        item = results.get(_request_key(task))
+        if failed:
+            await _requeue_or_fail([task], "BATCH_FAILED", f"Batch job ended with state {job['state']}")
+        elif item is None:
+            await fail_task(task, {"code": "BATCH_RESULT_MISSING", "message": f"No result in {batch_name}"})
+        elif item["status"] == "success":
+            await complete_task(task, item["image_data"])
+        else:
+            await fail_task(task, {"code": "GENERATION_FAILED", "message": item.get("error"), "kind": "permanent"})
+    if applied and not failed:
+        print(f"[BatchLane] Applied {applied} results from {batch_name}")
+    return applied
+
+
+async def poll_batches() -> int:
+    """查询所有未完成的批量任务，写回已结束的结果
+
+    Returns:
+        写回结果的任务数
+    """
+    batch_names = (
+        await GenerationTask.filter(
+            status=TaskStatus.PROCESSING, batch_job__isnull=False, lease_expires_at__isnull=True
+        )
+        .distinct()
+        .values_list("batch_job", flat=True)
+    )
+
+    applied = 0
+    for batch_name in batch_names:
+        job = await get_batch_client().aget_batch_job(batch_name)
+        if job["status"] != "success":
+            print(f"[BatchLane] Failed to query {batch_name}: {job['error']}")
+            continue
+        if job["state"] in BATCH_SUCCESS_STATES or job["state"] in BATCH_FAILURE_STATES:
+            applied += await apply_batch_results(batch_name, job)
+    return applied
+
+
+async def batch_loop():
+    """批量通道主循环：定期收集提交、查询结果"""
+    print(f"[BatchLane] Started (min_size={CONFIG['min_size']}, max_wait={CONFIG['max_wait']}s)")
+
+    while True:
+        try:
+            while await should_submit():
+                if not await submit_batch():
+                    break
+            await poll_batches()
+            await asyncio.sleep(CONFIG["poll_interval"])
+        except asyncio.CancelledError:
+            print("[BatchLane] Stopping...")
+            break
+        except Exception as e:
+            print(f"[BatchLane] Error: {e}")
+            await asyncio.sleep(CONFIG["poll_interval"])
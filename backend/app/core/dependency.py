@@ -4,6 +4,7 @@ import jwt
 from fastapi import Depends, Header, HTTPException, Request
 
 from app.core.ctx import CTX_USER_ID
+from app.core.metrics_server import is_valid_scrape_token
 from app.models import Role, User
 from app.settings import settings
 
@@ -70,5 +71,24 @@ class PermissionControl:
             raise HTTPException(status_code=403, detail=f"Permission denied method:{method} path:{path}")
 
 
+class ScrapeControl:
+    @classmethod
+    async def is_allowed(
+        cls,
+        authorization: Optional[str] = Header(None, description="Authorization: Bearer <METRICS_TOKEN>"),
+    ) -> None:
+        """
+        指标抓取认证（Prometheus 等抓取端没有用户 JWT）
+
+        只接受静态令牌 METRICS_TOKEN，未配置时接口关闭。不按来源地址放行：
+        经 nginx 反向代理（deploy/web.conf）的请求来源都是 127.0.0.1，按本机放行等于对外公开。
+        """
+        if not settings.METRICS_TOKEN:
+            raise HTTPException(status_code=403, detail="Metrics are disabled, set METRICS_TOKEN to enable scraping")
+        if not is_valid_scrape_token(authorization):
+            raise HTTPException(status_code=401, detail="Invalid scrape token")
+
+
 DependAuth = Depends(AuthControl.is_authed)
 DependPermission = Depends(PermissionControl.has_permission)
+DependScrape = Depends(ScrapeControl.is_allowed)
@@ -13,12 +13,19 @@ Batch API:
     - 适合离线批量处理
 """
 
-import json
+import asyncio
+import hashlib
+import io
+import struct
 import os
 import sys
+import threading
 import time
+from collections import OrderedDict
+from datetime import datetime
+from email.utils import parsedate_to_datetime
 from pathlib import Path
-from typing import Optional, Dict, Any, List
+from typing import Optional, Dict, Any, Awaitable, Callable, List, Tuple, Union
 from enum import Enum
 import uuid
 
@@ -26,6 +33,7 @@ import httpx
 
 try:
     from google import genai
+    from google.genai import errors as genai_errors
     from google.genai import types
 except ImportError:
     print("Error: google-genai package not installed")
@@ -37,6 +45,14 @@ try:
 except ImportError:
     load_dotenv = None
 
+try:
+    from app.core.metrics import StageTimer, registry as metrics_registry
+    from app.core.rate_limiter import get_rate_limiter
+except ImportError:
+    # 作为脚本直接运行时 app 包不在 sys.path 中
+    from metrics import StageTimer, registry as metrics_registry
+    from rate_limiter import get_rate_limiter
+
 
 class AspectRatio(str, Enum):
     """支持的宽高比"""
@@ -93,10 +109,24 @@ ASPECT_RATIO_MAP = {
 }
 
 
-def load_dotenv_files() -> bool:
-    """加载所有可能的 .env 文件"""
+# .env 是否已加载（进程内只加载一次）
+_dotenv_loaded = False
+
+# Gemini / 参考图下载共用的 HTTP 连接池配置
+HTTP_POOL_LIMITS = httpx.Limits(
+    max_connections=int(os.getenv("GEMINI_MAX_CONNECTIONS", "20")),
+    max_keepalive_connections=int(os.getenv("GEMINI_MAX_KEEPALIVE_CONNECTIONS", "10")),
+    keepalive_expiry=60.0,
+)
+
+
+def load_dotenv_files(force: bool = False) -> bool:
+    """加载所有可能的 .env 文件（默认只在进程内首次调用时加载）"""
+    global _dotenv_loaded
     if not load_dotenv:
         return False
+    if _dotenv_loaded and not force:
+        return True
 
     script_dir = Path(__file__).parent
     for env_file in [
@@ -108,6 +138,7 @@ def load_dotenv_files() -> bool:
     ]:
         if env_file.exists():
             load_dotenv(env_file)
+    _dotenv_loaded = True
     return True
 
 
@@ -152,6 +183,208 @@ def get_mime_type(file_path: str) -> str:
     return mime_types.get(ext, "application/octet-stream")
 
 
+def get_image_extension(mime_type: Optional[str]) -> str:
+    """根据图片 MIME 类型获取文件扩展名，未知类型按 PNG 处理"""
+    extensions = {
+        "image/jpeg": ".jpg",
+        "image/png": ".png",
+        "image/webp": ".webp",
+        "image/heic": ".heic",
+        "image/heif": ".heif",
+    }
+    return extensions.get((mime_type or "").lower(), ".png")
+
+
+def read_image_size(data: bytes) -> Tuple[int, int]:
+    """读取图片宽高
+
+    PNG 直接解析 IHDR 头（不解码像素），其他格式交给 PIL 懒加载读取头信息。
+    无法识别时返回 (0, 0)。
+    """
+    if data[:8] == b"\x89PNG\r\n\x1a\n" and data[12:16] == b"IHDR":
+        width, height = struct.unpack(">II", data[16:24])
+        return width, height
+    try:
+        from PIL import Image
+
+        with Image.open(io.BytesIO(data)) as img:
+            return img.size
+    except Exception:
+        return 0, 0
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """从 API 错误中提取建议的重试等待时间（秒）
+
+    优先使用 Retry-After 响应头，其次使用错误详情中的 RetryInfo.retryDelay（如 "30s"）。
+    """
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return max(0.0, float(value))
+            except ValueError:
+                try:
+                    return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+                except (TypeError, ValueError):
+                    pass
+
+    details = getattr(error, "details", None)
+    if isinstance(details, dict):
+        for item in (details.get("error") or {}).get("details") or []:
+            delay = item.get("retryDelay") if isinstance(item, dict) else None
+            if isinstance(delay, str) and delay.endswith("s"):
+                try:
+                    return max(0.0, float(delay[:-1]))
+                except ValueError:
+                    pass
+    return None
+
+
+# 参考图文件在远端失效（过期被删除、不存在或尚未就绪）时的错误信息特征
+REFERENCE_FILE_ERROR_MARKERS = (
+    "not found",
+    "not_found",
+    "expired",
+    "may not exist",
+    "does not exist",
+    "not in an active state",
+)
+
+
+def is_reference_file_error(error: Exception) -> bool:
+    """请求是否因引用的参考图文件失效而被拒绝
+
+    只认与文件相关的 4xx 错误：参数错误、无权限等其他 4xx 重新上传参考图也不会成功。
+    """
+    if not isinstance(error, genai_errors.ClientError) or error.code == 429:
+        return False
+    message = str(error).lower()
+    return "file" in message and any(marker in message for marker in REFERENCE_FILE_ERROR_MARKERS)
+
+
+def content_digest(data: bytes) -> str:
+    """计算内容哈希（sha256 十六进制）"""
+    return hashlib.sha256(data).hexdigest()
+
+
+class ReferenceFileCache:
+    """已上传到 Gemini 文件服务的参考图缓存
+
+    以内容哈希为主键保存文件对象，并记录 URL -> 内容哈希 的映射：
+    - 相同 URL 再次出现时跳过下载和上传
+    - 不同 URL 但内容相同时跳过上传
+
+    条目过期时间取 ttl_seconds 与远端文件 expiration_time（提前 expiry_margin 秒）中较早者，
+    超过 max_entries 时按 LRU 淘汰。
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 512,
+        ttl_seconds: float = 24 * 3600,
+        expiry_margin: float = 600,
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.expiry_margin = expiry_margin
+        # digest -> (文件对象, 过期时间戳, 关联的 URL 集合)
+        self._entries: "OrderedDict[str, Tuple[Any, float, set]]" = OrderedDict()
+        self._urls: Dict[str, str] = {}
+        # 同步路径可能在多个线程中使用
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _expires_at(self, file_obj: Any) -> float:
+        expires_at = time.time() + self.ttl_seconds
+        remote_expiry = getattr(file_obj, "expiration_time", None)
+        if isinstance(remote_expiry, datetime):
+            expires_at = min(expires_at, remote_expiry.timestamp() - self.expiry_margin)
+        return expires_at
+
+    def _get(self, digest: str) -> Optional[Any]:
+        entry = self._entries.get(digest)
+        if entry is None:
+            return None
+        file_obj, expires_at, _ = entry
+        if expires_at <= time.time():
+            self._remove(digest)
+            return None
+        self._entries.move_to_end(digest)
+        return file_obj
+
+    def _remove(self, digest: str):
+        entry = self._entries.pop(digest, None)
+        if entry is not None:
+            for url in entry[2]:
+                if self._urls.get(url) == digest:
+                    del self._urls[url]
+
+    def get_by_url(self, url: str) -> Optional[Any]:
+        """按 URL 查找已上传的文件对象"""
+        with self._lock:
+            digest = self._urls.get(url)
+            return self._get(digest) if digest else None
+
+    def digest_of(self, url: str) -> Optional[str]:
+        """已缓存 URL 对应的内容哈希"""
+        with self._lock:
+            return self._urls.get(url)
+
+    def get_by_digest(self, digest: str, url: Optional[str] = None) -> Optional[Any]:
+        """按内容哈希查找已上传的文件对象，命中时记录 URL 别名"""
+        with self._lock:
+            file_obj = self._get(digest)
+            if file_obj is not None and url:
+                self._urls[url] = digest
+                self._entries[digest][2].add(url)
+            return file_obj
+
+    def put(self, digest: str, file_obj: Any, url: Optional[str] = None):
+        """缓存上传后的文件对象"""
+        expires_at = self._expires_at(file_obj)
+        if expires_at <= time.time():
+            return
+        with self._lock:
+            urls = self._entries[digest][2] if digest in self._entries else set()
+            if url:
+                urls.add(url)
+                self._urls[url] = digest
+            self._entries[digest] = (file_obj, expires_at, urls)
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def invalidate(self, file_names: List[str]) -> int:
+        """移除指定远端文件名（file_obj.name）对应的条目，返回移除的条目数"""
+        names = set(file_names)
+        with self._lock:
+            digests = [d for d, (f, _, _) in self._entries.items() if getattr(f, "name", None) in names]
+            for digest in digests:
+                self._remove(digest)
+        return len(digests)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._urls.clear()
+
+
+# 参考图下载 / 上传到 Gemini 文件服务的耗时（进程级，不区分任务）
+REFERENCE_STEP_SECONDS = metrics_registry.histogram(
+    "image_reference_step_seconds", "Reference image download / Gemini upload duration", ["step"]
+)
+
+
+# 批量任务终态（BatchImageClient._job_state 的取值）
+BATCH_SUCCESS_STATES = ("SUCCEEDED", "PARTIALLY_SUCCEEDED")
+BATCH_FAILURE_STATES = ("FAILED", "CANCELLED", "EXPIRED")
+
+
 class BatchImageClient:
     """Gemini Batch API 图像生成客户端（50% 价格，24小时内完成）"""
 
@@ -186,19 +419,84 @@ class BatchImageClient:
         task_index: int,
         aspect_ratio: str = "1:1",
         resolution: str = "1K",
+        reference_files: Optional[List[Any]] = None,
+        key: Optional[str] = None,
+    ) -> types.InlinedRequest:
+        """构建单个内联请求项
+
+        Args:
+            reference_files: 已上传到 Gemini 文件服务的参考图（File 对象）
+            key: 请求标识，写入 metadata，结果中按此对应回原请求；默认 task_{task_index}
+        """
+        parts = [types.Part(text=prompt)]
+        for file in reference_files or []:
+            parts.append(types.Part.from_uri(file_uri=file.uri, mime_type=file.mime_type))
+
+        return types.InlinedRequest(
+            contents=[types.Content(role="user", parts=parts)],
+            config=ImageClient._build_config(aspect_ratio),
+            metadata={"key": key or f"task_{task_index}"},
+        )
+
+    def submit_requests(
+        self,
+        requests: List[types.InlinedRequest],
+        display_name: Optional[str] = None,
+        verbose: bool = False,
     ) -> Dict[str, Any]:
-        """构建单个请求项（JSONL 格式）"""
+        """提交内联请求列表为一个批量任务
+
+        Returns:
+            包含 batch_name 的字典
+        """
+        try:
+            batch_job = self.client.batches.create(
+                model=self.model,
+                src=requests,
+                config=types.CreateBatchJobConfig(display_name=display_name or f"batch_{uuid.uuid4().hex[:8]}"),
+            )
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e),
+            }
+
+        if verbose:
+            print(f"Batch job created: {batch_job.name}")
+            print(f"Task count: {len(requests)}")
+
         return {
-            "id": f"task_{task_index}",
-            "request": {
-                "contents": [{"parts": [{"text": prompt}]}],
-                "generationConfig": {
-                    "responseModalities": ["Image"],
-                    "imageConfig": {
-                        "aspectRatio": aspect_ratio,
-                    },
-                },
-            },
+            "status": "success",
+            "batch_name": batch_job.name,
+            "task_count": len(requests),
+        }
+
+    async def asubmit_requests(
+        self,
+        requests: List[types.InlinedRequest],
+        display_name: Optional[str] = None,
+        verbose: bool = False,
+    ) -> Dict[str, Any]:
+        """提交批量任务（异步），参数与返回值同 submit_requests"""
+        try:
+            batch_job = await self.client.aio.batches.create(
+                model=self.model,
+                src=requests,
+                config=types.CreateBatchJobConfig(display_name=display_name or f"batch_{uuid.uuid4().hex[:8]}"),
+            )
+        except Exception as e:
+            return {
+                "status": "error",
+                "error": str(e),
+            }
+
+        if verbose:
+            print(f"Batch job created: {batch_job.name} ({len(requests)} requests)")
+
+        return {
+            "status": "success",
+            "batch_name": batch_job.name,
+            "task_count": len(requests),
         }
 
     def create_batch_job(
@@ -219,57 +517,31 @@ class BatchImageClient:
         Returns:
             包含 batch_name 和任务信息的字典
         """
-        # 构建请求项
-        requests = []
-        for i, prompt in enumerate(prompts):
-            requests.append(self._build_request_item(prompt, i, aspect_ratio, resolution))
-
-        # 创建临时输入文件
-        input_file = Path("/tmp") / f"batch_input_{uuid.uuid4().hex[:8]}.jsonl"
-        with open(input_file, "w", encoding="utf-8") as f:
-            for req in requests:
-                f.write(json.dumps(req, ensure_ascii=False) + "\n")
+        requests = [self._build_request_item(prompt, i, aspect_ratio, resolution) for i, prompt in enumerate(prompts)]
+        return self.submit_requests(requests, verbose=verbose)
 
-        try:
-            # 调用 Batch API
-            batch_job = self.client.models.batch_create_content(
-                model=self.model,
-                requests=requests,
-            )
-
-            result = {
-                "status": "success",
-                "batch_name": batch_job.name,
-                "input_file": str(input_file),
-                "task_count": len(prompts),
-            }
-
-            if verbose:
-                print(f"Batch job created: {batch_job.name}")
-                print(f"Task count: {len(prompts)}")
-
-            return result
-
-        except Exception as e:
-            return {
-                "status": "error",
-                "error": str(e),
-            }
+    @staticmethod
+    def _job_state(batch_job: Any) -> str:
+        """任务状态名，如 SUCCEEDED / RUNNING（去掉 JOB_STATE_ 前缀）"""
+        state = batch_job.state
+        name = state.name if hasattr(state, "name") else str(state or "")
+        return name.replace("JOB_STATE_", "")
 
     def get_batch_job_status(self, batch_name: str) -> Dict[str, Any]:
         """获取批量任务状态
 
         Args:
-            batch_name: 批量任务名称（如 projects/.../locations/.../batchJobs/xxx）
+            batch_name: 批量任务名称（如 batches/xxx）
 
         Returns:
-            包含状态信息的字典
+            包含状态信息的字典，state 为 PENDING / RUNNING / SUCCEEDED / FAILED / CANCELLED / EXPIRED 等
         """
         try:
-            batch_job = self.client.models.batch_create_content(name=batch_name)
+            batch_job = self.client.batches.get(name=batch_name)
+            state = self._job_state(batch_job)
             return {
-                "status": batch_job.state.name if hasattr(batch_job.state, "name") else str(batch_job.state),
-                "state": str(batch_job.state),
+                "status": state,
+                "state": state,
             }
         except Exception as e:
             return {
@@ -287,18 +559,76 @@ class BatchImageClient:
             包含任务列表的字典
         """
         try:
-            # 使用 projects.locations.batchJobs.list
-            # 注意：需要指定 location
-            parent = f"projects/{self.api_key}/locations/-"
-            jobs = self.client.models.batch_create_content.list(parent=parent)
+            jobs = self.client.batches.list(config=types.ListBatchJobsConfig(page_size=page_size))
+            return {
+                "status": "success",
+                "jobs": list(jobs),
+            }
+        except Exception as e:
             return {
+                "status": "error",
+                "error": str(e),
+            }
+
+    def parse_batch_job(self, batch_job: Any) -> Dict[str, Any]:
+        """解析批量任务的内联结果（图像保留在内存中）
+
+        Returns:
+            {"status", "state", "results": [{"task_index", "key", "status", "image_data", "error"?}]}
+        """
+        state = self._job_state(batch_job)
+        results = {
+            "status": "success",
+            "state": state,
+            "batch_name": batch_job.name,
+            "results": [],
+        }
+
+        dest = getattr(batch_job, "dest", None)
+        for i, inlined in enumerate(getattr(dest, "inlined_responses", None) or []):
+            metadata = getattr(inlined, "metadata", None) or {}
+            result_item = {
+                "task_index": i,
+                "key": metadata.get("key", f"task_{i}"),
                 "status": "success",
-                "jobs": jobs,
+                "image_data": [],
             }
+
+            if inlined.error:
+                result_item["status"] = "error"
+                result_item["error"] = inlined.error.message or str(inlined.error)
+            elif inlined.response and inlined.response.candidates:
+                candidate = inlined.response.candidates[0]
+                if candidate.content and candidate.content.parts:
+                    for part in candidate.content.parts:
+                        if part.inline_data:
+                            result_item["image_data"].append(
+                                {
+                                    "data": part.inline_data.data,
+                                    "mime_type": part.inline_data.mime_type or "image/png",
+                                }
+                            )
+                if not result_item["image_data"]:
+                    result_item["status"] = "error"
+                    result_item["error"] = f"Generation failed. Finish reason: {candidate.finish_reason}"
+            else:
+                result_item["status"] = "error"
+                result_item["error"] = "Empty response"
+
+            results["results"].append(result_item)
+
+        return results
+
+    async def aget_batch_job(self, batch_name: str) -> Dict[str, Any]:
+        """获取批量任务状态和结果（异步），返回值同 parse_batch_job，任务未结束时 results 为空"""
+        try:
+            batch_job = await self.client.aio.batches.get(name=batch_name)
+            return self.parse_batch_job(batch_job)
         except Exception as e:
             return {
                 "status": "error",
                 "error": str(e),
+                "batch_name": batch_name,
             }
 
     def get_batch_results(self, batch_name: str, output_dir: Optional[Path] = None) -> Dict[str, Any]:
@@ -315,42 +645,19 @@ class BatchImageClient:
             output_dir = output_dir or self._get_output_dir()
             output_dir.mkdir(parents=True, exist_ok=True)
 
-            # 下载结果文件
-            batch_job = self.client.models.batch_create_content(name=batch_name)
+            results = self.parse_batch_job(self.client.batches.get(name=batch_name))
 
-            results = {
-                "status": "success",
-                "batch_name": batch_name,
-                "results": [],
-            }
-
-            # 获取结果
-            if hasattr(batch_job, "results") and batch_job.results:
-                for i, result in enumerate(batch_job.results):
-                    result_item = {
-                        "task_index": i,
-                        "status": "success",
-                        "images": [],
-                    }
-
-                    # 处理生成的图像
-                    if (
-                        hasattr(result, "response")
-                        and hasattr(result.response, "candidates")
-                        and result.response.candidates
-                    ):
-                        candidate = result.response.candidates[0]
-                        if candidate.content and candidate.content.parts:
-                            for part in candidate.content.parts:
-                                if part.inline_data:
-                                    output_file = output_dir / f"batch_{batch_name.split('/')[-1]}_{i}.png"
-                                    with open(output_file, "wb") as f:
-                                        f.write(part.inline_data.data)
-                                    result_item["images"].append(str(output_file))
-                        elif hasattr(candidate, "finish_reason"):
-                            result_item["error"] = f"Generation failed. Finish reason: {candidate.finish_reason}"
-
-                    results["results"].append(result_item)
+            # 保存生成的图像
+            for result_item in results["results"]:
+                result_item["images"] = []
+                for j, image in enumerate(result_item.pop("image_data")):
+                    output_file = output_dir / (
+                        f"batch_{batch_name.split('/')[-1]}_{result_item['task_index']}_{j}"
+                        f"{get_image_extension(image['mime_type'])}"
+                    )
+                    with open(output_file, "wb") as f:
+                        f.write(image["data"])
+                    result_item["images"].append(str(output_file))
 
             return results
 
@@ -378,9 +685,9 @@ class BatchImageClient:
             status = self.get_batch_job_status(batch_name)
             state = status.get("state", "").upper()
 
-            if state == "SUCCEEDED":
+            if state in BATCH_SUCCESS_STATES:
                 return {"status": "success", "state": state, "batch_name": batch_name}
-            elif state in ["FAILED", "CANCELLED"]:
+            elif state in BATCH_FAILURE_STATES:
                 return {"status": "error", "state": state, "error": "Batch job failed or was cancelled"}
 
             print(f"Batch job state: {state}, waiting...")
@@ -390,7 +697,12 @@ class BatchImageClient:
 
 
 class ImageClient:
-    """Google Gen SDK 图像生成客户端"""
+    """Google Gen SDK 图像生成客户端
+
+    同时提供同步 (generate) 与异步 (agenerate) 两条生成路径：
+    同步路径供命令行等脚本使用，异步路径供 Worker 在事件循环中调用，
+    不会阻塞 FastAPI 的其他请求。
+    """
 
     def __init__(self, api_key: Optional[str] = None, model: Optional[str] = None):
         """初始化客户端
@@ -402,11 +714,32 @@ class ImageClient:
         self.api_key = api_key or find_api_key()
         if not self.api_key:
             raise ValueError("GEMINI_API_KEY not found. " "Set via environment variable or .env file.")
-        self.client = genai.Client(api_key=self.api_key)
+        # 复用连接池：同一个 ImageClient 的所有请求共享 keep-alive 连接
+        self.client = genai.Client(
+            api_key=self.api_key,
+            http_options=types.HttpOptions(
+                client_args={"limits": HTTP_POOL_LIMITS},
+                async_client_args={"limits": HTTP_POOL_LIMITS},
+            ),
+        )
         self.model = model or find_model()
+        self._output_dir: Optional[Path] = None
+        # 参考图下载用的异步 HTTP 客户端（按事件循环懒加载）
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._http_client_loop: Optional[asyncio.AbstractEventLoop] = None
+        # 已上传参考图缓存，以及正在上传中的 URL（并发任务共享同一次上传）
+        self.reference_cache = ReferenceFileCache(
+            max_entries=int(os.getenv("REFERENCE_CACHE_MAX_ENTRIES", "512")),
+            ttl_seconds=float(os.getenv("REFERENCE_CACHE_TTL_SECONDS", str(24 * 3600))),
+        )
+        self._reference_pending: Dict[str, "asyncio.Future[Any]"] = {}
+        # 单次请求准备全部参考图的总超时（秒）
+        self.reference_timeout = float(os.getenv("REFERENCE_TIMEOUT_SECONDS", "90"))
 
     def _get_output_dir(self) -> Path:
         """获取输出目录"""
+        if self._output_dir is not None:
+            return self._output_dir
         script_dir = Path(__file__).parent
         project_root = script_dir
         for parent in [script_dir] + list(script_dir.parents):
@@ -415,24 +748,51 @@ class ImageClient:
                 break
         output_dir = project_root / "docs" / "assets"
         output_dir.mkdir(parents=True, exist_ok=True)
+        self._output_dir = output_dir
         return output_dir
 
-    def _upload_file_to_gemini(self, file_path: str) -> Any:
+    def _get_http_client(self) -> httpx.AsyncClient:
+        """获取参考图下载用的 httpx.AsyncClient（同一事件循环内复用连接）"""
+        loop = asyncio.get_running_loop()
+        if self._http_client is None or self._http_client_loop is not loop or self._http_client.is_closed:
+            self._http_client = httpx.AsyncClient(timeout=30.0, limits=HTTP_POOL_LIMITS)
+            self._http_client_loop = loop
+        return self._http_client
+
+    async def aclose(self):
+        """关闭异步 HTTP 连接"""
+        if self._http_client is not None and not self._http_client.is_closed:
+            await self._http_client.aclose()
+        self._http_client = None
+
+    def _upload_file_to_gemini(self, file_path: Union[str, io.IOBase], mime_type: Optional[str] = None) -> Any:
         """上传文件到 Google GenAI 文件服务
 
         Args:
-            file_path: 本地文件路径或 URL
+            file_path: 本地文件路径，或内存中的二进制流（如 io.BytesIO）
+            mime_type: MIME 类型，上传二进制流时必须提供
 
         Returns:
             上传后的文件对象
         """
-        file_obj = self.client.files.upload(file=file_path)
+        config = types.UploadFileConfig(mime_type=mime_type) if mime_type else None
+        file_obj = self.client.files.upload(file=file_path, config=config)
         # 等待文件处理完成
         while file_obj.state.name == "PROCESSING":
             time.sleep(1)
             file_obj = self.client.files.get(name=file_obj.name)
         return file_obj
 
+    async def _aupload_file_to_gemini(self, file_path: Union[str, io.IOBase], mime_type: Optional[str] = None) -> Any:
+        """上传文件到 Google GenAI 文件服务（异步），参数同 _upload_file_to_gemini"""
+        config = types.UploadFileConfig(mime_type=mime_type) if mime_type else None
+        file_obj = await self.client.aio.files.upload(file=file_path, config=config)
+        # 等待文件处理完成
+        while file_obj.state.name == "PROCESSING":
+            await asyncio.sleep(1)
+            file_obj = await self.client.aio.files.get(name=file_obj.name)
+        return file_obj
+
     def _read_image_bytes(self, image_path: str) -> bytes:
         """读取图片文件字节（支持本地路径）"""
         path = Path(image_path)
@@ -442,6 +802,316 @@ class ImageClient:
         else:
             raise ValueError(f"Image file not found: {image_path}")
 
+    @staticmethod
+    def _is_remote(image_path: str) -> bool:
+        """检查是否是 URL（http://, https://, blob://）"""
+        return image_path.startswith(("http://", "https://", "blob://"))
+
+    @staticmethod
+    def _reference_mime_type(response: httpx.Response, url: str) -> str:
+        """根据响应头（或 URL 扩展名）确定参考图的 MIME 类型"""
+        mime_type = response.headers.get("content-type", "").split(";")[0].strip().lower()
+        if mime_type.startswith("image/"):
+            return mime_type
+        guessed = get_mime_type(url.split("?")[0])
+        return guessed if guessed.startswith("image/") else "image/jpeg"
+
+    def _prepare_reference(self, image_path: str, verbose: bool) -> Any:
+        """下载（如需要）并上传单张参考图，返回 Gemini 文件对象
+
+        已上传过的参考图（相同 URL 或相同内容）直接复用缓存的文件对象。
+        """
+        if self._is_remote(image_path):
+            cached = self.reference_cache.get_by_url(image_path)
+            if cached is not None:
+                return cached
+
+            # 下载图片并上传到 Google 文件服务
+            try:
+                with httpx.Client(timeout=30.0) as http_client:
+                    response = http_client.get(image_path)
+                    response.raise_for_status()
+
+                digest = content_digest(response.content)
+                cached = self.reference_cache.get_by_digest(digest, url=image_path)
+                if cached is not None:
+                    return cached
+
+                # 直接从内存上传，不落临时文件
+                file_obj = self._upload_file_to_gemini(
+                    io.BytesIO(response.content), self._reference_mime_type(response, image_path)
+                )
+                self.reference_cache.put(digest, file_obj, url=image_path)
+
+                if verbose:
+                    print(f"  Uploaded reference image from URL: {image_path[:50]}...")
+                return file_obj
+            except Exception as e:
+                raise ValueError(f"Failed to upload reference image from URL {image_path}: {e}") from e
+
+        # 本地文件路径（内容可能变化，只按内容哈希缓存）
+        path = Path(image_path)
+        if not path.exists():
+            raise ValueError(f"Reference image not found: {image_path}")
+
+        digest = content_digest(self._read_image_bytes(str(path)))
+        cached = self.reference_cache.get_by_digest(digest)
+        if cached is not None:
+            return cached
+
+        file_obj = self._upload_file_to_gemini(str(path))
+        self.reference_cache.put(digest, file_obj)
+        if verbose:
+            print(f"  Uploaded reference image: {image_path}")
+        return file_obj
+
+    async def _aprepare_reference(self, image_path: str, verbose: bool) -> Any:
+        """下载（如需要）并上传单张参考图（异步），返回 Gemini 文件对象
+
+        命中缓存时跳过下载和上传；多个任务同时引用同一 URL 时只上传一次。
+        """
+        if not self._is_remote(image_path):
+            return await self._aload_local_reference(image_path, verbose)
+
+        cached = self.reference_cache.get_by_url(image_path)
+        if cached is not None:
+            return cached
+
+        pending = self._reference_pending.get(image_path)
+        if pending is None or pending.get_loop() is not asyncio.get_running_loop():
+            pending = asyncio.ensure_future(self._aload_remote_reference(image_path, verbose))
+            self._reference_pending[image_path] = pending
+            pending.add_done_callback(lambda _: self._reference_pending.pop(image_path, None))
+        return await asyncio.shield(pending)
+
+    async def _aprepare_references(self, reference_images: List[str], verbose: bool) -> List[Any]:
+        """并发下载/上传全部参考图，保持原有顺序
+
+        Raises:
+            ValueError: 任一参考图失败，或总耗时超过 reference_timeout
+        """
+        try:
+            return await asyncio.wait_for(
+                asyncio.gather(*(self._aprepare_reference(path, verbose) for path in reference_images)),
+                timeout=self.reference_timeout,
+            )
+        except asyncio.TimeoutError as e:
+            raise ValueError(
+                f"Timed out preparing {len(reference_images)} reference images after {self.reference_timeout}s"
+            ) from e
+
+    async def areference_digests(self, reference_images: List[str], verbose: bool = False) -> List[str]:
+        """计算参考图的内容标识（用于结果缓存键），不上传到 Gemini
+
+        结果缓存命中时整个生成（包括参考图上传）都可以跳过，所以这里只读取/下载参考图：
+        - 远端图片：优先用 URL + ETag（HEAD 请求，不下载内容）；服务端不返回 ETag 时用已缓存的内容哈希，
+          否则下载后计算内容哈希
+        - 本地图片：读取后计算内容哈希
+        """
+        return list(await asyncio.gather(*(self._areference_digest(path) for path in reference_images)))
+
+    async def _areference_digest(self, image_path: str) -> str:
+        if not self._is_remote(image_path):
+            return content_digest(await asyncio.to_thread(self._read_image_bytes, image_path))
+
+        client = self._get_http_client()
+        try:
+            response = await client.head(image_path)
+            etag = response.headers.get("etag") if response.is_success else None
+        except httpx.HTTPError:
+            etag = None
+        if etag:
+            return content_digest(f"{image_path}\n{etag}".encode())
+
+        digest = self.reference_cache.digest_of(image_path)
+        if digest:
+            return digest
+        try:
+            response = await client.get(image_path)
+            response.raise_for_status()
+        except Exception as e:
+            raise ValueError(f"Failed to download reference image from URL {image_path}: {e}") from e
+        return content_digest(response.content)
+
+    async def _aload_remote_reference(self, image_path: str, verbose: bool) -> Any:
+        """下载 URL 参考图并上传到 Gemini（按内容哈希去重）"""
+        try:
+            started = time.perf_counter()
+            response = await self._get_http_client().get(image_path)
+            response.raise_for_status()
+            REFERENCE_STEP_SECONDS.observe(time.perf_counter() - started, step="download")
+
+            digest = content_digest(response.content)
+            cached = self.reference_cache.get_by_digest(digest, url=image_path)
+            if cached is not None:
+                return cached
+
+            # 直接从内存上传，不落临时文件
+            started = time.perf_counter()
+            file_obj = await self._aupload_file_to_gemini(
+                io.BytesIO(response.content), self._reference_mime_type(response, image_path)
+            )
+            REFERENCE_STEP_SECONDS.observe(time.perf_counter() - started, step="gemini_upload")
+            self.reference_cache.put(digest, file_obj, url=image_path)
+
+            if verbose:
+                print(f"  Uploaded reference image from URL: {image_path[:50]}...")
+            return file_obj
+        except Exception as e:
+            raise ValueError(f"Failed to upload reference image from URL {image_path}: {e}") from e
+
+    async def _aload_local_reference(self, image_path: str, verbose: bool) -> Any:
+        """上传本地参考图到 Gemini（按内容哈希去重）"""
+        path = Path(image_path)
+        if not path.exists():
+            raise ValueError(f"Reference image not found: {image_path}")
+
+        digest = content_digest(await asyncio.to_thread(self._read_image_bytes, str(path)))
+        cached = self.reference_cache.get_by_digest(digest)
+        if cached is not None:
+            return cached
+
+        file_obj = await self._aupload_file_to_gemini(str(path))
+        self.reference_cache.put(digest, file_obj)
+        if verbose:
+            print(f"  Uploaded reference image: {image_path}")
+        return file_obj
+
+    @staticmethod
+    def _validate_params(aspect_ratio: str, resolution: str):
+        """验证参数，无效时抛出 ValueError"""
+        if aspect_ratio not in AspectRatio.values():
+            raise ValueError(f"Invalid aspect_ratio: {aspect_ratio}. " f"Must be one of: {AspectRatio.values()}")
+        if resolution not in Resolution.values():
+            raise ValueError(f"Invalid resolution: {resolution}. " f"Must be one of: {Resolution.values()}")
+
+    @staticmethod
+    def _build_config(aspect_ratio: str) -> types.GenerateContentConfig:
+        """构建生成配置"""
+        config_args = {
+            "response_modalities": ["Image"],
+        }
+
+        config_args["image_config"] = types.ImageConfig(
+            aspect_ratio=aspect_ratio,
+        )
+
+        return types.GenerateContentConfig(**config_args)
+
+    def _parse_response(
+        self,
+        response: Any,
+        prompt: str,
+        aspect_ratio: str,
+        resolution: str,
+        model: str,
+        verbose: bool,
+    ) -> Tuple[Dict[str, Any], List[Dict[str, Any]]]:
+        """解析生成结果
+
+        Returns:
+            (结果字典, 生成的图像列表 [{"data": bytes, "mime_type": str}])；
+            被安全策略拦截时结果字典 status 为 error
+        """
+        result = {
+            "status": "success",
+            "prompt": prompt,
+            "aspect_ratio": aspect_ratio,
+            "resolution": resolution,
+            "model": model,
+            "response": response.text if hasattr(response, "text") else None,
+            "generated_images": [],
+        }
+        images: List[Dict[str, Any]] = []
+
+        # 处理生成的图像
+        if hasattr(response, "candidates") and response.candidates:
+            candidate = response.candidates[0]
+
+            # Check if content exists (blocked by safety settings?)
+            if not candidate.content:
+                finish_reason = getattr(candidate, "finish_reason", "UNKNOWN")
+                safety_ratings = getattr(candidate, "safety_ratings", [])
+
+                # 构建详细的警告信息
+                warnings = f"Generation prevented. Finish reason: {finish_reason}"
+                if safety_ratings:
+                    ratings_str = ", ".join([f"{r.category}: {r.probability}" for r in safety_ratings])
+                    warnings += f". Safety Ratings: [{ratings_str}]"
+
+                if verbose:
+                    print(f"  Warning: {warnings}")
+                    # 打印完整的 candidate 对象以便调试
+                    print(f"  Full Candidate: {candidate}")
+
+                return {
+                    "status": "error",
+                    "error": warnings,
+                    "prompt": prompt,
+                    "aspect_ratio": aspect_ratio,
+                    "resolution": resolution,
+                    "model": model,
+                    "safety_ratings": str(safety_ratings),
+                }, []
+
+            if hasattr(candidate.content, "parts"):
+                for part in candidate.content.parts:
+                    if part.inline_data:
+                        mime_type = getattr(part.inline_data, "mime_type", None)
+                        images.append(
+                            {
+                                "data": part.inline_data.data,
+                                "mime_type": mime_type if isinstance(mime_type, str) else "image/png",
+                            }
+                        )
+
+        return result, images
+
+    def _save_images(self, images: List[Dict[str, Any]], filename: str, verbose: bool) -> List[str]:
+        """将生成的图像写入输出目录"""
+        output_dir = self._get_output_dir()
+        saved = []
+        for i, image in enumerate(images):
+            output_file = output_dir / f"{filename}_{i}{get_image_extension(image['mime_type'])}"
+            with open(output_file, "wb") as f:
+                f.write(image["data"])
+            saved.append(str(output_file))
+
+            if verbose:
+                print(f"  Saved: {output_file}")
+        return saved
+
+    @staticmethod
+    def _log_request(prompt: str, aspect_ratio: str, resolution: str, model: str):
+        print(f"Generating image with:")
+        print(f"  Prompt: {prompt[:100]}...")
+        print(f"  Aspect Ratio: {aspect_ratio}")
+        print(f"  Resolution: {resolution}")
+        print(f"  Model: {model}")
+
+    def _generation_error(
+        self, error: Exception, contents: List[Any], prompt: str, aspect_ratio: str, resolution: str
+    ) -> Dict[str, Any]:
+        """构建生成失败的结果字典
+
+        请求因参考图文件失效（过期、不存在）被拒绝时，丢弃本次用到的缓存条目，
+        并在结果中标记 references_invalidated：重试时会重新上传参考图。其他 4xx 错误不影响缓存。
+        """
+        invalidated = 0
+        if is_reference_file_error(error):
+            invalidated = self.reference_cache.invalidate([c.name for c in contents if getattr(c, "name", None)])
+        return {
+            "status": "error",
+            "error": str(error),
+            "prompt": prompt,
+            "aspect_ratio": aspect_ratio,
+            "resolution": resolution,
+            # 供调用方决定是否重试：HTTP 状态码与服务端建议的重试等待（秒）
+            "status_code": error.code if isinstance(error, genai_errors.APIError) else None,
+            "retry_after": get_retry_after(error),
+            "references_invalidated": invalidated > 0,
+        }
+
     def generate(
         self,
         prompt: str,
@@ -475,157 +1145,163 @@ class ImageClient:
         verbose = verbose if verbose is not None else is_verbose_default()
 
         # 验证参数
-        if aspect_ratio not in AspectRatio.values():
-            raise ValueError(f"Invalid aspect_ratio: {aspect_ratio}. " f"Must be one of: {AspectRatio.values()}")
-        if resolution not in Resolution.values():
-            raise ValueError(f"Invalid resolution: {resolution}. " f"Must be one of: {Resolution.values()}")
+        self._validate_params(aspect_ratio, resolution)
+
+        # 各阶段耗时，随结果返回（result["timings"]）
+        timer = StageTimer()
 
         # 构建内容
         contents: List[Any] = [prompt]
 
-        # 如果有参考图片，添加到内容中
-        if reference_images:
-            for image_path in reference_images:
-                # 检查是否是 URL（http://, https://, blob://）
-                if image_path.startswith(("http://", "https://", "blob://")):
-                    # 下载图片并上传到 Google 文件服务
-                    try:
-                        # 下载图片字节
-                        with httpx.Client(timeout=30.0) as http_client:
-                            response = http_client.get(image_path)
-                            response.raise_for_status()
-                            image_bytes = response.content
-
-                        # 保存到临时文件
-                        temp_dir = Path("/tmp")
-                        temp_dir.mkdir(parents=True, exist_ok=True)
-                        temp_path = temp_dir / f"reference_{uuid.uuid4().hex[:8]}"
-                        mime_type = response.headers.get("content-type", "image/jpeg")
-                        ext = (
-                            ".jpg"
-                            if "jpeg" in mime_type or "jpg" in mime_type
-                            else ".png" if "png" in mime_type else ".webp"
-                        )
-                        temp_file = temp_path.with_suffix(ext)
-                        with open(temp_file, "wb") as f:
-                            f.write(image_bytes)
-
-                        # 上传到 Google 文件服务
-                        file_obj = self._upload_file_to_gemini(temp_file)
-                        contents.append(file_obj)
-
-                        # 清理临时文件
-                        try:
-                            os.remove(str(temp_file))
-                        except:
-                            pass
-
-                        if verbose:
-                            print(f"  Uploaded reference image from URL: {image_path[:50]}...")
-                    except Exception as e:
-                        raise ValueError(f"Failed to upload reference image from URL {image_path}: {e}")
-                else:
-                    # 本地文件路径
-                    path = Path(image_path)
-                    if not path.exists():
-                        raise ValueError(f"Reference image not found: {image_path}")
-
-                    # 上传到 Google 文件服务
-                    file_obj = self._upload_file_to_gemini(str(path))
-                    contents.append(file_obj)
-
-                    if verbose:
-                        print(f"  Uploaded reference image: {image_path}")
-
-        # 构建配置
-        config_args = {
-            "response_modalities": ["Image"],
-        }
-
-        config_args["image_config"] = types.ImageConfig(
-            aspect_ratio=aspect_ratio,
-        )
+        # 如果有参考图片，上传后添加到内容中
+        with timer.stage("references"):
+            for image_path in reference_images or []:
+                contents.append(self._prepare_reference(image_path, verbose))
 
-        config = types.GenerateContentConfig(**config_args)
+        config = self._build_config(aspect_ratio)
 
         if verbose:
-            print(f"Generating image with:")
-            print(f"  Prompt: {prompt[:100]}...")
-            print(f"  Aspect Ratio: {aspect_ratio}")
-            print(f"  Resolution: {resolution}")
-            print(f"  Model: {model}")
+            self._log_request(prompt, aspect_ratio, resolution, model)
 
         try:
-            response = self.client.models.generate_content(
-                model=model,
-                contents=contents,
-                config=config,
-            )
+            with timer.stage("generate_content"):
+                response = self.client.models.generate_content(
+                    model=model,
+                    contents=contents,
+                    config=config,
+                )
+
+            with timer.stage("parse_response"):
+                result, images = self._parse_response(response, prompt, aspect_ratio, resolution, model, verbose)
+            if result["status"] == "success":
+                filename = output_filename or f"generated_{aspect_ratio.replace(':', '-')}_{resolution}"
+                with timer.stage("local_write"):
+                    result["generated_images"] = self._save_images(images, filename, verbose)
 
-            result = {
-                "status": "success",
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,
-                "resolution": resolution,
-                "model": model,
-                "response": response.text if hasattr(response, "text") else None,
-                "generated_images": [],
-            }
+        except Exception as e:
+            result = self._generation_error(e, contents, prompt, aspect_ratio, resolution)
 
-            # 处理生成的图像
-            if hasattr(response, "candidates") and response.candidates:
-                candidate = response.candidates[0]
-
-                # Check if content exists (blocked by safety settings?)
-                if not candidate.content:
-                    finish_reason = getattr(candidate, "finish_reason", "UNKNOWN")
-                    safety_ratings = getattr(candidate, "safety_ratings", [])
-
-                    # 构建详细的警告信息
-                    warnings = f"Generation prevented. Finish reason: {finish_reason}"
-                    if safety_ratings:
-                        ratings_str = ", ".join([f"{r.category}: {r.probability}" for r in safety_ratings])
-                        warnings += f". Safety Ratings: [{ratings_str}]"
-
-                    if verbose:
-                        print(f"  Warning: {warnings}")
-                        # 打印完整的 candidate 对象以便调试
-                        print(f"  Full Candidate: {candidate}")
-
-                    return {
-                        "status": "error",
-                        "error": warnings,
-                        "prompt": prompt,
-                        "aspect_ratio": aspect_ratio,
-                        "resolution": resolution,
-                        "model": model,
-                        "safety_ratings": str(safety_ratings),
-                    }
-
-                output_dir = self._get_output_dir()
-                filename = output_filename or f"generated_{aspect_ratio.replace(':', '-')}_{resolution}"
+        result["timings"] = timer.timings
+        return result
 
-                if hasattr(candidate.content, "parts"):
-                    for i, part in enumerate(candidate.content.parts):
-                        if part.inline_data:
-                            output_file = output_dir / f"{filename}_{i}.png"
-                            with open(output_file, "wb") as f:
-                                f.write(part.inline_data.data)
-                            result["generated_images"].append(str(output_file))
+    async def agenerate(
+        self,
+        prompt: str,
+        reference_images: Optional[List[str]] = None,
+        aspect_ratio: str = "1:1",
+        resolution: str = "1K",
+        output_filename: Optional[str] = None,
+        model: Optional[str] = None,
+        verbose: Optional[bool] = None,
+        save_to_disk: bool = True,
+        on_stage: Optional[Callable[[str], Awaitable[Any]]] = None,
+    ) -> Dict[str, Any]:
+        """生成图像（异步）
 
-                            if verbose:
-                                print(f"  Saved: {output_file}")
+        参数与返回值同 generate。网络请求走 SDK 的 aio 接口和 httpx.AsyncClient，
+        文件读写放到线程中执行，不阻塞事件循环。
 
-            return result
+        Args:
+            save_to_disk: 是否把生成的图像写入输出目录。为 False 时 generated_images 为空，
+                调用方直接使用结果中的 image_data（[{"data": bytes, "mime_type": str}]）
+            on_stage: 进入新阶段时的回调（references_uploaded / generating），用于推送进度
+        """
+        model = model or self.model
+        verbose = verbose if verbose is not None else is_verbose_default()
+
+        self._validate_params(aspect_ratio, resolution)
+
+        timer = StageTimer()
+
+        contents: List[Any] = [prompt]
+        if reference_images:
+            try:
+                with timer.stage("references"):
+                    contents.extend(await self._aprepare_references(reference_images, verbose))
+            except Exception as e:
+                # 参考图准备失败时异常直接抛给调用方，附带已记录的阶段耗时
+                e.timings = timer.timings
+                raise
+            await _emit_stage(on_stage, "references_uploaded")
+
+        config = self._build_config(aspect_ratio)
+
+        if verbose:
+            self._log_request(prompt, aspect_ratio, resolution, model)
+
+        rate_limiter = get_rate_limiter()
+        try:
+            with timer.stage("rate_limit_wait"):
+                await rate_limiter.acquire(model)
+            try:
+                await _emit_stage(on_stage, "generating")
+                with timer.stage("generate_content"):
+                    response = await self.client.aio.models.generate_content(
+                        model=model,
+                        contents=contents,
+                        config=config,
+                    )
+            finally:
+                await rate_limiter.release(model)
+
+            with timer.stage("parse_response"):
+                result, images = self._parse_response(response, prompt, aspect_ratio, resolution, model, verbose)
+            if result["status"] == "success":
+                result["image_data"] = images
+                if save_to_disk:
+                    filename = output_filename or f"generated_{aspect_ratio.replace(':', '-')}_{resolution}"
+                    with timer.stage("local_write"):
+                        result["generated_images"] = await asyncio.to_thread(
+                            self._save_images, images, filename, verbose
+                        )
 
         except Exception as e:
-            return {
-                "status": "error",
-                "error": str(e),
-                "prompt": prompt,
-                "aspect_ratio": aspect_ratio,
-                "resolution": resolution,
-            }
+            if isinstance(e, genai_errors.ClientError) and e.code == 429:
+                # 配额已耗尽，暂停本进程（或共享后端下所有进程）对该模型的请求
+                await rate_limiter.penalize(model, get_retry_after(e))
+            result = self._generation_error(e, contents, prompt, aspect_ratio, resolution)
+
+        result["timings"] = timer.timings
+        return result
+
+
+async def _emit_stage(on_stage: Optional[Callable[[str], Awaitable[Any]]], stage: str):
+    """调用阶段回调，回调出错不影响生成"""
+    if on_stage is None:
+        return
+    try:
+        await on_stage(stage)
+    except Exception as e:
+        print(f"[ImageClient] on_stage callback failed: {e}")
+
+
+# 进程级共享的 ImageClient（懒加载）
+_image_client: Optional[ImageClient] = None
+
+
+def get_image_client() -> ImageClient:
+    """获取进程级共享的 ImageClient
+
+    首次调用时解析 API key / 模型并建立 genai.Client，之后所有任务复用同一个实例，
+    避免每次生成都重新加载 .env 和建立 TLS 连接。
+    """
+    global _image_client
+    if _image_client is None:
+        _image_client = ImageClient()
+    return _image_client
+
+
+def reset_image_client():
+    """丢弃共享的 ImageClient（如更换 API key 后），下次调用 get_image_client 时重建"""
+    global _image_client
+    _image_client = None
+
+
+def _resolve_client(api_key: Optional[str]) -> ImageClient:
+    """未指定 api_key 时使用共享客户端，否则创建独立客户端"""
+    if api_key:
+        return ImageClient(api_key=api_key)
+    return get_image_client()
 
 
 def generate_image(
@@ -653,14 +1329,42 @@ def generate_image(
     Returns:
         包含生成结果的字典
     """
-    client = ImageClient(api_key=api_key, model=model)
+    client = _resolve_client(api_key)
     return client.generate(
         prompt=prompt,
         reference_images=reference_images,
         aspect_ratio=aspect_ratio,
         resolution=resolution,
         output_filename=output_filename,
+        model=model,
+        verbose=verbose,
+    )
+
+
+async def agenerate_image(
+    prompt: str,
+    reference_images: Optional[List[str]] = None,
+    aspect_ratio: str = "1:1",
+    resolution: str = "1K",
+    output_filename: Optional[str] = None,
+    api_key: Optional[str] = None,
+    model: Optional[str] = None,
+    verbose: Optional[bool] = None,
+    save_to_disk: bool = True,
+    on_stage: Optional[Callable[[str], Awaitable[Any]]] = None,
+) -> Dict[str, Any]:
+    """便捷函数：异步生成图像，参数同 generate_image / ImageClient.agenerate"""
+    client = _resolve_client(api_key)
+    return await client.agenerate(
+        prompt=prompt,
+        reference_images=reference_images,
+        aspect_ratio=aspect_ratio,
+        resolution=resolution,
+        output_filename=output_filename,
+        model=model,
         verbose=verbose,
+        save_to_disk=save_to_disk,
+        on_stage=on_stage,
     )
 
 
@@ -2,7 +2,7 @@
 后台任务 Worker (适配新架构)
 
 负责处理图像生成任务：
-1. 轮询数据库获取 queued 状态的任务
+1. 收到新任务通知（或兜底轮询）后原子认领 queued 状态的任务（见 task_queue / task_notifier）
 2. 调用 Google Gen API 生成图像
 3. 上传到 OSS 并保存记录
 4. 更新任务状态
@@ -13,67 +13,109 @@
 
 import asyncio
 import os
+import time
 import uuid
 from datetime import datetime, timezone
-from pathlib import Path
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, Set, Tuple
 
-from app.models.generation_task import GenerationTask, TaskStatus, TaskType
+from tortoise.functions import Count
+
+from app.models.generation_task import GenerationTask, TaskLane, TaskStatus, TaskType
 from app.core.ws_manager import ws_manager
-from app.core.image_client import generate_image
+from app.core.metrics import StageTimer, registry
+from app.core.image_client import agenerate_image, get_image_client, get_image_extension, get_mime_type, read_image_size
+from app.core.task_notifier import get_task_notifier
+from app.core.task_progress import ProgressReporter
+from app.core.retry_policy import classify_exception, classify_result, compute_backoff
+from app.core.task_queue import claim_tasks, extend_lease, reap_expired_tasks, release_tasks
 from app.services.prompt_assembler import PromptAssembler
+from app.services.result_cache import build_cache_key, get_cached_result, is_cacheable, store_result, task_seed
 from app.settings.config import settings
 from app.utils.oss_utils import get_oss_uploader
 
 
 # Worker 配置
 CONFIG = {
-    "poll_interval": 2,  # 轮询间隔（秒）
+    "poll_interval": 30,  # 兜底轮询间隔（秒），新任务通过 task_notifier 即时唤醒
+    "error_delay": 2,  # 主循环异常后的等待时间（秒）
     "batch_size": 10,  # 每次处理的任务数
-    "retry_times": 3,  # 重试次数
-    "retry_delay": 5,  # 重试间隔（秒）
+    "concurrency": settings.IMAGE_WORKER_CONCURRENCY,  # 同时处理的任务数上限
+    "retry_times": 3,  # 最多尝试次数（永久错误不重试）
+    "retry_base_delay": 2,  # 指数退避基础间隔（秒）
+    "retry_max_delay": 60,  # 单次重试最长等待（秒），也作为 Retry-After 的上限
     "oss_folder": "generated",  # OSS 文件夹
+    "oss_retry_times": 2,  # 单张图片上传失败后的重试次数
+    "save_local_copy": settings.IMAGE_WORKER_SAVE_LOCAL,  # 是否额外在本地保存生成图（调试用）
+    # 租约续约间隔（秒），续约失败即发现任务已被取消，间隔同时决定中止取消任务的及时程度
+    "heartbeat_interval": min(settings.IMAGE_WORKER_LEASE_SECONDS / 3, 10),
+    "task_timeout": settings.IMAGE_WORKER_TASK_TIMEOUT,  # 单个任务最长处理时间（秒）
+    "drain_timeout": settings.IMAGE_WORKER_DRAIN_SECONDS,  # 停止时等待处理中任务完成的最长时间（秒）
+    "reap_interval": 60,  # 回收过期租约任务的间隔（秒）
 }
 
 
-async def upload_image_to_oss(local_path: str, user_id: str) -> Optional[dict]:
-    """上传图片到 OSS
+# 指标（/api/v1/metrics）
+STAGE_SECONDS = registry.histogram("generation_stage_seconds", "Generation pipeline stage duration", ["stage"])
+QUEUE_WAIT_SECONDS = registry.histogram(
+    "generation_queue_wait_seconds",
+    "Time from task creation to claim",
+    ["lane"],
+    buckets=(1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600, 21600, 86400),
+)
+TASKS_TOTAL = registry.counter("generation_tasks_total", "Finished generation tasks", ["task_type", "status"])
+RETRIES_TOTAL = registry.counter("generation_retries_total", "Generation retries by error kind", ["kind"])
+IN_FLIGHT = registry.gauge("generation_tasks_in_flight", "Tasks being processed by this worker process")
+QUEUE_DEPTH = registry.gauge("generation_queue_depth", "Queued tasks per lane", ["lane"])
+PROCESSING = registry.gauge("generation_tasks_processing", "Tasks in processing state across all workers")
+
+
+async def refresh_queue_metrics():
+    """从数据库刷新队列深度等全局指标（抓取指标时调用）"""
+    rows = (
+        await GenerationTask.filter(status=TaskStatus.QUEUED, is_deleted=False)
+        .annotate(count=Count("id"))
+        .group_by("lane")
+        .values("lane", "count")
+    )
+    depth = {TaskLane(row["lane"]).value: row["count"] for row in rows}
+    for lane in TaskLane:
+        QUEUE_DEPTH.set(depth.get(lane.value, 0), lane=lane.value)
+    PROCESSING.set(await GenerationTask.filter(status=TaskStatus.PROCESSING).count())
+
+
+async def upload_image_to_oss(content: bytes, filename: str, user_id: str) -> Optional[dict]:
+    """上传内存中的图片到 OSS
+
+    Args:
+        content: 图片字节
+        filename: 文件名（用于生成对象名和 Content-Type）
+        user_id: 用户ID
 
     Returns:
-        包含上传信息的字典 (oss_url, width, height)，或失败时返回 None
+        包含上传信息的字典 (url, width, height, filename)，或失败时返回 None
     """
     try:
-        # 读取文件内容
-        with open(local_path, "rb") as f:
-            content = f.read()
-
         # 获取 OSS 上传器
         uploader = get_oss_uploader()
 
         # 生成 OSS 对象名
-        filename = Path(local_path).name
         object_name = uploader.generate_object_name(
             filename,
             folder=CONFIG["oss_folder"],
             use_date_folder=True,
         )
 
-        # 上传到 OSS
-        success, result = uploader.upload_file(content, object_name)
+        # 上传到 OSS（在线程池中执行，失败自动重试）
+        success, result = await uploader.upload_file_async(
+            content, object_name, content_type=get_mime_type(filename), retries=CONFIG["oss_retry_times"]
+        )
 
         if not success:
             print(f"[ImageWorker] OSS upload failed: {result}")
             return None
 
-        # 获取图片信息
-        width, height = 0, 0
-        try:
-            from PIL import Image
-
-            with Image.open(local_path) as img:
-                width, height = img.size
-        except Exception:
-            pass
+        # 获取图片信息（只读取文件头，不解码）
+        width, height = read_image_size(content)
 
         return {"url": result, "width": width, "height": height, "filename": filename}
 
@@ -82,42 +124,51 @@ async def upload_image_to_oss(local_path: str, user_id: str) -> Optional[dict]:
         return None
 
 
-async def process_single_task(task: GenerationTask) -> bool:
-    """处理单个任务"""
-    print(f"[ImageWorker] Processing task: {task.id}, user_id: {task.user_id}")
+async def prepare_task_inputs(task: GenerationTask) -> Tuple[str, List[str]]:
+    """准备生成输入：组装提示词并收集参考图
 
-    # 更新为 running
-    task.status = TaskStatus.PROCESSING
-    task.started_at = datetime.now(timezone.utc)
-    await task.save()
+    Returns:
+        (提示词, 参考图 URL/路径列表)
+    """
+    (inputs,) = await prepare_tasks_inputs([task])
+    return inputs
 
-    # WebSocket 推送：开始处理
-    await ws_manager.push_task_update(
-        user_id=task.user_id,
-        task_id=str(task.id),
-        status="processing",
-    )
 
-    # 调用生成（支持重试）
-    last_error = None
+async def prepare_tasks_inputs(tasks: List[GenerationTask]) -> List[Tuple[str, List[str]]]:
+    """批量准备生成输入（批量通道一次提交几十个任务时使用）
+
+    关联数据对所有任务一起预取，提示词按任务类型用 PromptAssembler.assemble_many 批量组装。
 
+    Returns:
+        与 tasks 顺序一致的 (提示词, 参考图 URL/路径列表)
+    """
     # 如果是 Tryon 任务，可能需要获取图片路径
-    await task.fetch_related("tryon", "detail", "detail__template", "model_gen")
+    await GenerationTask.fetch_for_list(tasks, "tryon", "detail", "detail__template", "model_gen")
 
     # 准备提示词：使用 PromptAssembler 组装或使用默认 prompt
-    prompt = task.prompt or ""
-    if task.prompt_configs:
+    prompts = {task.id: task.prompt or "Default prompt" for task in tasks}
+    by_type: Dict[TaskType, List[GenerationTask]] = {}
+    for task in tasks:
+        if task.prompt_configs:
+            by_type.setdefault(task.task_type, []).append(task)
+
+    for task_type, typed_tasks in by_type.items():
         try:
-            assembler = PromptAssembler(task.task_type.value)
-            assembled = await assembler.assemble(task.prompt_configs, task.prompt)
-            prompt = assembled.positive_prompt
-            print(f"[ImageWorker] Assembled prompt: {prompt[:100]}...")
+            assembled = await PromptAssembler.assemble_many(
+                task_type.value, [task.prompt_configs for task in typed_tasks], [task.prompt for task in typed_tasks]
+            )
         except Exception as e:
             print(f"[ImageWorker] PromptAssembler error: {e}, using fallback")
-            prompt = task.prompt or "Default prompt"
-    else:
-        prompt = task.prompt or "Default prompt"
+            continue
+        for task, result in zip(typed_tasks, assembled):
+            prompts[task.id] = result.positive_prompt
+            print(f"[ImageWorker] Assembled prompt: {result.positive_prompt[:100]}...")
+
+    return [_task_inputs(task, prompts[task.id]) for task in tasks]
 
+
+def _task_inputs(task: GenerationTask, prompt: str) -> Tuple[str, List[str]]:
+    """收集参考图，详情页任务使用模版中的提示词"""
     # 准备参考图片
     reference_images = []
     if task.task_type == TaskType.TRYON and task.tryon:
@@ -139,116 +190,494 @@ async def process_single_task(task: GenerationTask) -> bool:
 
     # Model type currently has no reference images in schema
 
+    return prompt, reference_images
+
+
+async def complete_task(
+    task: GenerationTask,
+    image_data: List[Dict[str, Any]],
+    local_paths: Optional[List[str]] = None,
+    timer: Optional[StageTimer] = None,
+    progress: Optional[ProgressReporter] = None,
+):
+    """上传生成的图片，保存成功结果并推送
+
+    Args:
+        task: 任务
+        image_data: 生成的图片 [{"data": bytes, "mime_type": str}]
+        local_paths: 本地保存的副本路径（仅供调试）
+        timer: 任务的阶段计时器，耗时随结果保存到 task.timings
+        progress: 任务的进度推送，推送最终状态前关闭
+    """
+    timer = timer or StageTimer()
+    if progress:
+        await progress.report("uploading", images=len(image_data))
+    # 上传生成的图片到 OSS：直接从内存并发上传，不经过本地文件
+    with timer.stage("oss_upload"):
+        upload_results = await asyncio.gather(
+            *(
+                upload_image_to_oss(
+                    image["data"], f"task_{task.id}_{i}{get_image_extension(image['mime_type'])}", task.user_id
+                )
+                for i, image in enumerate(image_data)
+            )
+        )
+    # 上传失败的图片暂且忽略
+    uploaded_images = [upload_result["url"] for upload_result in upload_results if upload_result]
+    if progress:
+        progress.close()
+
+    result = {"images": uploaded_images}
+    if local_paths:
+        result["local_paths"] = local_paths  # 仅供调试
+    await finish_task(task, result, timer)
+
+
+async def _save_final_state(task: GenerationTask, timer: Optional[StageTimer]) -> bool:
+    """保存任务的最终状态（附带各阶段耗时）并记录指标
+
+    以任务仍由当前 Worker 处理为条件更新，任务已被取消或被回收转给其他 Worker 时不覆盖。
+
+    Returns:
+        是否保存成功
+    """
+    if timer is not None:
+        task.timings = {**timer.timings, "total": round(timer.elapsed(), 4)}
+
+    started = time.perf_counter()
+    updated = await GenerationTask.filter(id=task.id, status=TaskStatus.PROCESSING, worker_id=task.worker_id).update(
+        status=task.status,
+        result=task.result,
+        error=task.error,
+        timings=task.timings,
+        finished_at=task.finished_at,
+        lease_expires_at=None,
+    )
+    # 保存本身的耗时只进入指标，无法写进同一次保存的 timings
+    STAGE_SECONDS.observe(time.perf_counter() - started, stage="db_save")
+    if not updated:
+        print(f"[ImageWorker] Task {task.id} is no longer ours (cancelled or reclaimed), {task.status.value} discarded")
+        return False
+
+    if timer is not None:
+        for stage, seconds in task.timings.items():
+            STAGE_SECONDS.observe(seconds, stage=stage)
+    TASKS_TOTAL.inc(task_type=TaskType(task.task_type).value, status=TaskStatus(task.status).value)
+    return True
+
+
+async def finish_task(task: GenerationTask, result: Dict[str, Any], timer: Optional[StageTimer] = None):
+    """保存成功结果并推送"""
+    task.status = TaskStatus.SUCCEEDED
+    task.result = result
+    task.finished_at = datetime.now(timezone.utc)
+    if not await _save_final_state(task, timer):
+        return
+
+    # WebSocket 推送：成功
+    await ws_manager.push_task_update(
+        user_id=task.user_id,
+        task_id=str(task.id),
+        status="succeeded",
+        result=task.result,
+        finished_at=task.finished_at.isoformat(),
+    )
+
+
+async def fail_task(task: GenerationTask, error: Dict[str, Any], timer: Optional[StageTimer] = None):
+    """保存失败信息并推送"""
+    task.status = TaskStatus.FAILED
+    task.error = error
+    task.finished_at = datetime.now(timezone.utc)
+    if not await _save_final_state(task, timer):
+        return
+
+    # WebSocket 推送：失败
+    await ws_manager.push_task_update(
+        user_id=task.user_id,
+        task_id=str(task.id),
+        status="failed",
+        error=task.error,
+        finished_at=task.finished_at.isoformat(),
+    )
+
+
+async def _result_cache_key(task: GenerationTask, prompt: str, reference_images: List[str]) -> str:
+    """按组装后的提示词、参考图内容和生成参数计算结果缓存键"""
+    client = get_image_client()
+    reference_digests = await client.areference_digests(reference_images)
+    params = {
+        "task_type": task.task_type.value,
+        "aspect_ratio": task.aspect_ratio or "1:1",
+        "quality": task.quality or "1K",
+        "model": client.model,
+        "seed": task_seed(task),
+    }
+    return build_cache_key(prompt, reference_digests, params)
+
+
+async def process_single_task(task: GenerationTask) -> bool:
+    """处理单个任务（任务须已通过 claim_tasks 认领，状态为 processing）
+
+    处理期间通过 ProgressReporter 推送中间阶段（合并、限速），结束或中止时关闭。
+    """
+    progress = ProgressReporter(task)
+    try:
+        return await _process_single_task(task, progress)
+    finally:
+        progress.close()
+
+
+async def _process_single_task(task: GenerationTask, progress: ProgressReporter) -> bool:
+    print(f"[ImageWorker] Processing task: {task.id}, user_id: {task.user_id}")
+
+    # WebSocket 推送：开始处理
+    await ws_manager.push_task_update(
+        user_id=task.user_id,
+        task_id=str(task.id),
+        status="processing",
+    )
+
+    # 各阶段耗时，最终保存到 task.timings 并进入 generation_stage_seconds 直方图
+    timer = StageTimer()
+    if task.started_at and task.created_at:
+        queue_wait = (task.started_at - task.created_at).total_seconds()
+        timer.add("queue_wait", queue_wait)
+        QUEUE_WAIT_SECONDS.observe(queue_wait, lane=TaskLane(task.lane).value)
+
+    # 调用生成（按错误类型决定是否重试）
+    last_error = None
+    error = None
+    # 参考图文件失效后的重新上传重试每个任务只允许一次
+    reuploaded = False
+
+    with timer.stage("prompt_assembly"):
+        prompt, reference_images = await prepare_task_inputs(task)
+
+    # 结果缓存：固定 seed 的相同请求直接复用已上传的结果
+    cache_key = None
+    if is_cacheable(task):
+        try:
+            with timer.stage("cache_lookup"):
+                cache_key = await _result_cache_key(task, prompt, reference_images)
+                cached = await get_cached_result(cache_key)
+        except Exception as e:
+            print(f"[ImageWorker] Result cache lookup failed: {e}")
+            cached = None
+        if cached:
+            print(f"[ImageWorker] Task {task.id} served from result cache")
+            progress.close()
+            await finish_task(task, {**cached, "cached": True}, timer)
+            return True
+
     for attempt in range(CONFIG["retry_times"]):
         try:
-            result = generate_image(
+            result = await agenerate_image(
                 prompt=prompt,
                 reference_images=reference_images,
                 aspect_ratio=task.aspect_ratio or "1:1",
                 resolution=task.quality or "1K",  # 映射 quality 字段
                 output_filename=f"task_{task.id}",
                 verbose=False,
+                save_to_disk=CONFIG["save_local_copy"],
+                on_stage=lambda stage: progress.report(stage, attempt=attempt + 1),
             )
+            # 多次尝试的耗时累加
+            timer.merge(result.get("timings"))
 
             if result["status"] == "success":
-                # 计算耗时
-                finished_time = datetime.now(timezone.utc)
-
-                # 上传生成的图片到 OSS
-                uploaded_images = []
-                for local_path in result.get("generated_images", []):
-                    upload_result = await upload_image_to_oss(local_path, task.user_id)
-                    if upload_result:
-                        uploaded_images.append(upload_result["url"])
-                    else:
-                        # 上传失败，暂且忽略或标记
-                        pass
-
-                # 成功：更新结果
-                task.status = TaskStatus.SUCCEEDED
-                task.result = {"images": uploaded_images, "local_paths": result.get("generated_images", [])}  # 仅供调试
-                task.finished_at = finished_time
-                await task.save()
-
-                # WebSocket 推送：成功
-                await ws_manager.push_task_update(
-                    user_id=task.user_id,
-                    task_id=str(task.id),
-                    status="succeeded",
-                    result=task.result,
-                    finished_at=task.finished_at.isoformat(),
-                )
+                await complete_task(task, result.get("image_data", []), result.get("generated_images"), timer, progress)
+                if cache_key:
+                    try:
+                        await store_result(cache_key, task.result, task.id)
+                    except Exception as e:
+                        print(f"[ImageWorker] Result cache store failed: {e}")
                 return True
             else:
-                last_error = result.get("error", "Unknown error")
+                error = classify_result(result, allow_reupload=not reuploaded)
+                reuploaded = reuploaded or bool(result.get("references_invalidated"))
 
         except Exception as e:
-            last_error = str(e)
+            # 参考图准备失败等异常也带有已记录的阶段耗时
+            timer.merge(getattr(e, "timings", None))
+            error = classify_exception(e)
+
+        last_error = error.message
+        # 永久错误（安全拦截、参数错误等）重试也不会成功，立即失败
+        if not error.retryable:
+            break
 
-        # 重试等待
+        # 重试等待：限流时遵循 Retry-After，其余指数退避 + 抖动
         if attempt < CONFIG["retry_times"] - 1:
-            await asyncio.sleep(CONFIG["retry_delay"])
+            RETRIES_TOTAL.inc(kind=error.kind.value)
+            delay = compute_backoff(attempt, CONFIG["retry_base_delay"], CONFIG["retry_max_delay"], error.retry_after)
+            print(
+                f"[ImageWorker] Task {task.id} attempt {attempt + 1} failed ({error.kind.value}), "
+                f"retry in {delay:.1f}s"
+            )
+            with timer.stage("retry_backoff"):
+                await asyncio.sleep(delay)
 
     # 失败：更新错误信息
-    finished_time = datetime.now(timezone.utc)
-    task.status = TaskStatus.FAILED
-    task.error = {"code": "GENERATION_FAILED", "message": last_error or "Max retries exceeded"}
-    task.finished_at = finished_time
-    await task.save()
-
-    # WebSocket 推送：失败
-    await ws_manager.push_task_update(
-        user_id=task.user_id,
-        task_id=str(task.id),
-        status="failed",
-        error=task.error,
-        finished_at=task.finished_at.isoformat(),
+    progress.close()
+    await fail_task(
+        task,
+        {
+            "code": "GENERATION_FAILED",
+            "message": last_error or "Max retries exceeded",
+            "kind": error.kind.value if error else None,
+        },
+        timer,
     )
-
     return False
 
 
-async def worker_loop():
-    """主循环：轮询并处理任务"""
-    print(f"[ImageWorker] Started (poll_interval={CONFIG['poll_interval']}s)")
+async def _heartbeat(task: GenerationTask):
+    """处理期间定期续约，防止任务被当作崩溃的 Worker 遗留任务回收
 
+    续约失败（任务已被取消或被回收）时返回，由 _run_task 中止处理。
+    """
     while True:
+        await asyncio.sleep(CONFIG["heartbeat_interval"])
         try:
-            # 捞取 queued 状态的任务
-            tasks = await GenerationTask.filter(status=TaskStatus.QUEUED).limit(CONFIG["batch_size"])
+            if not await extend_lease(task):
+                print(f"[ImageWorker] Task {task.id} lease lost (cancelled or reclaimed)")
+                return
+        except Exception as e:
+            print(f"[ImageWorker] Task {task.id} heartbeat failed: {e}")
+
 
-            if tasks:
-                print(f"[ImageWorker] Processing {len(tasks)} tasks")
-                for task in tasks:
-                    await process_single_task(task)
+async def _run_task(task: GenerationTask, semaphore: asyncio.Semaphore, in_flight: Set[Any]):
+    """在并发槽位中处理单个任务，结束后释放槽位
+
+    处理过程与心跳并行：任务被取消（续约失败）或超过 task_timeout 时中止正在进行的生成调用，
+    超时的任务标记为失败，及时释放槽位和配额。
+    """
+    processing = asyncio.create_task(process_single_task(task))
+    heartbeat = asyncio.create_task(_heartbeat(task))
+    IN_FLIGHT.inc()
+    try:
+        await asyncio.wait({processing, heartbeat}, timeout=CONFIG["task_timeout"], return_when=asyncio.FIRST_COMPLETED)
+        if processing.done():
+            if processing.exception():
+                print(f"[ImageWorker] Task {task.id} crashed: {processing.exception()}")
+        else:
+            processing.cancel()
+            await asyncio.gather(processing, return_exceptions=True)
+            if heartbeat.done():
+                print(f"[ImageWorker] Task {task.id} aborted")
+            else:
+                print(f"[ImageWorker] Task {task.id} timed out after {CONFIG['task_timeout']}s")
+                await fail_task(
+                    task,
+                    {"code": "TIMEOUT", "message": f"Task exceeded {CONFIG['task_timeout']}s", "kind": "transient"},
+                )
+    except Exception as e:
+        print(f"[ImageWorker] Task {task.id} crashed: {e}")
+    finally:
+        IN_FLIGHT.dec()
+        processing.cancel()
+        heartbeat.cancel()
+        in_flight.discard(task.id)
+        semaphore.release()
+
+
+async def reap_expired(max_attempts: Optional[int] = None) -> int:
+    """回收租约过期的任务，失败的任务推送 WebSocket 通知
+
+    Returns:
+        回收的任务数
+    """
+    requeued, failed = await reap_expired_tasks(max_attempts)
+    for task in requeued:
+        print(f"[ImageWorker] Task {task.id} lease expired, requeued (attempt {task.attempts})")
+    for task in failed:
+        print(f"[ImageWorker] Task {task.id} lease expired, failed after {task.attempts} attempts")
+        await ws_manager.push_task_update(
+            user_id=task.user_id,
+            task_id=str(task.id),
+            status="failed",
+            error=task.error,
+            finished_at=task.finished_at.isoformat(),
+        )
+    return len(requeued) + len(failed)
+
+
+async def _drain(
+    running: Dict[asyncio.Task, GenerationTask],
+    drain_timeout: float,
+    undispatched: Optional[List[GenerationTask]] = None,
+):
+    """停止时的收尾：已认领但还未开始处理的任务立即放回队列，等待处理中的任务完成，
+    超时未完成的中止并放回队列"""
+    if undispatched:
+        released = await release_tasks(undispatched)
+        print(f"[ImageWorker] Released {released}/{len(undispatched)} undispatched tasks back to the queue")
+    if not running:
+        return
+    print(f"[ImageWorker] Draining {len(running)} tasks (timeout={drain_timeout}s)")
+    try:
+        if drain_timeout > 0:
+            await asyncio.wait(set(running), timeout=drain_timeout)
+    finally:
+        unfinished = {job: task for job, task in running.items() if not job.done()}
+        for job in unfinished:
+            job.cancel()
+        await asyncio.gather(*unfinished, return_exceptions=True)
+        # 放回队列由其他 Worker 立即接手，不必等租约过期；本次执行不计入次数
+        released = await release_tasks(unfinished.values())
+        if unfinished:
+            print(f"[ImageWorker] Released {released}/{len(unfinished)} unfinished tasks back to the queue")
+
+
+async def worker_loop(concurrency: Optional[int] = None, drain_timeout: Optional[float] = None):
+    """主循环：认领并处理任务
+
+    使用信号量限制同时处理的任务数，有空闲槽位时立即捞取新任务，
+    不必等待整批任务全部完成。队列为空时等待 task_notifier 的新任务通知，
+    poll_interval 只作为兜底轮询间隔。处理中的任务由心跳续约，
+    每隔 reap_interval 回收一次租约过期（Worker 已崩溃）的任务。
+
+    取消（停止）时不再认领新任务，最多等待 drain_timeout 秒让处理中的任务完成，
+    仍未完成的任务中止并放回队列。
+    """
+    concurrency = concurrency or CONFIG["concurrency"]
+    drain_timeout = CONFIG["drain_timeout"] if drain_timeout is None else drain_timeout
+    semaphore = asyncio.Semaphore(concurrency)
+    in_flight: Set[Any] = set()
+    running: Dict[asyncio.Task, GenerationTask] = {}
+    # 已认领、还未分派到槽位的任务；停止时放回队列
+    pending: List[GenerationTask] = []
+    claiming: Optional[asyncio.Future] = None
+    notifier = get_task_notifier()
+    loop_time = asyncio.get_running_loop().time
+
+    # 启动时解析一次 API key / 模型并建立共享的 genai.Client
+    try:
+        get_image_client()
+    except ValueError as e:
+        print(f"[ImageWorker] ImageClient not ready: {e}")
+
+    print(f"[ImageWorker] Started (poll_interval={CONFIG['poll_interval']}s, concurrency={concurrency})")
+
+    last_reap = 0.0
+    while True:
+        try:
+            # 定期回收崩溃 Worker 遗留的任务（启动时立即执行一次）
+            if loop_time() - last_reap >= CONFIG["reap_interval"]:
+                last_reap = loop_time()
+                await reap_expired()
+
+            # 等待至少一个空闲槽位
+            await semaphore.acquire()
+            semaphore.release()
+
+            free_slots = concurrency - len(in_flight)
+            # 原子认领 queued 状态的任务（排除本进程正在处理的任务）；
+            # 认领过程不被停止打断，以便收尾时拿到已认领的任务放回队列
+            claiming = asyncio.ensure_future(claim_tasks(min(free_slots, CONFIG["batch_size"]), exclude_ids=in_flight))
+            pending = await asyncio.shield(claiming)
+            claiming = None
+
+            if pending:
+                print(f"[ImageWorker] Dispatching {len(pending)} tasks ({len(in_flight)} in flight)")
+                while pending:
+                    await semaphore.acquire()
+                    task = pending.pop(0)
+                    in_flight.add(task.id)
+                    job = asyncio.create_task(_run_task(task, semaphore, in_flight))
+                    running[job] = task
+                    job.add_done_callback(lambda done: running.pop(done, None))
             else:
-                await asyncio.sleep(CONFIG["poll_interval"])
+                # 等待新任务通知，超时后兜底轮询一次
+                await notifier.wait(CONFIG["poll_interval"])
 
         except asyncio.CancelledError:
             print("[ImageWorker] Stopping...")
+            if claiming is not None:
+                (claimed,) = await asyncio.gather(claiming, return_exceptions=True)
+                pending = claimed if isinstance(claimed, list) else []
+            await _drain(running, drain_timeout, pending)
             break
         except Exception as e:
+            claiming = None
             print(f"[ImageWorker] Error: {e}")
-            await asyncio.sleep(CONFIG["poll_interval"])
+            await asyncio.sleep(CONFIG["error_delay"])
 
 
-def start_worker():
-    """启动 Worker"""
-    loop = asyncio.new_event_loop()
-    asyncio.set_event_loop(loop)
+async def run_worker(
+    concurrency: Optional[int] = None,
+    drain_timeout: Optional[float] = None,
+    with_batch_lane: bool = False,
+    metrics_port: Optional[int] = None,
+):
+    """独立 Worker 进程的入口：初始化数据库，运行主循环直到收到 SIGTERM / SIGINT
 
-    async def init_db_and_run():
-        from tortoise import Tortoise
+    收到信号后停止认领新任务，等待处理中的任务完成（最多 drain_timeout 秒）后退出。
 
-        await Tortoise.init(config=settings.get_tortoise_orm())
-        # 注意：这里不再自动生成 Schema，避免生产环境意外
-        # await Tortoise.generate_schemas()
-        try:
-            await worker_loop()
-        finally:
-            await Tortoise.close_connections()
+    Args:
+        concurrency: 同时处理的任务数
+        drain_timeout: 停止时等待处理中任务的最长时间（秒）
+        with_batch_lane: 是否同时运行批量通道（多进程部署时只需一个进程运行）
+        metrics_port: 本进程指标接口的端口（见 metrics_server），为空时不提供
+    """
+    import signal
+
+    from tortoise import Tortoise
+
+    await Tortoise.init(config=settings.get_tortoise_orm())
+    # 注意：这里不再自动生成 Schema，避免生产环境意外
+    # await Tortoise.generate_schemas()
+
+    # 独立 Worker 没有 WebSocket 连接，也收不到 API 进程的本地新任务通知，需通过事件表跨进程转发
+    from app.core import task_events
+
+    if task_events.is_enabled():
+        task_events.setup_worker_process()
+    else:
+        print("[ImageWorker] TASK_EVENTS_BACKEND=local: status pushes from this process are not delivered")
 
-    loop.run_until_complete(init_db_and_run())
+    # 指标保存在本进程内存中，API 的指标接口看不到，需要单独暴露
+    metrics_server = None
+    if metrics_port:
+        from app.core.metrics_server import serve_metrics
+
+        metrics_server = await serve_metrics(metrics_port)
+
+    jobs = [asyncio.create_task(worker_loop(concurrency, drain_timeout))]
+    if with_batch_lane and settings.BATCH_LANE_ENABLED:
+        from app.core.batch_lane import batch_loop
+
+        jobs.append(asyncio.create_task(batch_loop()))
+
+    def stop():
+        # 重复的信号（如 Ctrl+C 同时发给主进程和子进程）不打断正在进行的收尾
+        if stopping.is_set():
+            return
+        stopping.set()
+        print(f"[ImageWorker] Received stop signal (pid={os.getpid()})")
+        for job in jobs:
+            job.cancel()
+
+    stopping = asyncio.Event()
+
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        loop.add_signal_handler(sig, stop)
+
+    try:
+        await asyncio.gather(*jobs, return_exceptions=True)
+    finally:
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.remove_signal_handler(sig)
+        if metrics_server is not None:
+            metrics_server.close()
+        await Tortoise.close_connections()
+
+
+def start_worker(concurrency: Optional[int] = None, with_batch_lane: bool = False):
+    """启动 Worker（阻塞直到收到停止信号）"""
+    asyncio.run(run_worker(concurrency, with_batch_lane=with_batch_lane))
 
 
 if __name__ == "__main__":
@@ -50,6 +50,7 @@ def make_middlewares():
             methods=["GET", "POST", "PUT", "DELETE"],
             exclude_paths=[
                 "/api/v1/base/access_token",
+                "/api/v1/metrics",  # Prometheus 定期抓取，不记审计日志
                 "/docs",
                 "/openapi.json",
             ],
@@ -0,0 +1,84 @@
+"""
+独立 Worker 进程的指标接口
+
+指标保存在各进程内存中，API 的 /api/v1/metrics 只能看到 API 进程（含内嵌 Worker）的统计。
+独立部署的 Worker（python worker.py）设置 WORKER_METRICS_PORT 后，每个进程在 port + 进程序号 上
+提供 GET /metrics（Prometheus 文本格式），由 Prometheus 逐个抓取，instance 标签区分各进程。
+
+与 API 的指标接口一样需要 METRICS_TOKEN（Authorization: Bearer <token>），未配置令牌时不启动。
+只输出本进程的耗时、重试和 in-flight 统计，队列深度等数据库统计仍由 API 的指标接口提供。
+"""
+
+import asyncio
+import hmac
+from typing import Dict, Optional
+
+from app.core.metrics import registry
+from app.settings.config import settings
+
+# 读取请求行和请求头的超时（秒），防止空闲连接一直占用
+READ_TIMEOUT = 5
+CONTENT_TYPE = "text/plain; version=0.0.4"
+
+
+def is_valid_scrape_token(authorization: Optional[str]) -> bool:
+    """校验 Authorization: Bearer <METRICS_TOKEN>，未配置令牌时一律无效"""
+    if not settings.METRICS_TOKEN:
+        return False
+    token = authorization[7:] if authorization and authorization.startswith("Bearer ") else ""
+    return hmac.compare_digest(token.encode(), settings.METRICS_TOKEN.encode())
+
+
+async def _read_request(reader: asyncio.StreamReader):
+    """读取请求行和请求头，返回 (method, path, headers)"""
+    request_line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+    headers: Dict[str, str] = {}
+    while True:
+        line = await asyncio.wait_for(reader.readline(), READ_TIMEOUT)
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    parts = request_line.decode("latin-1").split()
+    method, path = (parts[0], parts[1]) if len(parts) >= 2 else ("", "")
+    return method, path.split("?", 1)[0], headers
+
+
+async def _handle(reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    try:
+        method, path, headers = await _read_request(reader)
+        if method != "GET" or path.rstrip("/") != "/metrics":
+            status, body = "404 Not Found", "Not Found\n"
+        elif not is_valid_scrape_token(headers.get("authorization")):
+            status, body = "401 Unauthorized", "Invalid scrape token\n"
+        else:
+            status, body = "200 OK", registry.render()
+        payload = body.encode()
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {CONTENT_TYPE}\r\n"
+            f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload
+        )
+        await writer.drain()
+    except (asyncio.TimeoutError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+async def serve_metrics(port: int, host: Optional[str] = None) -> Optional[asyncio.AbstractServer]:
+    """在 host:port 上提供本进程的 /metrics
+
+    Returns:
+        已启动的服务（退出时调用 close()）；未配置 METRICS_TOKEN 或端口被占用时返回 None
+    """
+    if not settings.METRICS_TOKEN:
+        print("[Metrics] METRICS_TOKEN is not set, worker metrics endpoint disabled")
+        return None
+    host = host or settings.WORKER_METRICS_HOST
+    try:
+        server = await asyncio.start_server(_handle, host, port)
+    except OSError as e:
+        print(f"[Metrics] Failed to listen on {host}:{port}: {e}")
+        return None
+    print(f"[Metrics] Serving worker metrics on {host}:{port}/metrics")
+    return server
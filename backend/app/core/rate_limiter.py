@@ -0,0 +1,262 @@
+"""
+Gemini 调用限流器
+
+按模型限制每分钟请求数（令牌桶）和同时进行的请求数。超出预算的请求按到达顺序排队等待，
+而不是直接失败；收到 429 时暂停该模型的发放，避免各 Worker 各自重试放大请求风暴。
+
+限流预算从环境变量读取（与 ImageClient 的其他配置一致）：
+    GEMINI_RPM              每个模型每分钟请求数，0 表示不限制（默认 60）
+    GEMINI_MAX_CONCURRENT   每个模型同时进行的请求数，0 表示不限制（默认 8）
+    GEMINI_RATE_LIMITS      按模型覆盖，JSON，如 {"gemini-3-pro-image-preview": {"rpm": 20, "max_concurrent": 4}}
+    GEMINI_RATE_LIMIT_BACKEND  local（默认，进程内）/ database（多进程共享每分钟配额）
+
+多个 Worker 进程共享配额时使用 DatabaseRateLimiter：令牌桶状态保存在 rate_limit_bucket 表，
+通过条件 UPDATE 原子扣减；并发数仍按进程限制。其他共享存储（如 Redis）可继承
+RateLimiter 实现 _try_take / _block 后通过 set_rate_limiter 替换。
+"""
+
+import asyncio
+import json
+import os
+import time
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+# 收到 429 但没有 Retry-After 提示时的暂停时长（秒）
+DEFAULT_PENALTY_SECONDS = 5.0
+
+
+@dataclass
+class RateBudget:
+    """单个模型的限流预算"""
+
+    rpm: int = 0
+    max_concurrent: int = 0
+    burst: Optional[int] = None  # 令牌桶容量，默认 10 秒的配额
+
+    @property
+    def rate(self) -> float:
+        """每秒发放的令牌数"""
+        return self.rpm / 60.0
+
+    @property
+    def capacity(self) -> float:
+        if self.burst:
+            return float(self.burst)
+        return float(max(1, self.rpm // 6))
+
+
+@dataclass
+class _ModelState:
+    """进程内的模型限流状态"""
+
+    budget: RateBudget
+    tokens: float
+    refreshed_at: float
+    blocked_until: float = 0.0
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    slots: Optional[asyncio.Semaphore] = None
+
+
+def load_budgets() -> Dict[str, RateBudget]:
+    """从环境变量读取按模型覆盖的预算"""
+    raw = os.getenv("GEMINI_RATE_LIMITS", "").strip()
+    if not raw:
+        return {}
+    try:
+        overrides = json.loads(raw)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid GEMINI_RATE_LIMITS: {e}") from e
+    return {model: RateBudget(**values) for model, values in overrides.items()}
+
+
+class RateLimiter:
+    """限流器基类
+
+    acquire 按 FIFO 顺序获取并发槽位和令牌，release 归还槽位。
+    子类通过 _try_take / _block 决定令牌桶状态保存在哪里。
+    """
+
+    def __init__(
+        self,
+        default_budget: Optional[RateBudget] = None,
+        budgets: Optional[Dict[str, RateBudget]] = None,
+    ):
+        self.default_budget = default_budget or RateBudget()
+        self.budgets = budgets or {}
+        self._states: Dict[str, _ModelState] = {}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def budget_for(self, model: str) -> RateBudget:
+        return self.budgets.get(model, self.default_budget)
+
+    def _state(self, model: str) -> _ModelState:
+        # asyncio 原语绑定在事件循环上，事件循环变化时重建状态
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._states = {}
+            self._loop = loop
+
+        state = self._states.get(model)
+        if state is None:
+            budget = self.budget_for(model)
+            state = _ModelState(budget=budget, tokens=budget.capacity, refreshed_at=time.monotonic())
+            if budget.max_concurrent > 0:
+                state.slots = asyncio.Semaphore(budget.max_concurrent)
+            self._states[model] = state
+        return state
+
+    async def _try_take(self, model: str, state: _ModelState) -> float:
+        """尝试取一个令牌
+
+        Returns:
+            0 表示已取得；否则为需要等待的秒数
+        """
+        raise NotImplementedError
+
+    async def _block(self, model: str, state: _ModelState, seconds: float):
+        """在 seconds 秒内停止发放令牌"""
+        raise NotImplementedError
+
+    async def acquire(self, model: str):
+        """等待直到该模型的请求预算允许发出一个请求"""
+        state = self._state(model)
+        # asyncio.Lock 按等待顺序唤醒，持锁者才去等待槽位和令牌，保证 FIFO
+        async with state.lock:
+            if state.slots is not None:
+                await state.slots.acquire()
+            try:
+                if state.budget.rpm <= 0:
+                    return
+                while True:
+                    wait = await self._try_take(model, state)
+                    if wait <= 0:
+                        return
+                    await asyncio.sleep(wait)
+            except BaseException:
+                if state.slots is not None:
+                    state.slots.release()
+                raise
+
+    async def release(self, model: str):
+        """请求结束，归还并发槽位"""
+        state = self._state(model)
+        if state.slots is not None:
+            state.slots.release()
+
+    async def penalize(self, model: str, seconds: Optional[float] = None):
+        """收到 429 后暂停该模型的令牌发放"""
+        state = self._state(model)
+        await self._block(model, state, seconds or DEFAULT_PENALTY_SECONDS)
+
+    @asynccontextmanager
+    async def limit(self, model: str):
+        """async with limiter.limit(model): 包裹一次 Gemini 请求"""
+        await self.acquire(model)
+        try:
+            yield
+        finally:
+            await self.release(model)
+
+
+class LocalRateLimiter(RateLimiter):
+    """进程内令牌桶"""
+
+    async def _try_take(self, model: str, state: _ModelState) -> float:
+        budget = state.budget
+        now = time.monotonic()
+        if state.blocked_until > now:
+            return state.blocked_until - now
+
+        state.tokens = min(budget.capacity, state.tokens + (now - state.refreshed_at) * budget.rate)
+        state.refreshed_at = now
+        if state.tokens >= 1:
+            state.tokens -= 1
+            return 0
+        return (1 - state.tokens) / budget.rate
+
+    async def _block(self, model: str, state: _ModelState, seconds: float):
+        now = time.monotonic()
+        state.blocked_until = max(state.blocked_until, now + seconds)
+        state.tokens = 0
+        state.refreshed_at = now
+
+
+class DatabaseRateLimiter(RateLimiter):
+    """数据库共享令牌桶
+
+    每个模型一行 RateLimitBucket，按墙钟时间补充令牌，用条件 UPDATE（CAS）扣减，
+    多个 Worker 进程共同遵守同一个每分钟配额。并发槽位和 FIFO 顺序仍是进程内的。
+    """
+
+    async def _bucket(self, model: str, budget: RateBudget):
+        from tortoise.exceptions import IntegrityError
+
+        from app.models import RateLimitBucket
+
+        bucket = await RateLimitBucket.filter(key=model).first()
+        if bucket is None:
+            try:
+                bucket = await RateLimitBucket.create(key=model, tokens=budget.capacity, refreshed_at=time.time())
+            except IntegrityError:
+                # 其他进程已创建
+                bucket = await RateLimitBucket.get(key=model)
+        return bucket
+
+    async def _try_take(self, model: str, state: _ModelState) -> float:
+        from app.models import RateLimitBucket
+
+        budget = state.budget
+        while True:
+            bucket = await self._bucket(model, budget)
+            now = time.time()
+            if bucket.blocked_until > now:
+                return bucket.blocked_until - now
+
+            tokens = min(budget.capacity, bucket.tokens + max(0.0, now - bucket.refreshed_at) * budget.rate)
+            if tokens < 1:
+                return (1 - tokens) / budget.rate
+
+            updated = await RateLimitBucket.filter(
+                key=model, refreshed_at=bucket.refreshed_at, tokens=bucket.tokens
+            ).update(tokens=tokens - 1, refreshed_at=now)
+            if updated:
+                return 0
+            # 被其他进程抢先更新，重新读取
+
+    async def _block(self, model: str, state: _ModelState, seconds: float):
+        from app.models import RateLimitBucket
+
+        await self._bucket(model, state.budget)
+        blocked_until = time.time() + seconds
+        await RateLimitBucket.filter(key=model, blocked_until__lt=blocked_until).update(blocked_until=blocked_until)
+
+
+def create_rate_limiter() -> RateLimiter:
+    """根据环境变量创建限流器"""
+    default_budget = RateBudget(
+        rpm=int(os.getenv("GEMINI_RPM", "60")),
+        max_concurrent=int(os.getenv("GEMINI_MAX_CONCURRENT", "8")),
+    )
+    backend = os.getenv("GEMINI_RATE_LIMIT_BACKEND", "local").lower()
+    limiter_cls = DatabaseRateLimiter if backend == "database" else LocalRateLimiter
+    return limiter_cls(default_budget=default_budget, budgets=load_budgets())
+
+
+# 进程级限流器（懒加载）
+_rate_limiter: Optional[RateLimiter] = None
+
+
+def get_rate_limiter() -> RateLimiter:
+    """获取全局限流器，首次调用时根据环境变量创建"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        _rate_limiter = create_rate_limiter()
+    return _rate_limiter
+
+
+def set_rate_limiter(limiter: Optional[RateLimiter]):
+    """替换全局限流器；传 None 时下次使用会按环境变量重新创建"""
+    global _rate_limiter
+    _rate_limiter = limiter
@@ -0,0 +1,119 @@
+"""
+生成任务的重试策略
+
+按错误类型决定是否重试以及等待多久：
+- 永久错误（安全策略拦截、参数错误、4xx 请求错误）：立即失败，不再重试
+  例外：参考图文件在远端失效（过期、不存在）导致的拒绝，重新上传后可能成功，按临时错误重试一次
+- 限流（429）：优先按服务端的 Retry-After 等待，否则指数退避
+- 临时错误（5xx、超时、网络异常、未知错误）：指数退避 + 随机抖动
+"""
+
+import asyncio
+import random
+from dataclasses import dataclass
+from enum import Enum
+from typing import Any, Dict, Optional
+
+import httpx
+
+from app.core.image_client import genai_errors, get_retry_after
+
+
+class ErrorKind(str, Enum):
+    """错误分类"""
+
+    PERMANENT = "permanent"
+    TRANSIENT = "transient"
+    RATE_LIMITED = "rate_limited"
+
+
+@dataclass
+class ClassifiedError:
+    """分类后的错误"""
+
+    kind: ErrorKind
+    message: str
+    status_code: Optional[int] = None
+    retry_after: Optional[float] = None
+
+    @property
+    def retryable(self) -> bool:
+        return self.kind != ErrorKind.PERMANENT
+
+
+# 出现在错误信息中即视为永久错误的关键字
+PERMANENT_ERROR_MARKERS = (
+    "Generation prevented",
+    "Invalid aspect_ratio",
+    "Invalid resolution",
+    "Reference image not found",
+    "GEMINI_API_KEY not found",
+)
+
+
+def classify_status(status_code: Optional[int], message: str, retry_after: Optional[float] = None) -> ClassifiedError:
+    """按 HTTP 状态码分类"""
+    if status_code == 429:
+        return ClassifiedError(ErrorKind.RATE_LIMITED, message, status_code, retry_after)
+    if status_code in (408, 409) or (status_code or 0) >= 500:
+        return ClassifiedError(ErrorKind.TRANSIENT, message, status_code, retry_after)
+    if status_code is not None and 400 <= status_code < 500:
+        return ClassifiedError(ErrorKind.PERMANENT, message, status_code)
+    return ClassifiedError(ErrorKind.TRANSIENT, message, status_code, retry_after)
+
+
+def classify_exception(error: BaseException) -> ClassifiedError:
+    """对生成过程中抛出的异常分类
+
+    包装过的异常（raise ... from e）按原始异常分类，例如参考图下载超时包装成的 ValueError
+    仍视为临时错误。
+    """
+    message = str(error)
+    cause = error.__cause__
+    if cause is not None:
+        classified = classify_exception(cause)
+        classified.message = message
+        return classified
+
+    if isinstance(error, genai_errors.APIError):
+        return classify_status(error.code, message, get_retry_after(error))
+    if isinstance(error, httpx.HTTPStatusError):
+        return classify_status(error.response.status_code, message, get_retry_after(error))
+    if isinstance(error, (httpx.TransportError, asyncio.TimeoutError, ConnectionError)):
+        return ClassifiedError(ErrorKind.TRANSIENT, message)
+    if isinstance(error, (ValueError, TypeError)) or any(marker in message for marker in PERMANENT_ERROR_MARKERS):
+        return ClassifiedError(ErrorKind.PERMANENT, message)
+    return ClassifiedError(ErrorKind.TRANSIENT, message)
+
+
+def classify_result(result: Dict[str, Any], allow_reupload: bool = True) -> ClassifiedError:
+    """对 ImageClient 返回的 status=error 结果字典分类
+
+    Args:
+        result: ImageClient 返回的结果字典
+        allow_reupload: 参考图文件失效时是否按临时错误重试（重新上传）。
+            调用方每个任务只应允许一次，避免文件反复失效时每次都重新上传
+    """
+    message = result.get("error") or "Unknown error"
+    if "safety_ratings" in result or any(marker in message for marker in PERMANENT_ERROR_MARKERS):
+        return ClassifiedError(ErrorKind.PERMANENT, message)
+    if allow_reupload and result.get("references_invalidated"):
+        return ClassifiedError(ErrorKind.TRANSIENT, message, result.get("status_code"))
+    return classify_status(result.get("status_code"), message, result.get("retry_after"))
+
+
+def compute_backoff(
+    attempt: int,
+    base_delay: float,
+    max_delay: float,
+    retry_after: Optional[float] = None,
+) -> float:
+    """计算第 attempt 次（从 0 开始）失败后的等待时间
+
+    有 Retry-After 时按其等待（加少量抖动，避免多个 Worker 同时醒来）；
+    否则使用 full jitter 指数退避：uniform(0, min(max_delay, base_delay * 2^attempt))。
+    结果不超过 max_delay。
+    """
+    if retry_after is not None:
+        return min(max_delay, retry_after + random.uniform(0, 1))
+    return random.uniform(0, min(max_delay, base_delay * (2**attempt)))
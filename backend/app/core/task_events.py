@@ -0,0 +1,174 @@
+"""
+跨进程任务事件（数据库转发）
+
+默认的 ws_manager 推送和 LocalTaskNotifier 都只在本进程内生效，只适用于 API 进程内嵌 Worker 的部署。
+独立部署 Worker（python worker.py，WORKER_EMBEDDED=false）时设置 TASK_EVENTS_BACKEND=database：
+
+- Worker 进程：ws_manager 的推送写入 task_event 表（kind=push），由 API 进程转发给已连接的客户端
+- API 进程：relay_loop 轮询 task_event 表，把推送发给本进程持有的 WebSocket 连接；
+  多个 API 实例各自转发，消息只会由持有该用户连接的实例送达
+- 新任务通知：DatabaseTaskNotifier 写入 kind=notify 事件，Worker 轮询到后立即认领，不必等待 poll_interval
+
+轮询间隔按退避调整：读到事件后恢复为 TASK_EVENTS_POLL_SECONDS，空闲时逐次翻倍到 TASK_EVENTS_POLL_MAX_SECONDS，
+空闲进程只有很低的查询频率。API 进程创建新任务时立即恢复转发的最短间隔（随后会有 Worker 的推送）。
+事件按自增 ID 顺序读取，超过 TASK_EVENTS_RETENTION_SECONDS 的事件定期清理。
+其他共享存储（如 Redis Pub/Sub）可实现 TaskNotifier 与 ws_manager.set_publisher 的回调后替换。
+"""
+
+import asyncio
+from datetime import timedelta
+from typing import Optional
+
+from tortoise import timezone
+
+from app.core.task_notifier import TaskNotifier, set_task_notifier
+from app.core.ws_manager import ws_manager
+from app.models.task_event import TaskEvent
+from app.settings.config import settings
+
+PUSH = "push"
+NOTIFY = "notify"
+
+# relay_loop 运行时的唤醒事件（API 进程创建新任务时置位，恢复最短轮询间隔）
+_relay_wakeup: Optional[asyncio.Event] = None
+
+
+def is_enabled() -> bool:
+    """是否使用数据库转发跨进程事件"""
+    return settings.TASK_EVENTS_BACKEND.lower() == "database"
+
+
+async def latest_event_id() -> int:
+    """当前最新的事件 ID，新的读取者从这里开始，不重放历史事件"""
+    return await TaskEvent.all().order_by("-id").first().values_list("id", flat=True) or 0
+
+
+async def publish_push(user_id: str, message: dict):
+    """Worker 进程的 ws_manager 推送：写入事件表，由 API 进程转发"""
+    await TaskEvent.create(kind=PUSH, user_id=str(user_id), payload=message)
+
+
+class PollBackoff:
+    """轮询间隔退避：读到事件后恢复最短间隔，空闲时逐次翻倍直到最长间隔"""
+
+    def __init__(self, min_interval: Optional[float] = None, max_interval: Optional[float] = None):
+        self.min_interval = min_interval or settings.TASK_EVENTS_POLL_SECONDS
+        self.max_interval = max(max_interval or settings.TASK_EVENTS_POLL_MAX_SECONDS, self.min_interval)
+        self.interval = self.min_interval
+
+    def reset(self):
+        self.interval = self.min_interval
+
+    def next(self) -> float:
+        """返回本次等待的间隔，并把下一次的间隔翻倍"""
+        interval = self.interval
+        self.interval = min(self.interval * 2, self.max_interval)
+        return interval
+
+
+class DatabaseTaskNotifier(TaskNotifier):
+    """基于 task_event 表的跨进程新任务通知"""
+
+    def __init__(self, poll_interval: Optional[float] = None, max_poll_interval: Optional[float] = None):
+        self.backoff = PollBackoff(poll_interval, max_poll_interval)
+        self._last_id: Optional[int] = None
+
+    async def notify(self, task_id: str):
+        await TaskEvent.create(kind=NOTIFY, payload={"task_id": task_id})
+        if _relay_wakeup is not None:
+            _relay_wakeup.set()
+
+    async def wait(self, timeout: float) -> bool:
+        if self._last_id is None:
+            self._last_id = await latest_event_id()
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            latest = (
+                await TaskEvent.filter(kind=NOTIFY, id__gt=self._last_id)
+                .order_by("-id")
+                .first()
+                .values_list("id", flat=True)
+            )
+            if latest:
+                self._last_id = latest
+                self.backoff.reset()
+                return True
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return False
+            await asyncio.sleep(min(self.backoff.next(), remaining))
+
+
+async def relay_once(last_id: int) -> int:
+    """把 last_id 之后的推送事件发给本进程的 WebSocket 连接
+
+    Returns:
+        已处理的最新事件 ID
+    """
+    events = await TaskEvent.filter(kind=PUSH, id__gt=last_id).order_by("id")
+    for event in events:
+        if event.user_id in ws_manager.connections:
+            await ws_manager.send_message(event.user_id, event.payload)
+        last_id = event.id
+    return last_id
+
+
+async def purge_expired() -> int:
+    """清理超过保留时长的事件"""
+    before = timezone.now() - timedelta(seconds=settings.TASK_EVENTS_RETENTION_SECONDS)
+    return await TaskEvent.filter(created_at__lt=before).delete()
+
+
+async def _relay_sleep(wakeup: asyncio.Event, interval: float) -> bool:
+    """等待 interval 秒或被唤醒，返回是否被唤醒"""
+    try:
+        await asyncio.wait_for(wakeup.wait(), interval)
+        return True
+    except asyncio.TimeoutError:
+        return False
+    finally:
+        wakeup.clear()
+
+
+async def relay_loop():
+    """API 进程：转发独立 Worker 的推送，并定期清理过期事件"""
+    global _relay_wakeup
+    loop_time = asyncio.get_running_loop().time
+    last_id = await latest_event_id()
+    last_purge = loop_time()
+    backoff = PollBackoff()
+    wakeup = _relay_wakeup = asyncio.Event()
+    print(f"[TaskEvents] Relay started (poll_interval={backoff.min_interval}s-{backoff.max_interval}s)")
+
+    try:
+        while True:
+            try:
+                relayed = await relay_once(last_id)
+                if relayed != last_id:
+                    backoff.reset()
+                last_id = relayed
+                if loop_time() - last_purge >= settings.TASK_EVENTS_RETENTION_SECONDS:
+                    last_purge = loop_time()
+                    await purge_expired()
+                if await _relay_sleep(wakeup, backoff.next()):
+                    backoff.reset()
+            except asyncio.CancelledError:
+                print("[TaskEvents] Relay stopping...")
+                break
+            except Exception as e:
+                print(f"[TaskEvents] Relay error: {e}")
+                await asyncio.sleep(backoff.next())
+    finally:
+        _relay_wakeup = None
+
+
+def setup_worker_process():
+    """独立 Worker 进程：推送写入事件表，通过事件表接收新任务通知"""
+    ws_manager.set_publisher(publish_push)
+    set_task_notifier(DatabaseTaskNotifier())
+
+
+def setup_api_process():
+    """API 进程：新任务通知写入事件表（推送仍直接发给本进程的连接，由 relay_loop 转发 Worker 的推送）"""
+    set_task_notifier(DatabaseTaskNotifier())
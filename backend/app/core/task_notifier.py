@@ -0,0 +1,77 @@
+"""
+任务通知器
+
+API 创建任务后通过通知器唤醒 Worker，Worker 不再依赖短间隔轮询数据库；
+轮询只作为兜底（通知丢失、其他进程创建的任务等）。
+
+默认实现 LocalTaskNotifier 基于 asyncio.Event，只能唤醒同一进程内的 Worker。
+独立部署 Worker 时设置 TASK_EVENTS_BACKEND=database 使用 DatabaseTaskNotifier（见 task_events）；
+也可实现其他 TaskNotifier（如 Redis Pub/Sub）并通过 set_task_notifier 替换。
+"""
+
+import asyncio
+from typing import Optional
+
+
+class TaskNotifier:
+    """任务通知器接口"""
+
+    async def notify(self, task_id: str):
+        """通知有新任务入队"""
+        raise NotImplementedError
+
+    async def wait(self, timeout: float) -> bool:
+        """等待新任务通知
+
+        Args:
+            timeout: 最长等待时间（秒）
+
+        Returns:
+            是否收到通知（超时返回 False）
+        """
+        raise NotImplementedError
+
+
+class LocalTaskNotifier(TaskNotifier):
+    """进程内通知器（asyncio.Event）"""
+
+    def __init__(self):
+        self._event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _get_event(self) -> asyncio.Event:
+        # Event 绑定在首次使用时的事件循环上，事件循环变化时重新创建
+        loop = asyncio.get_running_loop()
+        if self._event is None or self._loop is not loop:
+            self._event = asyncio.Event()
+            self._loop = loop
+        return self._event
+
+    async def notify(self, task_id: str):
+        self._get_event().set()
+
+    async def wait(self, timeout: float) -> bool:
+        event = self._get_event()
+        try:
+            await asyncio.wait_for(event.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+        finally:
+            # 在认领任务之前清除，认领之后到达的通知会让下一次 wait 立即返回
+            event.clear()
+
+
+# 全局通知器实例
+_task_notifier: TaskNotifier = LocalTaskNotifier()
+
+
+def get_task_notifier() -> TaskNotifier:
+    """获取全局任务通知器"""
+    return _task_notifier
+
+
+def set_task_notifier(notifier: TaskNotifier):
+    """替换全局任务通知器（如跨进程的 Redis 实现）"""
+    global _task_notifier
+    _task_notifier = notifier
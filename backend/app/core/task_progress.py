@@ -0,0 +1,79 @@
+"""
+任务进度推送
+
+Worker 处理任务期间通过 WebSocket 推送中间阶段（参考图已上传、生成中、上传结果中），
+客户端不必轮询 GET /tasks/{id}。
+
+同一任务的进度推送间隔不小于 TASK_PROGRESS_MIN_INTERVAL：间隔内到达的阶段合并，
+只在间隔结束时推送最新的一个。最终的 succeeded / failed 由 image_worker 直接推送，
+推送之前先关闭 ProgressReporter，丢弃尚未发出的进度，保证进度消息不会晚于最终状态到达。
+"""
+
+import asyncio
+from typing import Any, Dict, Optional, Tuple
+
+from app.core.ws_manager import ws_manager
+from app.models.generation_task import GenerationTask
+from app.settings.config import settings
+
+
+class ProgressReporter:
+    """单个任务的进度推送（合并 + 限速）"""
+
+    def __init__(self, task: GenerationTask, min_interval: Optional[float] = None):
+        self.task = task
+        self.min_interval = settings.TASK_PROGRESS_MIN_INTERVAL if min_interval is None else min_interval
+        self.closed = False
+        self._last_sent: Optional[float] = None
+        self._pending: Optional[Tuple[str, Dict[str, Any]]] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    async def report(self, stage: str, **details: Any):
+        """报告进入新阶段；距上次推送不足 min_interval 时延后合并推送"""
+        if self.closed:
+            return
+        self._pending = (stage, details)
+
+        wait = self._wait_time()
+        if wait <= 0 and self._flush_task is None:
+            await self._send_pending()
+        elif self._flush_task is None:
+            self._flush_task = asyncio.create_task(self._flush_later(wait))
+
+    def close(self):
+        """停止推送，丢弃尚未发出的进度（推送最终状态前调用）"""
+        self.closed = True
+        self._pending = None
+        if self._flush_task is not None:
+            self._flush_task.cancel()
+            self._flush_task = None
+
+    def _wait_time(self) -> float:
+        if self._last_sent is None:
+            return 0
+        return self._last_sent + self.min_interval - asyncio.get_running_loop().time()
+
+    async def _flush_later(self, delay: float):
+        try:
+            await asyncio.sleep(delay)
+            self._flush_task = None
+            await self._send_pending()
+        except asyncio.CancelledError:
+            pass
+
+    async def _send_pending(self):
+        if self.closed or self._pending is None:
+            return
+        stage, details = self._pending
+        self._pending = None
+        self._last_sent = asyncio.get_running_loop().time()
+        try:
+            await ws_manager.push_task_update(
+                user_id=self.task.user_id,
+                task_id=str(self.task.id),
+                status="processing",
+                stage=stage,
+                details=details or None,
+            )
+        except Exception as e:
+            print(f"[TaskProgress] Push failed for task {self.task.id}: {e}")
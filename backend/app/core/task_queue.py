@@ -0,0 +1,257 @@
+"""
+生成任务队列
+
+多个 Worker 进程（包括 API 进程内嵌的 Worker 和独立启动的 Worker）共享 generation_task 表。
+认领任务使用条件 UPDATE（WHERE status = queued），只有更新成功的 Worker 才拥有该任务，
+不依赖数据库特有的行锁语法，MySQL / SQLite 均可使用。
+
+认领时写入租约到期时间，处理期间由 Worker 心跳续约（extend_lease）。
+Worker 进程崩溃或被杀后租约不再续期，reap_expired_tasks 会把这些任务重新入队，
+执行次数（attempts）达到上限的任务标记为失败。
+
+用户取消（或删除）任务时，cancel_task 通过条件 UPDATE 把 queued / processing 任务改为 cancelled；
+正在处理的 Worker 续约失败后中止生成，结束时的保存也以仍由自己处理为条件，不会覆盖取消状态。
+"""
+
+import os
+import socket
+import uuid
+from datetime import timedelta
+from typing import Any, Iterable, List, Optional, Tuple
+
+from tortoise import timezone
+from tortoise.expressions import F, Q
+from tortoise.functions import Min
+
+from app.core.task_scheduler import schedule_tasks
+from app.models.generation_task import GenerationTask, TaskLane, TaskStatus
+from app.settings.config import settings
+
+# 当前进程的 Worker 标识：主机名:进程号:随机后缀
+WORKER_ID = f"{socket.gethostname()[:40]}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+
+def lease_deadline(lease_seconds: Optional[int] = None):
+    """计算租约到期时间"""
+    return timezone.now() + timedelta(seconds=lease_seconds or settings.IMAGE_WORKER_LEASE_SECONDS)
+
+
+async def claim_task(task: GenerationTask, worker_id: str = WORKER_ID) -> bool:
+    """原子认领单个任务
+
+    Returns:
+        是否认领成功；任务已被其他 Worker 认领时返回 False
+    """
+    now = timezone.now()
+    lease_expires_at = lease_deadline()
+    updated = await GenerationTask.filter(id=task.id, status=TaskStatus.QUEUED, is_deleted=False).update(
+        status=TaskStatus.PROCESSING,
+        worker_id=worker_id,
+        started_at=now,
+        lease_expires_at=lease_expires_at,
+        attempts=F("attempts") + 1,
+    )
+    if not updated:
+        return False
+
+    task.status = TaskStatus.PROCESSING
+    task.worker_id = worker_id
+    task.started_at = now
+    task.lease_expires_at = lease_expires_at
+    task.attempts += 1
+    return True
+
+
+async def claim_tasks(
+    limit: int,
+    exclude_ids: Optional[Iterable[Any]] = None,
+    worker_id: str = WORKER_ID,
+    lane: TaskLane = TaskLane.INTERACTIVE,
+) -> List[GenerationTask]:
+    """按调度顺序（优先级、老化、用户公平，见 task_scheduler）认领最多 limit 个 queued 任务
+
+    Args:
+        limit: 最多认领的任务数
+        exclude_ids: 需要排除的任务 ID（如本进程正在处理的任务）
+        worker_id: 认领者标识
+        lane: 执行通道，实时 Worker 只认领 interactive 任务，batch 任务由批量通道认领
+
+    Returns:
+        认领成功的任务列表（可能少于 limit）
+    """
+    if limit <= 0:
+        return []
+
+    candidates = await fetch_candidates(exclude_ids, lane)
+    if not candidates:
+        return []
+
+    running_users = await GenerationTask.filter(status=TaskStatus.PROCESSING).values_list("user_id", flat=True)
+    claimed = []
+    # 按调度顺序认领，被其他 Worker 抢先的任务跳过，继续认领后面的
+    for task in schedule_tasks(candidates, len(candidates), timezone.now(), running_users):
+        if await claim_task(task, worker_id):
+            claimed.append(task)
+            if len(claimed) >= limit:
+                break
+    return claimed
+
+
+async def fetch_candidates(
+    exclude_ids: Optional[Iterable[Any]] = None,
+    lane: TaskLane = TaskLane.INTERACTIVE,
+) -> List[GenerationTask]:
+    """读取参与调度的候选 queued 任务
+
+    候选集为以下几部分的并集，保证大量积压时每个等待中的用户、最高优先级和最久等待的任务都在其中：
+    1. 按优先级、创建时间排序的前 TASK_SCHEDULE_WINDOW 个任务
+    2. 每个有任务在排队的用户最早的一个任务（按用户分组，最多 TASK_SCHEDULE_WINDOW 个用户）
+    """
+    window = settings.TASK_SCHEDULE_WINDOW
+    query = GenerationTask.filter(status=TaskStatus.QUEUED, lane=lane, is_deleted=False)
+    exclude_ids = list(exclude_ids or [])
+    if exclude_ids:
+        query = query.exclude(id__in=exclude_ids)
+
+    candidates = {task.id: task for task in await query.order_by("-priority", "created_at").limit(window)}
+
+    heads = (
+        await query.annotate(oldest=Min("created_at"))
+        .group_by("user_id")
+        .order_by("oldest")
+        .limit(window)
+        .values("user_id", "oldest")
+    )
+    known = {(task.user_id, task.created_at) for task in candidates.values()}
+    missing = [row for row in heads if (row["user_id"], row["oldest"]) not in known]
+    if missing:
+        condition = Q(*[Q(user_id=row["user_id"], created_at=row["oldest"]) for row in missing], join_type="OR")
+        for task in await query.filter(condition):
+            candidates.setdefault(task.id, task)
+
+    return list(candidates.values())
+
+
+async def queue_position(task: GenerationTask) -> int:
+    """任务在所属通道中的大致排队位置（从 1 开始）
+
+    按基础优先级和创建时间估算，不含老化与用户公平的调整，仅用于展示。
+    """
+    ahead = await GenerationTask.filter(
+        Q(priority__gt=task.priority) | Q(priority=task.priority, created_at__lt=task.created_at),
+        status=TaskStatus.QUEUED,
+        lane=task.lane,
+        is_deleted=False,
+    ).count()
+    return ahead + 1
+
+
+async def extend_lease(task: GenerationTask, worker_id: str = WORKER_ID) -> bool:
+    """续约：仅当任务仍由该 Worker 处理时延长租约
+
+    Returns:
+        是否续约成功；返回 False 说明任务已被回收或已结束
+    """
+    lease_expires_at = lease_deadline()
+    updated = await GenerationTask.filter(id=task.id, worker_id=worker_id, status=TaskStatus.PROCESSING).update(
+        lease_expires_at=lease_expires_at
+    )
+    if updated:
+        task.lease_expires_at = lease_expires_at
+    return bool(updated)
+
+
+async def cancel_task(task: GenerationTask, reason: str = "Cancelled by user") -> bool:
+    """取消未结束的任务
+
+    queued 任务不会再被认领；processing 任务由处理它的 Worker 在下一次续约时发现并中止。
+
+    Returns:
+        是否取消成功；任务已结束时返回 False
+    """
+    now = timezone.now()
+    error = {"code": "CANCELLED", "message": reason}
+    updated = await GenerationTask.filter(id=task.id, status__in=[TaskStatus.QUEUED, TaskStatus.PROCESSING]).update(
+        status=TaskStatus.CANCELLED, error=error, finished_at=now, lease_expires_at=None
+    )
+    if not updated:
+        return False
+
+    task.status = TaskStatus.CANCELLED
+    task.error = error
+    task.finished_at = now
+    task.lease_expires_at = None
+    return True
+
+
+async def reap_expired_tasks(max_attempts: Optional[int] = None) -> Tuple[List[GenerationTask], List[GenerationTask]]:
+    """回收租约已过期的 processing 任务
+
+    没有租约的 processing 任务（租约机制上线前遗留）按 started_at + 租约时长判断是否过期；
+    已提交到 Gemini 批量任务、等待结果的任务（batch_job 非空且无租约）不回收。
+    更新条件带上读到的 lease_expires_at，避免覆盖刚刚续约成功的任务。
+
+    Args:
+        max_attempts: 最多执行次数，已达到的任务标记为失败，否则重新入队
+
+    Returns:
+        (重新入队的任务列表, 标记失败的任务列表)
+    """
+    max_attempts = max_attempts or settings.IMAGE_WORKER_MAX_ATTEMPTS
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.IMAGE_WORKER_LEASE_SECONDS)
+    expired = await GenerationTask.filter(
+        Q(lease_expires_at__lt=now)
+        | Q(lease_expires_at__isnull=True, batch_job__isnull=True, started_at__lt=stale_before),
+        status=TaskStatus.PROCESSING,
+    )
+
+    requeued, failed = [], []
+    for task in expired:
+        query = GenerationTask.filter(id=task.id, status=TaskStatus.PROCESSING, lease_expires_at=task.lease_expires_at)
+        if task.attempts >= max_attempts:
+            task.status = TaskStatus.FAILED
+            task.error = {
+                "code": "LEASE_EXPIRED",
+                "message": f"Worker stopped responding after {task.attempts} attempts",
+            }
+            task.finished_at = now
+            updated = await query.update(status=task.status, error=task.error, finished_at=now, lease_expires_at=None)
+            if updated:
+                failed.append(task)
+        else:
+            task.status = TaskStatus.QUEUED
+            updated = await query.update(
+                status=task.status, worker_id=None, started_at=None, lease_expires_at=None, batch_job=None
+            )
+            if updated:
+                requeued.append(task)
+    return requeued, failed
+
+
+async def release_tasks(
+    tasks: Iterable[GenerationTask],
+    worker_id: str = WORKER_ID,
+    refund_attempt: bool = True,
+) -> int:
+    """放弃认领：把仍由该 Worker 持有的 processing 任务放回队列
+
+    Args:
+        tasks: 要放回的任务
+        worker_id: 当前持有者，已被回收或转给其他 Worker 的任务不受影响
+        refund_attempt: 本次认领是否不计入执行次数（任务还未真正执行时为 True）
+
+    Returns:
+        放回队列的任务数
+    """
+    ids = [task.id for task in tasks]
+    if not ids:
+        return 0
+    return await GenerationTask.filter(id__in=ids, worker_id=worker_id, status=TaskStatus.PROCESSING).update(
+        status=TaskStatus.QUEUED,
+        worker_id=None,
+        started_at=None,
+        lease_expires_at=None,
+        batch_job=None,
+        attempts=F("attempts") - 1 if refund_attempt else F("attempts"),
+    )
@@ -0,0 +1,90 @@
+"""
+生成任务调度
+
+决定 Worker 空闲时先认领哪些 queued 任务：
+1. 优先级通道：任务创建时根据任务类型（试穿/模特图高于批量详情页）和用户是否付费计算 priority
+2. 老化：等待越久有效优先级越高，低优先级任务不会被一直饿死；
+   老化最多升到上一个通道的基础优先级，积压已久的批量任务只会与新的高优先级任务持平，不会越过它们
+3. 用户公平：同一有效优先级内按用户轮询，正在处理的任务多的用户排在后面，
+   单个用户批量提交的大量任务不会挤占其他用户
+
+schedule_tasks 是纯函数，只依赖传入的候选任务，便于测试；候选任务的查询见 task_queue.claim_tasks。
+"""
+
+from collections import Counter, defaultdict
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence
+
+from app.models.generation_task import GenerationTask, TaskType
+from app.settings.config import settings
+
+
+def task_priority(task_type: TaskType, user=None) -> int:
+    """计算新任务的基础优先级
+
+    Args:
+        task_type: 任务类型
+        user: 提交任务的用户，付费用户（有充值记录）额外加分
+    """
+    priority = settings.TASK_TYPE_PRIORITY.get(TaskType(task_type).value, 0)
+    if user is not None and getattr(user, "total_recharged", 0) > 0:
+        priority += settings.TASK_PAID_PRIORITY_BONUS
+    return priority
+
+
+def aging_cap(priority: int) -> Optional[int]:
+    """老化上限：比 priority 高的下一个任务类型通道的基础优先级，已在最高通道时不设上限"""
+    higher = [value for value in settings.TASK_TYPE_PRIORITY.values() if value > priority]
+    return min(higher) if higher else None
+
+
+def effective_priority(task: GenerationTask, now: datetime) -> int:
+    """有效优先级 = 基础优先级 + 等待时长每满 TASK_PRIORITY_AGING_SECONDS 加 1，不超过 aging_cap"""
+    waited = (now - task.created_at).total_seconds() if task.created_at else 0
+    priority = task.priority + max(0, int(waited // settings.TASK_PRIORITY_AGING_SECONDS))
+    cap = aging_cap(task.priority)
+    return priority if cap is None else min(priority, cap)
+
+
+def schedule_tasks(
+    candidates: Iterable[GenerationTask],
+    limit: int,
+    now: datetime,
+    running_users: Optional[Sequence[str]] = None,
+) -> List[GenerationTask]:
+    """从候选任务中选出接下来执行的最多 limit 个任务
+
+    每一步选择：有效优先级最高 > 已占用（正在处理 + 本轮已选）任务最少的用户 > 创建最早。
+
+    Args:
+        candidates: 候选 queued 任务
+        limit: 最多选择的任务数
+        now: 当前时间（计算老化）
+        running_users: 正在处理的任务所属用户列表（每个任务一项）
+
+    Returns:
+        按执行顺序排列的任务列表
+    """
+    per_user: Dict[str, List[GenerationTask]] = defaultdict(list)
+    priorities: Dict[object, int] = {}
+    for task in candidates:
+        priorities[task.id] = effective_priority(task, now)
+        per_user[task.user_id].append(task)
+
+    # 每个用户自己的任务按有效优先级、创建时间排序，只比较各用户的队首
+    for tasks in per_user.values():
+        tasks.sort(key=lambda t: (-priorities[t.id], t.created_at or now))
+
+    load = Counter(running_users or [])
+    selected: List[GenerationTask] = []
+    while len(selected) < limit and per_user:
+        user_id = min(
+            per_user,
+            key=lambda u: (-priorities[per_user[u][0].id], load[u], per_user[u][0].created_at or now),
+        )
+        queue = per_user[user_id]
+        selected.append(queue.pop(0))
+        load[user_id] += 1
+        if not queue:
+            del per_user[user_id]
+    return selected
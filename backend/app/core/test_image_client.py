@@ -15,7 +15,8 @@ app_dir = project_root / "backend" / "app"
 sys.path.insert(0, str(app_dir))
 
 import unittest
-from unittest.mock import patch, MagicMock
+import asyncio
+from unittest.mock import patch, MagicMock, AsyncMock
 from image_client import (
     ImageClient,
     generate_image,
@@ -23,8 +24,28 @@ from image_client import (
     Resolution,
     ASPECT_RATIO_MAP,
     RESOLUTION_MAP,
+    get_image_client,
+    reset_image_client,
+    ReferenceFileCache,
+    read_image_size,
 )
 
+_output_dir = None
+_output_patch = None
+
+
+def setUpModule():
+    """生成的图片写入临时目录，不落到仓库的 docs/assets"""
+    global _output_dir, _output_patch
+    _output_dir = tempfile.TemporaryDirectory()
+    _output_patch = patch.object(ImageClient, "_get_output_dir", return_value=Path(_output_dir.name))
+    _output_patch.start()
+
+
+def tearDownModule():
+    _output_patch.stop()
+    _output_dir.cleanup()
+
 
 class TestAspectRatioEnum(unittest.TestCase):
     """测试 AspectRatio 枚举"""
@@ -93,6 +114,12 @@ class TestImageClientInit(unittest.TestCase):
 class TestGenerateImageFunction(unittest.TestCase):
     """测试 generate_image 便捷函数"""
 
+    def setUp(self):
+        reset_image_client()
+
+    def tearDown(self):
+        reset_image_client()
+
     @patch('image_client.ImageClient')
     def test_generate_calls_client(self, mock_client_class):
         mock_client = MagicMock()
@@ -308,5 +335,399 @@ class TestIntegrationMock(unittest.TestCase):
             os.unlink(temp_path2)
 
 
+class TestSharedClient(unittest.TestCase):
+    """测试进程级共享的 ImageClient"""
+
+    def setUp(self):
+        reset_image_client()
+
+    def tearDown(self):
+        reset_image_client()
+
+    @patch('image_client.ImageClient')
+    def test_client_built_once_across_calls(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.generate.return_value = {"status": "success", "generated_images": []}
+        mock_client_class.return_value = mock_client
+
+        generate_image(prompt="first")
+        generate_image(prompt="second")
+
+        mock_client_class.assert_called_once()
+        self.assertIs(get_image_client(), mock_client)
+        self.assertEqual(mock_client.generate.call_count, 2)
+
+    @patch('image_client.ImageClient')
+    def test_explicit_api_key_uses_dedicated_client(self, mock_client_class):
+        generate_image(prompt="test", api_key="other_key")
+        mock_client_class.assert_called_once_with(api_key="other_key")
+
+
+class TestAsyncGeneration(unittest.TestCase):
+    """测试异步生成路径"""
+
+    @patch('image_client.genai.Client')
+    def test_agenerate_uses_aio_surface(self, mock_client_class):
+        mock_response = MagicMock()
+        mock_part = MagicMock()
+        mock_part.inline_data.data = b"fake_image_data"
+        mock_candidate = MagicMock()
+        mock_candidate.content.parts = [mock_part]
+        mock_response.candidates = [mock_candidate]
+
+        mock_file = MagicMock()
+        mock_file.state.name = "ACTIVE"
+
+        mock_client = MagicMock()
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
+        mock_client.aio.files.upload = AsyncMock(return_value=mock_file)
+        mock_client_class.return_value = mock_client
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+            f.write(b'fake_reference')
+            temp_path = f.name
+
+        stages = []
+
+        async def on_stage(stage):
+            stages.append(stage)
+
+        try:
+            client = ImageClient(api_key="test_api_key")
+            result = asyncio.run(
+                client.agenerate(prompt="async prompt", reference_images=[temp_path], verbose=False, on_stage=on_stage)
+            )
+        finally:
+            os.unlink(temp_path)
+
+        self.assertEqual(result["status"], "success")
+        self.assertEqual(stages, ["references_uploaded", "generating"])
+        self.assertEqual(len(result["generated_images"]), 1)
+        mock_client.models.generate_content.assert_not_called()
+        contents = mock_client.aio.models.generate_content.call_args.kwargs["contents"]
+        self.assertEqual(contents, ["async prompt", mock_file])
+
+    @patch('image_client.genai.Client')
+    def test_agenerate_rate_limited_and_penalized_on_429(self, mock_client_class):
+        from image_client import genai_errors
+
+        error = genai_errors.ClientError(
+            429, {"error": {"code": 429, "message": "quota", "status": "RESOURCE_EXHAUSTED"}}, None
+        )
+        mock_client = MagicMock()
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=error)
+        mock_client_class.return_value = mock_client
+
+        limiter = MagicMock()
+        limiter.acquire = AsyncMock()
+        limiter.release = AsyncMock()
+        limiter.penalize = AsyncMock()
+
+        client = ImageClient(api_key="test_api_key", model="test-model")
+        with patch('image_client.get_rate_limiter', return_value=limiter):
+            result = asyncio.run(client.agenerate(prompt="p", verbose=False))
+
+        self.assertEqual(result["status"], "error")
+        limiter.acquire.assert_awaited_once_with("test-model")
+        limiter.release.assert_awaited_once_with("test-model")
+        self.assertIn("generate_content", result["timings"])
+        limiter.penalize.assert_awaited_once_with("test-model", None)
+
+
+class TestBatchImageClient(unittest.TestCase):
+    """测试批量任务请求构建与结果解析"""
+
+    @patch('image_client.genai.Client')
+    def test_request_items_and_results_round_trip(self, mock_client_class):
+        from image_client import BatchImageClient, types
+
+        client = BatchImageClient(api_key="test_api_key")
+        reference = MagicMock(uri="https://files/abc", mime_type="image/jpeg")
+        request = client._build_request_item("prompt", 0, aspect_ratio="3:4", reference_files=[reference], key="t-1")
+        self.assertEqual(request.metadata, {"key": "t-1"})
+        self.assertEqual(request.contents[0].parts[1].file_data.file_uri, "https://files/abc")
+        self.assertEqual(request.config.image_config.aspect_ratio, "3:4")
+
+        image_part = types.Part(inline_data=types.Blob(data=b"img", mime_type="image/png"))
+        job = types.BatchJob(
+            name="batches/1",
+            state=types.JobState.JOB_STATE_SUCCEEDED,
+            dest=types.BatchJobDestination(
+                inlined_responses=[
+                    types.InlinedResponse(
+                        metadata={"key": "t-1"},
+                        response=types.GenerateContentResponse(
+                            candidates=[types.Candidate(content=types.Content(parts=[image_part]))]
+                        ),
+                    ),
+                    types.InlinedResponse(metadata={"key": "t-2"}, error=types.JobError(message="quota")),
+                ]
+            ),
+        )
+        parsed = client.parse_batch_job(job)
+
+        self.assertEqual(parsed["state"], "SUCCEEDED")
+        first, second = parsed["results"]
+        self.assertEqual(first["key"], "t-1")
+        self.assertEqual(first["image_data"], [{"data": b"img", "mime_type": "image/png"}])
+        self.assertEqual((second["key"], second["status"], second["error"]), ("t-2", "error", "quota"))
+
+
+class TestReferenceFileCache(unittest.TestCase):
+    """测试参考图上传缓存"""
+
+    def _file(self, name, expiration_time=None):
+        file_obj = MagicMock()
+        file_obj.name = name
+        file_obj.expiration_time = expiration_time
+        return file_obj
+
+    def test_url_and_digest_lookup(self):
+        cache = ReferenceFileCache()
+        file_obj = self._file("files/a")
+        cache.put("digest-a", file_obj, url="https://oss/a.jpg")
+
+        self.assertIs(cache.get_by_url("https://oss/a.jpg"), file_obj)
+        self.assertIsNone(cache.get_by_url("https://oss/b.jpg"))
+        # 内容相同的新 URL 命中后记录别名
+        self.assertIs(cache.get_by_digest("digest-a", url="https://oss/b.jpg"), file_obj)
+        self.assertIs(cache.get_by_url("https://oss/b.jpg"), file_obj)
+
+    def test_lru_eviction(self):
+        cache = ReferenceFileCache(max_entries=2)
+        cache.put("a", self._file("files/a"), url="u-a")
+        cache.put("b", self._file("files/b"), url="u-b")
+        cache.get_by_url("u-a")
+        cache.put("c", self._file("files/c"), url="u-c")
+
+        self.assertEqual(len(cache), 2)
+        self.assertIsNone(cache.get_by_url("u-b"))
+        self.assertIsNotNone(cache.get_by_url("u-a"))
+        self.assertIsNotNone(cache.get_by_url("u-c"))
+
+    def test_respects_remote_expiration(self):
+        from datetime import datetime, timedelta, timezone
+
+        cache = ReferenceFileCache(ttl_seconds=3600, expiry_margin=600)
+        soon = datetime.now(timezone.utc) + timedelta(seconds=300)
+        cache.put("a", self._file("files/a", expiration_time=soon), url="u-a")
+        self.assertIsNone(cache.get_by_url("u-a"))
+
+    def test_invalidate_by_file_name(self):
+        cache = ReferenceFileCache()
+        cache.put("a", self._file("files/a"), url="u-a")
+        cache.invalidate(["files/a"])
+        self.assertIsNone(cache.get_by_url("u-a"))
+        self.assertEqual(len(cache), 0)
+
+    @patch('image_client.genai.Client')
+    def test_repeat_reference_skips_upload(self, mock_client_class):
+        mock_file = MagicMock()
+        mock_file.state.name = "ACTIVE"
+        mock_client = MagicMock()
+        mock_client.aio.files.upload = AsyncMock(return_value=mock_file)
+        mock_client_class.return_value = mock_client
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+            f.write(b'same_reference')
+            temp_path = f.name
+
+        try:
+            client = ImageClient(api_key="test_api_key")
+
+            async def run():
+                first = await client._aprepare_reference(temp_path, verbose=False)
+                second = await client._aprepare_reference(temp_path, verbose=False)
+                return first, second
+
+            first, second = asyncio.run(run())
+        finally:
+            os.unlink(temp_path)
+
+        self.assertIs(first, second)
+        mock_client.aio.files.upload.assert_called_once()
+
+
+    @patch('image_client.genai.Client')
+    def test_expired_reference_invalidated_and_retryable(self, mock_client_class):
+        from image_client import genai_errors
+        from app.core.retry_policy import ErrorKind, classify_result
+
+        mock_file = MagicMock()
+        mock_file.name = "files/expired"
+        mock_file.state.name = "ACTIVE"
+        error = genai_errors.ClientError(
+            400, {"error": {"code": 400, "message": "File files/expired is not found", "status": "INVALID_ARGUMENT"}}
+        )
+        mock_client = MagicMock()
+        mock_client.aio.files.upload = AsyncMock(return_value=mock_file)
+        mock_client.aio.models.generate_content = AsyncMock(side_effect=error)
+        mock_client_class.return_value = mock_client
+
+        limiter = MagicMock()
+        limiter.acquire = AsyncMock()
+        limiter.release = AsyncMock()
+
+        with tempfile.NamedTemporaryFile(suffix='.jpg', delete=False) as f:
+            f.write(b'expired_reference')
+            temp_path = f.name
+
+        try:
+            client = ImageClient(api_key="test_api_key")
+            with patch('image_client.get_rate_limiter', return_value=limiter):
+                result = asyncio.run(client.agenerate(prompt="p", reference_images=[temp_path], verbose=False))
+        finally:
+            os.unlink(temp_path)
+
+        self.assertEqual(result["status"], "error")
+        self.assertTrue(result["references_invalidated"])
+        self.assertEqual(len(client.reference_cache), 0)
+        self.assertEqual(classify_result(result).kind, ErrorKind.TRANSIENT)
+
+    def test_only_reference_file_errors_invalidate(self):
+        from image_client import genai_errors, is_reference_file_error
+
+        def client_error(code, message, status):
+            return genai_errors.ClientError(code, {"error": {"code": code, "message": message, "status": status}})
+
+        self.assertTrue(is_reference_file_error(client_error(400, "File files/a is not found", "INVALID_ARGUMENT")))
+        self.assertTrue(
+            is_reference_file_error(
+                client_error(403, "You do not have permission to access the File a or it may not exist", "DENIED")
+            )
+        )
+        self.assertFalse(is_reference_file_error(client_error(400, "Invalid image_config", "INVALID_ARGUMENT")))
+        self.assertFalse(is_reference_file_error(client_error(403, "API key not valid", "PERMISSION_DENIED")))
+        self.assertFalse(is_reference_file_error(client_error(429, "File quota exhausted", "RESOURCE_EXHAUSTED")))
+
+
+class TestReferenceDigests(unittest.TestCase):
+    """测试结果缓存键用的参考图标识"""
+
+    @patch('image_client.genai.Client')
+    def test_digests_never_upload_to_gemini(self, mock_client_class):
+        mock_client = MagicMock()
+        mock_client.aio.files.upload = AsyncMock()
+        mock_client_class.return_value = mock_client
+
+        def response(headers=None, content=b""):
+            return MagicMock(is_success=True, headers=headers or {}, content=content)
+
+        http = MagicMock()
+        http.head = AsyncMock(side_effect=lambda url: response({"etag": '"abc"'} if url.endswith("etag.jpg") else {}))
+        http.get = AsyncMock(return_value=response(content=b"garment"))
+
+        client = ImageClient(api_key="test_api_key")
+        with patch.object(client, "_get_http_client", return_value=http):
+            tagged, plain = asyncio.run(client.areference_digests(["https://oss/etag.jpg", "https://oss/plain.jpg"]))
+            again = asyncio.run(client.areference_digests(["https://oss/etag.jpg"]))
+
+        self.assertEqual(again, [tagged])
+        self.assertNotEqual(tagged, plain)
+        # 有 ETag 的图片不下载，只下载没有 ETag 的图片计算内容哈希
+        http.get.assert_awaited_once_with("https://oss/plain.jpg")
+        mock_client.aio.files.upload.assert_not_called()
+        self.assertEqual(len(client.reference_cache), 0)
+
+
+class TestParallelReferences(unittest.TestCase):
+    """测试参考图并发准备"""
+
+    @patch('image_client.genai.Client')
+    def test_references_prepared_concurrently_in_order(self, mock_client_class):
+        mock_client_class.return_value = MagicMock()
+        client = ImageClient(api_key="test_api_key")
+        active = 0
+        peak = 0
+
+        async def fake_prepare(path, verbose):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05 if path == "a" else 0.01)
+            active -= 1
+            return f"file-{path}"
+
+        with patch.object(client, "_aprepare_reference", side_effect=fake_prepare):
+            files = asyncio.run(client._aprepare_references(["a", "b", "c"], verbose=False))
+
+        self.assertEqual(files, ["file-a", "file-b", "file-c"])
+        self.assertEqual(peak, 3)
+
+    @patch('image_client.genai.Client')
+    def test_overall_timeout(self, mock_client_class):
+        mock_client_class.return_value = MagicMock()
+        client = ImageClient(api_key="test_api_key")
+        client.reference_timeout = 0.05
+
+        async def slow_prepare(path, verbose):
+            await asyncio.sleep(1)
+
+        with patch.object(client, "_aprepare_reference", side_effect=slow_prepare):
+            with self.assertRaises(ValueError) as context:
+                asyncio.run(client._aprepare_references(["a", "b"], verbose=False))
+        self.assertIn("Timed out", str(context.exception))
+
+    @patch('image_client.genai.Client')
+    def test_reference_failure_carries_timings(self, mock_client_class):
+        mock_client_class.return_value = MagicMock()
+        client = ImageClient(api_key="test_api_key")
+
+        with patch.object(client, "_aprepare_references", AsyncMock(side_effect=ValueError("dead reference"))):
+            with self.assertRaises(ValueError) as context:
+                asyncio.run(client.agenerate(prompt="p", reference_images=["a"], verbose=False))
+        self.assertIn("references", context.exception.timings)
+
+
+class TestInMemoryPipeline(unittest.TestCase):
+    """测试不落盘的生成结果与图片尺寸读取"""
+
+    def _png_bytes(self, width, height):
+        import io
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (width, height)).save(buffer, format="PNG")
+        return buffer.getvalue()
+
+    def test_read_png_size_from_header(self):
+        self.assertEqual(read_image_size(self._png_bytes(37, 21)), (37, 21))
+
+    def test_read_jpeg_size(self):
+        import io
+        from PIL import Image
+
+        buffer = io.BytesIO()
+        Image.new("RGB", (12, 34)).save(buffer, format="JPEG")
+        self.assertEqual(read_image_size(buffer.getvalue()), (12, 34))
+
+    def test_unknown_data_size(self):
+        self.assertEqual(read_image_size(b"not an image"), (0, 0))
+
+    @patch('image_client.genai.Client')
+    def test_agenerate_without_disk(self, mock_client_class):
+        mock_part = MagicMock()
+        mock_part.inline_data.data = self._png_bytes(8, 8)
+        mock_part.inline_data.mime_type = "image/png"
+        mock_candidate = MagicMock()
+        mock_candidate.content.parts = [mock_part]
+        mock_response = MagicMock()
+        mock_response.candidates = [mock_candidate]
+
+        mock_client = MagicMock()
+        mock_client.aio.models.generate_content = AsyncMock(return_value=mock_response)
+        mock_client_class.return_value = mock_client
+
+        client = ImageClient(api_key="test_api_key")
+        with patch.object(client, "_save_images") as mock_save:
+            result = asyncio.run(client.agenerate(prompt="memory", verbose=False, save_to_disk=False))
+
+        mock_save.assert_not_called()
+        self.assertEqual(result["generated_images"], [])
+        self.assertEqual(len(result["image_data"]), 1)
+        self.assertEqual(result["image_data"][0]["mime_type"], "image/png")
+        self.assertEqual(read_image_size(result["image_data"][0]["data"]), (8, 8))
+
+
 if __name__ == '__main__':
     unittest.main(verbosity=2)
@@ -1,6 +1,6 @@
 import sys
 import asyncio
-from unittest.mock import MagicMock, patch
+from unittest.mock import AsyncMock, MagicMock, patch
 from pathlib import Path
 
 # Setup path
@@ -45,7 +45,7 @@ async def test_worker_logic():
     mock_tryon_data.garment_image = "http://example.com/garment.jpg"
     mock_task_tryon.tryon = mock_tryon_data
 
-    with patch("app.core.image_worker.generate_image") as mock_generate:
+    with patch("app.core.image_worker.agenerate_image", new_callable=AsyncMock) as mock_generate:
         mock_generate.return_value = {"status": "success", "generated_images": []}
         await process_single_task(mock_task_tryon)
 
@@ -79,7 +79,7 @@ async def test_worker_logic():
     # Ensure tryon is None/not accessed
     mock_task_detail.tryon = None
 
-    with patch("app.core.image_worker.generate_image") as mock_generate:
+    with patch("app.core.image_worker.agenerate_image", new_callable=AsyncMock) as mock_generate:
         mock_generate.return_value = {"status": "success", "generated_images": []}
         await process_single_task(mock_task_detail)
 
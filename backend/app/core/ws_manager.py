@@ -3,12 +3,15 @@ WebSocket 连接管理器
 
 用于管理用户 WebSocket 连接，实现任务状态实时推送。
 
+独立部署的 Worker 进程没有连接，通过 set_publisher 把推送交给 task_events 写入事件表，
+由 API 进程转发（TASK_EVENTS_BACKEND=database）。
+
 可扩展：
 - 升级 Redis: 使用 Redis Pub/Sub 实现多实例间消息推送
 - 升级 Celery: Celery Worker 可以通过 Redis 发布任务更新消息
 """
 
-from typing import Dict, Optional
+from typing import Any, Awaitable, Callable, Dict, Optional
 import asyncio
 import json
 
@@ -38,6 +41,13 @@ class ConnectionManager:
         # 心跳任务
         self._heartbeat_task: Optional[asyncio.Task] = None
 
+        # 跨进程推送：设置后 push_task_update 交给它转发（如独立 Worker 写入事件表，见 task_events）
+        self.publisher: Optional[Callable[[str, dict], Awaitable[Any]]] = None
+
+    def set_publisher(self, publisher: Optional[Callable[[str, dict], Awaitable[Any]]]):
+        """设置跨进程推送回调；传 None 恢复为直接发给本进程的连接"""
+        self.publisher = publisher
+
     async def connect(self, user_id: str, websocket: WebSocket) -> bool:
         """
         记录 WebSocket 连接（不调用 accept，由调用方负责）
@@ -103,6 +113,8 @@ class ConnectionManager:
         result: Optional[dict] = None,
         error: Optional[dict] = None,
         finished_at: Optional[str] = None,
+        stage: Optional[str] = None,
+        details: Optional[dict] = None,
     ) -> int:
         """
         推送任务状态更新给指定用户
@@ -114,6 +126,8 @@ class ConnectionManager:
             result: 成功时的结果
             error: 失败时的错误
             finished_at: 完成时间
+            stage: 处理中的阶段（queued / references_uploaded / generating / uploading）
+            details: 阶段附加信息（如 queue_position、attempt）
 
         Returns:
             推送成功的用户数（0 或 1）
@@ -136,6 +150,17 @@ class ConnectionManager:
         if finished_at:
             message["finished_at"] = finished_at
 
+        if stage:
+            message["stage"] = stage
+
+        if details:
+            message["details"] = details
+
+        if self.publisher is not None:
+            # 本进程没有客户端连接（独立 Worker），交给持有连接的 API 进程推送
+            await self.publisher(user_id, message)
+            return 1
+
         success = await self.send_message(user_id, message)
         print(f"[WS] push result: success={success}")
         return 1 if success else 0
@@ -4,3 +4,5 @@ from .generation_task import *
 from .template import *
 from .prompt_config import *
 from .recharge import *
+from .rate_limit import *
+from .task_event import *
@@ -18,6 +18,14 @@ class TaskStatus(str, Enum):
     PROCESSING = "processing"
     SUCCEEDED = "succeeded"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class TaskLane(str, Enum):
+    """执行通道枚举"""
+
+    INTERACTIVE = "interactive"  # 实时生成，用户等待结果
+    BATCH = "batch"  # 非紧急任务，合并提交 Gemini Batch API（半价，24 小时内完成）
 
 
 class GenerationTask(BaseModel):
@@ -29,6 +37,8 @@ class GenerationTask(BaseModel):
     user_id = fields.CharField(max_length=36, index=True, description="用户ID")
     task_type = fields.CharEnumField(TaskType, description="任务类型")
     status = fields.CharEnumField(TaskStatus, default=TaskStatus.QUEUED, index=True, description="任务状态")
+    priority = fields.IntField(default=0, index=True, description="调度优先级（越大越先执行）")
+    lane = fields.CharEnumField(TaskLane, default=TaskLane.INTERACTIVE, index=True, description="执行通道")
 
     # 通用参数
     prompt = fields.TextField(null=True, description="正向提示词")
@@ -41,6 +51,7 @@ class GenerationTask(BaseModel):
     # 结果与错误
     result = fields.JSONField(null=True, description="通用结果数据")
     error = fields.JSONField(null=True, description="错误信息 {code, message}")
+    timings = fields.JSONField(null=True, description="各阶段耗时（秒）{stage: seconds}")
 
     # 元数据
     platform = fields.CharField(max_length=32, null=True, description="来源平台")
@@ -50,12 +61,23 @@ class GenerationTask(BaseModel):
     started_at = fields.DatetimeField(null=True, description="开始时间")
     finished_at = fields.DatetimeField(null=True, description="完成时间")
 
+    # Worker 认领信息
+    worker_id = fields.CharField(max_length=64, null=True, description="认领该任务的 Worker ID")
+    lease_expires_at = fields.DatetimeField(null=True, index=True, description="认领租约到期时间")
+    attempts = fields.IntField(default=0, description="已认领（执行）次数")
+    batch_job = fields.CharField(max_length=128, null=True, index=True, description="所属 Gemini 批量任务名称")
+
+    # 结果缓存与提交幂等
+    use_cache = fields.BooleanField(default=True, description="是否允许复用相同请求的缓存结果")
+    idempotency_key = fields.CharField(max_length=64, null=True, description="客户端提交的幂等键")
+
     # 软删除
     is_deleted = fields.BooleanField(default=False, description="是否删除")
 
     class Meta:
         table = "generation_task"
         ordering = ["-created_at"]
+        unique_together = (("user_id", "idempotency_key"),)
 
 
 class TaskTryon(BaseModel):
@@ -109,3 +131,20 @@ class TaskDetail(BaseModel):
 
     class Meta:
         table = "task_detail"
+
+
+class GenerationResultCache(BaseModel):
+    """
+    生成结果缓存（按规范化请求内容寻址）
+    """
+
+    cache_key = fields.CharField(max_length=64, unique=True, description="请求内容哈希")
+    result = fields.JSONField(description="任务结果 {images: [...]}")
+    source_task_id = fields.UUIDField(null=True, description="产生该结果的任务ID")
+    hits = fields.IntField(default=0, description="命中次数")
+    created_at = fields.DatetimeField(auto_now_add=True, description="创建时间")
+    last_hit_at = fields.DatetimeField(null=True, index=True, description="最近命中时间")
+    expires_at = fields.DatetimeField(index=True, description="过期时间")
+
+    class Meta:
+        table = "generation_result_cache"
@@ -0,0 +1,17 @@
+from tortoise import fields
+
+from .base import BaseModel
+
+
+class RateLimitBucket(BaseModel):
+    """
+    Gemini 调用令牌桶（多 Worker 进程共享限流配额）
+    """
+
+    key = fields.CharField(max_length=128, unique=True, description="限流键（模型名）")
+    tokens = fields.FloatField(description="当前令牌数")
+    refreshed_at = fields.FloatField(description="上次补充令牌的时间戳（秒）")
+    blocked_until = fields.FloatField(default=0, description="收到 429 后暂停发放直到该时间戳（秒）")
+
+    class Meta:
+        table = "rate_limit_bucket"
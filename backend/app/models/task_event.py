@@ -0,0 +1,20 @@
+from tortoise import fields
+
+from .base import BaseModel
+
+
+class TaskEvent(BaseModel):
+    """
+    跨进程任务事件（TASK_EVENTS_BACKEND=database 时使用）
+
+    独立部署的 Worker 进程没有 WebSocket 连接，任务状态推送写入该表，由 API 进程转发给客户端；
+    API 创建任务后的新任务通知也写入该表，唤醒独立 Worker。
+    """
+
+    kind = fields.CharField(max_length=16, index=True, description="事件类型 push / notify")
+    user_id = fields.CharField(max_length=64, null=True, description="推送目标用户（push）")
+    payload = fields.JSONField(description="推送消息（push）或任务信息（notify）")
+    created_at = fields.DatetimeField(auto_now_add=True, index=True)
+
+    class Meta:
+        table = "task_event"
@@ -22,6 +22,14 @@ class TaskStatus(str, Enum):
     PROCESSING = "processing"
     SUCCEEDED = "succeeded"
     FAILED = "failed"
+    CANCELLED = "cancelled"
+
+
+class TaskLane(str, Enum):
+    """执行通道枚举"""
+
+    INTERACTIVE = "interactive"
+    BATCH = "batch"
 
 
 # ============ Shared Schemas ============
@@ -68,6 +76,11 @@ class CreateTaskRequest(TaskBase):
     """创建任务通用请求"""
 
     task_type: TaskType = Field(..., description="任务类型")
+    lane: TaskLane = Field(
+        TaskLane.INTERACTIVE, description="执行通道：interactive 实时生成 / batch 非紧急批量生成（半价，24 小时内完成）"
+    )
+
+    use_cache: bool = Field(True, description="是否允许复用相同请求（固定 seed）的缓存结果")
 
     # 动态提示词配置
     prompt_configs: Optional[Dict[str, List[str]]] = Field(None, description="动态配置 {group_key: [option_key, ...]}")
@@ -123,11 +136,13 @@ class GenerationTaskResponse(BaseModel):
     user_id: str
     task_type: TaskType
     status: TaskStatus
+    lane: TaskLane = TaskLane.INTERACTIVE
     prompt: Optional[str]
     aspect_ratio: Optional[str]
     quality: Optional[str]
     result: Optional[Dict[str, Any]] = Field(None, description="结果数据 {images: [...], ...}")
     error: Optional[Dict[str, Any]]
+    timings: Optional[Dict[str, float]] = Field(None, description="各阶段耗时（秒）")
     prompt_configs: Optional[Dict[str, List[str]]] = Field(None, description="动态配置 {group_key: [option_key, ...]}")
     created_at: datetime
     started_at: Optional[datetime]
@@ -168,11 +183,13 @@ class GenerationTaskResponse(BaseModel):
             user_id=obj.user_id,
             task_type=obj.task_type,
             status=obj.status,
+            lane=obj.lane,
             prompt=obj.prompt,
             aspect_ratio=obj.aspect_ratio,
             quality=obj.quality,
             result=obj.result,
             error=obj.error,
+            timings=obj.timings,
             prompt_configs=obj.prompt_configs,
             created_at=obj.created_at,
             started_at=obj.started_at,
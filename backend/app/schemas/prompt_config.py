@@ -1,6 +1,6 @@
 from datetime import datetime
 from typing import List, Optional, Dict, Any
-from pydantic import BaseModel
+from pydantic import BaseModel, Field
 
 class PromptConfigGroupCreate(BaseModel):
     group_key: str
@@ -117,3 +117,15 @@ class PromptUserConfigResponse(PromptUserConfigCreate):
 
     class Config:
         from_attributes = True
+
+class PromptPreviewRequest(BaseModel):
+    task_type: str = Field("tryon", description="任务类型 tryon/model/detail")
+    prompt_configs: Dict[str, List[str]] = Field(
+        default_factory=dict, description="动态配置 {group_key: [option_key, ...]}"
+    )
+    prompt: Optional[str] = Field(None, description="用户自定义提示词")
+
+class PromptPreviewResponse(BaseModel):
+    positive_prompt: str
+    negative_prompt: str
+    raw_selections: Dict[str, List[str]]
@@ -6,17 +6,14 @@
 2. 按照 prompt_order 排序组装提示词
 3. 应用组合规则
 4. 拼接全局设置
+
+配置数据来自 prompt_catalog 编译后的内存目录，组装过程不查询数据库。
 """
 
-from dataclasses import dataclass
-from typing import Dict, List, Optional, Tuple
+from dataclasses import dataclass, replace
+from typing import Dict, Hashable, List, Optional, Sequence, Tuple
 
-from app.models.prompt_config import (
-    PromptCombinationRule,
-    PromptConfigGroup,
-    PromptConfigOption,
-    PromptConfigSetting,
-)
+from app.services.prompt_catalog import CatalogOption, CatalogRule, PromptCatalog, get_prompt_catalog
 
 
 @dataclass
@@ -29,11 +26,14 @@ class AssembledPrompt:
 
 
 class PromptAssembler:
-    """提示词组装器"""
+    """提示词组装器
+
+    配置数据来自编译后的提示词配置目录（见 prompt_catalog），组装本身不查询数据库。
+    """
 
-    def __init__(self, task_type: str):
+    def __init__(self, task_type: str, catalog: Optional[PromptCatalog] = None):
         self.task_type = task_type
-        self._settings_cache: Dict[str, str] = {}
+        self.catalog = catalog
 
     async def assemble(
         self,
@@ -50,13 +50,81 @@ class PromptAssembler:
         Returns:
             AssembledPrompt 包含正向和负向提示词
         """
-        # 1. 加载全局设置
-        await self._load_settings()
+        catalog = self.catalog or await get_prompt_catalog()
+        return self.assemble_with(catalog, selected_configs, user_prompt)
+
+    @classmethod
+    async def assemble_many(
+        cls,
+        task_type: str,
+        selections: Sequence[Dict[str, List[str]]],
+        user_prompts: Optional[Sequence[Optional[str]]] = None,
+        catalog: Optional[PromptCatalog] = None,
+    ) -> List[AssembledPrompt]:
+        """
+        批量组装提示词（如批量通道一次提交几十个任务）
 
-        # 2. 获取所有选中的配置项
-        options = await self._get_selected_options(selected_configs)
+        所有任务共用一次加载的配置目录；选中的配置项和命中的规则按选择签名
+        （忽略组内选项顺序和重复）只计算一次，选择和自定义提示词都相同的任务直接复用结果。
+
+        Args:
+            task_type: 任务类型
+            selections: 每个任务的选择 {group_key: [option_key, ...]}
+            user_prompts: 每个任务的自定义提示词（与 selections 一一对应）
 
-        # 3. 按 prompt_order 分组排序
+        Returns:
+            与 selections 顺序一致的 AssembledPrompt 列表
+        """
+        catalog = catalog or await get_prompt_catalog()
+        assembler = cls(task_type, catalog)
+        user_prompts = user_prompts if user_prompts is not None else [None] * len(selections)
+
+        resolved: Dict[Hashable, Tuple[List[CatalogOption], List[CatalogRule]]] = {}
+        assembled: Dict[Hashable, AssembledPrompt] = {}
+        results = []
+        for selected_configs, user_prompt in zip(selections, user_prompts):
+            signature = _selection_signature(selected_configs)
+            key = (signature, user_prompt)
+            if key not in assembled:
+                if signature not in resolved:
+                    resolved[signature] = (
+                        catalog.select_options(selected_configs),
+                        assembler._matched_rules(catalog, selected_configs),
+                    )
+                options, rules = resolved[signature]
+                assembled[key] = assembler._compose(catalog, options, rules, selected_configs, user_prompt)
+            results.append(replace(assembled[key], raw_selections=selected_configs))
+        return results
+
+    def assemble_with(
+        self,
+        catalog: PromptCatalog,
+        selected_configs: Dict[str, List[str]],
+        user_prompt: Optional[str] = None,
+    ) -> AssembledPrompt:
+        """基于给定的配置目录组装提示词（纯计算）"""
+        return self._compose(
+            catalog,
+            catalog.select_options(selected_configs),
+            self._matched_rules(catalog, selected_configs),
+            selected_configs,
+            user_prompt,
+        )
+
+    def _matched_rules(self, catalog: PromptCatalog, selected_configs: Dict[str, List[str]]) -> List[CatalogRule]:
+        """命中的组合规则（保持目录中的优先级顺序），通过目录的规则倒排索引查找"""
+        return catalog.match_rules(selected_configs)
+
+    def _compose(
+        self,
+        catalog: PromptCatalog,
+        options: List[CatalogOption],
+        rules: List[CatalogRule],
+        selected_configs: Dict[str, List[str]],
+        user_prompt: Optional[str],
+    ) -> AssembledPrompt:
+        """由选中的配置项和命中的规则拼接提示词"""
+        # 1. 按 prompt_order 分组排序
         front_prompts: List[str] = []  # order = 1
         middle_prompts: List[str] = []  # order = 2
         back_prompts: List[str] = []  # order = 3
@@ -74,11 +142,11 @@ class PromptAssembler:
             if option.negative_prompt:
                 negative_prompts.append(option.negative_prompt)
 
-        # 4. 获取预设提示词模板
-        base_prompt = await self._get_base_prompt()
+        # 2. 获取预设提示词模板
+        base_prompt = catalog.settings.get(f"base_prompt_{self.task_type}", "")
 
-        # 5. 组装正向提示词
-        separator = self._settings_cache.get("prompt_separator", ", ")
+        # 3. 组装正向提示词
+        separator = catalog.settings.get("prompt_separator", ", ")
 
         all_parts = []
         if base_prompt:
@@ -91,15 +159,14 @@ class PromptAssembler:
 
         positive_prompt = separator.join(filter(None, all_parts))
 
-        # 6. 组装负向提示词
-        global_negative = self._settings_cache.get("global_negative_prompt", "")
+        # 4. 组装负向提示词
+        global_negative = catalog.settings.get("global_negative_prompt", "")
         all_negative = [global_negative] + negative_prompts
         negative_prompt = separator.join(filter(None, all_negative))
 
-        # 7. 应用组合规则
-        positive_prompt, negative_prompt = await self._apply_rules(
-            positive_prompt, negative_prompt, selected_configs
-        )
+        # 5. 应用命中的组合规则（已按优先级排序）
+        for rule in rules:
+            positive_prompt, negative_prompt = self._execute_action(rule, positive_prompt, negative_prompt)
 
         return AssembledPrompt(
             positive_prompt=positive_prompt,
@@ -107,69 +174,26 @@ class PromptAssembler:
             raw_selections=selected_configs,
         )
 
-    async def _load_settings(self):
-        """加载全局设置"""
-        settings = await PromptConfigSetting.all()
-        self._settings_cache = {s.key: s.value for s in settings}
-
-    async def _get_selected_options(
-        self, selected_configs: Dict[str, List[str]]
-    ) -> List[PromptConfigOption]:
-        """获取所有选中的配置项"""
-        options = []
-        for group_key, option_keys in selected_configs.items():
-            group = await PromptConfigGroup.get_or_none(group_key=group_key, is_active=True)
-            if not group:
-                continue
-
-            group_options = await PromptConfigOption.filter(
-                group=group, option_key__in=option_keys, is_active=True
-            ).order_by("sort_order")
-
-            options.extend(group_options)
-
-        return options
-
-    async def _get_base_prompt(self) -> str:
-        """获取任务类型对应的基础提示词模板"""
-        key = f"base_prompt_{self.task_type}"
-        return self._settings_cache.get(key, "")
-
-    async def _apply_rules(
-        self,
-        positive: str,
-        negative: str,
-        selections: Dict[str, List[str]],
-    ) -> Tuple[str, str]:
-        """应用组合规则"""
-        rules = await PromptCombinationRule.filter(is_active=True).order_by("-priority")
-
-        for rule in rules:
-            if self._check_condition(rule.condition_json, selections):
-                positive, negative = self._execute_action(rule, positive, negative)
-
-        return positive, negative
-
     def _check_condition(
         self,
         condition: dict,
         selections: Dict[str, List[str]],
     ) -> bool:
-        """检查规则条件是否满足"""
+        """检查规则条件是否满足（逐条检查，组装时使用目录的倒排索引 match_rules）"""
         if not condition:
             return False
 
         # 条件格式: {"group_key": ["option_key1", "option_key2"]}
         # 表示：当 group_key 选中了任一 option_key 时触发
         for group_key, required_options in condition.items():
-            selected = selections.get(group_key, [])
-            if any(opt in selected for opt in required_options):
+            selected = selections.get(group_key)
+            if selected and not set(selected).isdisjoint(required_options):
                 return True
         return False
 
     def _execute_action(
         self,
-        rule: PromptCombinationRule,
+        rule: CatalogRule,
         positive: str,
         negative: str,
     ) -> Tuple[str, str]:
@@ -202,3 +226,8 @@ class PromptAssembler:
                 negative = negative.replace(rule.action_prompt, "")
 
         return positive, negative
+
+
+def _selection_signature(selected_configs: Dict[str, List[str]]) -> Hashable:
+    """选择签名：组的顺序影响拼接顺序需保留，组内选项顺序和重复不影响结果"""
+    return tuple((group_key, tuple(sorted(set(option_keys)))) for group_key, option_keys in selected_configs.items())
@@ -0,0 +1,295 @@
+"""
+提示词配置目录（编译后的内存缓存）
+
+提示词配置（全局设置、配置组与选项、组合规则）只在管理员编辑时变化，
+组装提示词却在每个任务上执行。这里把启用中的配置一次性加载并编译为只读目录：
+
+- settings: 全局设置 {key: value}
+- options: 配置组 -> 选项索引 {group_key: {option_key: CatalogOption}}
+- rules: 按优先级排好序的启用规则，条件预先转换为集合
+- rule_index: 规则倒排索引 {(group_key, option_key): 规则下标}，只评估可能触发的规则
+
+PromptAssembler 基于目录组装提示词，不再查询数据库。
+
+客户端配置页面需要的完整目录（启用的配置组及其选项）另行缓存为序列化好的响应体
+（CatalogPayload），与编译后的目录共用修订号和 TTL，ETag 为响应体的哈希。
+
+失效：prompt_config 的写接口调用 invalidate_prompt_catalog() 递增本进程的修订号，
+下一次 get_prompt_catalog() 重新加载；其他进程（独立 Worker、多个 API 实例）的目录
+最多在 PROMPT_CATALOG_TTL_SECONDS 后过期重新加载。
+"""
+
+import asyncio
+import hashlib
+import json
+import time
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, List, Optional, Tuple
+
+from fastapi.encoders import jsonable_encoder
+
+from app.models.prompt_config import (
+    PromptCombinationRule,
+    PromptConfigGroup,
+    PromptConfigOption,
+    PromptConfigSetting,
+)
+from app.schemas.prompt_config import PromptConfigGroupResponse, PromptConfigOptionResponse
+from app.settings.config import settings
+from app.utils.etag import make_etag
+
+
+@dataclass(frozen=True)
+class CatalogOption:
+    """编译后的配置选项"""
+
+    option_key: str
+    prompt_text: Optional[str]
+    negative_prompt: Optional[str]
+    prompt_order: int
+    sort_order: int
+
+
+@dataclass(frozen=True)
+class CatalogRule:
+    """编译后的组合规则"""
+
+    name: str
+    condition: Dict[str, FrozenSet[str]]  # {group_key: 任一选中即触发的 option_key 集合}
+    action_type: str
+    target: str
+    action_prompt: str
+    priority: int
+
+
+@dataclass
+class PromptCatalog:
+    """只读的提示词配置目录"""
+
+    revision: int
+    settings: Dict[str, str] = field(default_factory=dict)
+    options: Dict[str, Dict[str, CatalogOption]] = field(default_factory=dict)
+    rules: Tuple[CatalogRule, ...] = ()
+    rule_index: Dict[Tuple[str, str], Tuple[int, ...]] = field(default_factory=dict)
+    fingerprint: str = ""  # 目录内容哈希，各进程加载相同配置时一致，可用于 ETag
+    loaded_at: float = field(default_factory=time.monotonic)
+
+    def __post_init__(self):
+        if self.rules and not self.rule_index:
+            self.rule_index = build_rule_index(self.rules)
+        if not self.fingerprint:
+            self.fingerprint = catalog_fingerprint(self.settings, self.options, self.rules)
+
+    def select_options(self, selected_configs: Dict[str, List[str]]) -> List[CatalogOption]:
+        """按选择顺序返回选中的启用选项，组内按 sort_order 排序；未启用的组和选项忽略"""
+        selected: List[CatalogOption] = []
+        for group_key, option_keys in selected_configs.items():
+            group_options = self.options.get(group_key)
+            if not group_options:
+                continue
+            # 组内选项在编译时已按 sort_order 排序，字典保持该顺序
+            wanted = set(option_keys)
+            selected.extend(option for key, option in group_options.items() if key in wanted)
+        return selected
+
+    def match_rules(self, selected_configs: Dict[str, List[str]]) -> List[CatalogRule]:
+        """命中的规则（保持优先级顺序）
+
+        规则条件为“任一组选中了任一列出的选项即触发”，因此倒排索引查到的规则即全部命中的规则，
+        不必逐条检查条件，耗时只与选择的选项数和命中的规则数有关，与规则总数无关。
+        """
+        matched = set()
+        for group_key, option_keys in selected_configs.items():
+            for option_key in option_keys:
+                matched.update(self.rule_index.get((group_key, option_key), ()))
+        return [self.rules[i] for i in sorted(matched)]
+
+
+@dataclass(frozen=True)
+class CatalogPayload:
+    """序列化好的客户端配置目录响应"""
+
+    revision: int
+    body: bytes
+    etag: str
+    loaded_at: float = field(default_factory=time.monotonic)
+
+
+def build_rule_index(rules: Tuple[CatalogRule, ...]) -> Dict[Tuple[str, str], Tuple[int, ...]]:
+    """构建规则倒排索引：(group_key, option_key) -> 按优先级排序的规则下标"""
+    index: Dict[Tuple[str, str], List[int]] = {}
+    for i, rule in enumerate(rules):
+        for group_key, option_keys in rule.condition.items():
+            for option_key in option_keys:
+                index.setdefault((group_key, option_key), []).append(i)
+    return {key: tuple(positions) for key, positions in index.items()}
+
+
+def catalog_fingerprint(
+    settings_map: Dict[str, str],
+    options: Dict[str, Dict[str, CatalogOption]],
+    rules: Tuple[CatalogRule, ...],
+) -> str:
+    """计算目录内容哈希（与加载时间、进程无关）"""
+    payload = json.dumps(
+        {
+            "settings": settings_map,
+            "options": {
+                group_key: [
+                    [o.option_key, o.prompt_text, o.negative_prompt, o.prompt_order, o.sort_order]
+                    for o in group_options.values()
+                ]
+                for group_key, group_options in options.items()
+            },
+            "rules": [
+                [
+                    r.name,
+                    {group_key: sorted(keys) for group_key, keys in r.condition.items()},
+                    r.action_type,
+                    r.target,
+                    r.action_prompt,
+                    r.priority,
+                ]
+                for r in rules
+            ],
+        },
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def _compile_condition(condition) -> Dict[str, FrozenSet[str]]:
+    if not isinstance(condition, dict):
+        return {}
+    return {group_key: frozenset(option_keys or ()) for group_key, option_keys in condition.items()}
+
+
+async def load_prompt_catalog(revision: int = 0) -> PromptCatalog:
+    """从数据库加载并编译提示词配置目录（4 次查询）"""
+    setting_rows = await PromptConfigSetting.all().values("key", "value")
+    groups = await PromptConfigGroup.filter(is_active=True).values("id", "group_key")
+    group_keys = {row["id"]: row["group_key"] for row in groups}
+
+    options: Dict[str, Dict[str, CatalogOption]] = {group_key: {} for group_key in group_keys.values()}
+    option_rows = await PromptConfigOption.filter(is_active=True, group_id__in=list(group_keys)).order_by(
+        "sort_order", "id"
+    )
+    for row in option_rows:
+        options[group_keys[row.group_id]][row.option_key] = CatalogOption(
+            option_key=row.option_key,
+            prompt_text=row.prompt_text,
+            negative_prompt=row.negative_prompt,
+            prompt_order=row.prompt_order,
+            sort_order=row.sort_order,
+        )
+
+    rule_rows = await PromptCombinationRule.filter(is_active=True).order_by("-priority", "id")
+    rules = tuple(
+        CatalogRule(
+            name=rule.name,
+            condition=_compile_condition(rule.condition_json),
+            action_type=rule.action_type,
+            target=rule.target,
+            action_prompt=rule.action_prompt,
+            priority=rule.priority,
+        )
+        for rule in rule_rows
+    )
+
+    return PromptCatalog(
+        revision=revision,
+        settings={row["key"]: row["value"] for row in setting_rows},
+        options=options,
+        rules=rules,
+    )
+
+
+async def load_catalog_payload(revision: int = 0) -> CatalogPayload:
+    """加载启用的配置组及其选项并序列化为响应体（2 次查询）"""
+    groups = await PromptConfigGroup.filter(is_active=True).order_by("sort_order", "id")
+    options: Dict[int, List[dict]] = {group.id: [] for group in groups}
+    option_rows = await PromptConfigOption.filter(is_active=True, group_id__in=list(options)).order_by(
+        "sort_order", "id"
+    )
+    for row in option_rows:
+        options[row.group_id].append(PromptConfigOptionResponse.model_validate(row).model_dump())
+
+    data = [
+        {**PromptConfigGroupResponse.model_validate(group).model_dump(), "options": options[group.id]}
+        for group in groups
+    ]
+    # 与 Success 响应格式一致
+    body = json.dumps(
+        jsonable_encoder({"code": 200, "msg": "OK", "data": data}),
+        ensure_ascii=False,
+        separators=(",", ":"),
+    ).encode("utf-8")
+    return CatalogPayload(revision=revision, body=body, etag=make_etag(body.decode("utf-8")))
+
+
+# 进程内缓存的目录、客户端目录响应与修订号
+_catalog: Optional[PromptCatalog] = None
+_payload: Optional[CatalogPayload] = None
+_revision = 0
+_lock: Optional[asyncio.Lock] = None
+_lock_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _get_lock() -> asyncio.Lock:
+    # Lock 绑定在首次使用时的事件循环上，事件循环变化时重新创建
+    global _lock, _lock_loop
+    loop = asyncio.get_running_loop()
+    if _lock is None or _lock_loop is not loop:
+        _lock = asyncio.Lock()
+        _lock_loop = loop
+    return _lock
+
+
+def _is_fresh(cached) -> bool:
+    return (
+        cached is not None
+        and cached.revision == _revision
+        and time.monotonic() - cached.loaded_at < settings.PROMPT_CATALOG_TTL_SECONDS
+    )
+
+
+async def get_prompt_catalog() -> PromptCatalog:
+    """获取当前的提示词配置目录，已失效或过期时重新加载（并发调用只加载一次）"""
+    global _catalog
+    catalog = _catalog
+    if _is_fresh(catalog):
+        return catalog
+
+    async with _get_lock():
+        if not _is_fresh(_catalog):
+            # 加载期间发生的失效会递增修订号，使这次加载的结果在下一次调用时重新加载
+            _catalog = await load_prompt_catalog(_revision)
+        return _catalog
+
+
+async def get_catalog_payload() -> CatalogPayload:
+    """获取序列化好的客户端配置目录，已失效或过期时重新加载"""
+    global _payload
+    payload = _payload
+    if _is_fresh(payload):
+        return payload
+
+    async with _get_lock():
+        if not _is_fresh(_payload):
+            _payload = await load_catalog_payload(_revision)
+        return _payload
+
+
+def invalidate_prompt_catalog():
+    """提示词配置变更后调用：本进程下一次组装或请求目录时重新加载"""
+    global _catalog, _payload, _revision
+    _revision += 1
+    _catalog = None
+    _payload = None
+
+
+def prompt_catalog_revision() -> int:
+    """本进程的目录修订号（每次失效递增）"""
+    return _revision
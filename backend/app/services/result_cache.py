@@ -0,0 +1,89 @@
+"""
+生成结果缓存服务
+
+用户经常重复提交完全相同的请求（同一人物图、服装、配置、比例、质量且固定 seed），
+每次都完整调用一次 Gemini。这里按规范化后的请求内容计算缓存键：
+组装后的提示词 + 参考图内容哈希 + 生成参数（比例、质量、模型、seed），
+命中时直接复用已上传到 OSS 的结果。
+
+只有固定了 seed（seed >= 0）的任务才读写缓存，随机 seed 的任务每次都应得到新结果；
+任务的 use_cache 为 False 时跳过缓存。条目有 TTL，总数超过上限时按最近命中时间淘汰。
+"""
+
+import hashlib
+import json
+from datetime import timedelta
+from typing import Any, Dict, List, Optional
+
+from tortoise import timezone
+from tortoise.expressions import F
+
+from app.models.generation_task import GenerationResultCache, GenerationTask, TaskType
+from app.settings.config import settings
+
+
+def task_seed(task: GenerationTask) -> Optional[int]:
+    """任务的固定 seed；未固定（-1）或该类型没有 seed 时返回 None
+
+    调用前需要 fetch_related("tryon")。
+    """
+    if task.task_type == TaskType.TRYON and task.tryon and task.tryon.seed is not None and task.tryon.seed >= 0:
+        return task.tryon.seed
+    return None
+
+
+def is_cacheable(task: GenerationTask) -> bool:
+    """任务结果是否可以读写缓存"""
+    return settings.RESULT_CACHE_ENABLED and task.use_cache and task_seed(task) is not None
+
+
+def build_cache_key(prompt: str, reference_digests: List[str], params: Dict[str, Any]) -> str:
+    """计算请求的缓存键
+
+    Args:
+        prompt: 组装后的最终提示词
+        reference_digests: 参考图内容哈希（顺序有意义）
+        params: 生成参数（aspect_ratio、quality、model、seed 等）
+    """
+    payload = json.dumps(
+        {"prompt": prompt.strip(), "references": reference_digests, "params": params},
+        ensure_ascii=False,
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+async def get_cached_result(cache_key: str) -> Optional[Dict[str, Any]]:
+    """查询未过期的缓存结果，命中时记录命中次数"""
+    now = timezone.now()
+    entry = await GenerationResultCache.filter(cache_key=cache_key, expires_at__gt=now).first()
+    if entry is None:
+        return None
+    await GenerationResultCache.filter(id=entry.id).update(hits=F("hits") + 1, last_hit_at=now)
+    return entry.result
+
+
+async def store_result(cache_key: str, result: Dict[str, Any], source_task_id: Any = None):
+    """写入缓存结果，并清理过期条目、按最近命中时间淘汰超出上限的条目"""
+    if not result.get("images"):
+        return
+
+    now = timezone.now()
+    await GenerationResultCache.update_or_create(
+        defaults={
+            "result": {"images": result["images"]},
+            "source_task_id": source_task_id,
+            "last_hit_at": now,
+            "expires_at": now + timedelta(seconds=settings.RESULT_CACHE_TTL_SECONDS),
+        },
+        cache_key=cache_key,
+    )
+
+    await GenerationResultCache.filter(expires_at__lte=now).delete()
+    overflow = await GenerationResultCache.all().count() - settings.RESULT_CACHE_MAX_ENTRIES
+    if overflow > 0:
+        stale_ids = (
+            await GenerationResultCache.all().order_by("last_hit_at").limit(overflow).values_list("id", flat=True)
+        )
+        await GenerationResultCache.filter(id__in=list(stale_ids)).delete()
@@ -49,6 +49,8 @@ class Settings(BaseSettings):
     OSS_USE_CDN: bool = False
     OSS_FOLDER: str = "uploads"
     OSS_USE_DATE_FOLDER: bool = True
+    OSS_UPLOAD_CONCURRENCY: int = 8  # 同时进行的 OSS 上传数（线程池大小）
+    OSS_CONNECTION_POOL_SIZE: int = 16  # OSS HTTP 连接池大小，应不小于上传并发数
 
     PROJECT_ROOT: str = os.path.abspath(os.path.join(os.path.dirname(__file__), os.pardir))
     BASE_DIR: str = os.path.abspath(os.path.join(PROJECT_ROOT, os.pardir))
@@ -104,6 +106,49 @@ class Settings(BaseSettings):
     STRIPE_SUCCESS_URL: str = "http://localhost:3000/payment/success"
     STRIPE_CANCEL_URL: str = "http://localhost:3000/payment/cancel"
 
+    # 图像生成 Worker 配置
+    IMAGE_WORKER_CONCURRENCY: int = 4  # 单个 Worker 进程同时处理的任务数
+    IMAGE_WORKER_LEASE_SECONDS: int = 300  # 任务认领租约时长（秒）
+    IMAGE_WORKER_MAX_ATTEMPTS: int = 3  # 租约过期的任务最多重新执行几次，超过后标记失败
+    IMAGE_WORKER_TASK_TIMEOUT: int = 600  # 单个任务最长处理时间（秒），超时中止并标记失败
+    IMAGE_WORKER_SAVE_LOCAL: bool = False  # 是否在本地 docs/assets 额外保存生成图（调试用）
+    IMAGE_WORKER_DRAIN_SECONDS: int = 60  # 停止时等待处理中任务完成的最长时间（秒），超时的任务放回队列
+    TASK_PROGRESS_MIN_INTERVAL: float = 1.0  # 同一任务两次进度推送（WebSocket）的最小间隔（秒）
+    WORKER_EMBEDDED: bool = True  # API 进程内是否运行 Worker；独立部署 Worker（python worker.py）时关闭
+    WORKER_PROCESSES: int = 1  # 独立 Worker 的进程数（python worker.py --processes）
+    WORKER_METRICS_PORT: int = 0  # 独立 Worker 的指标端口，第 i 个进程监听 port + i（需 METRICS_TOKEN）；0 为关闭
+    WORKER_METRICS_HOST: str = "0.0.0.0"  # 独立 Worker 指标接口的监听地址
+    # 跨进程事件：local（默认，进程内）只适用于内嵌 Worker；独立部署 Worker（WORKER_EMBEDDED=false）时
+    # 须设为 database，否则 Worker 的 WebSocket 推送（含进度）全部丢失，新任务最长等待一个轮询间隔才被处理
+    TASK_EVENTS_BACKEND: str = "local"
+    TASK_EVENTS_POLL_SECONDS: float = 1.0  # database 事件的最短轮询间隔（秒），读到事件后恢复为该值
+    TASK_EVENTS_POLL_MAX_SECONDS: float = 15.0  # database 事件的最长轮询间隔（秒），空闲时逐次翻倍到该值
+    TASK_EVENTS_RETENTION_SECONDS: int = 300  # database 事件的保留时长（秒），过期后清理
+
+    # 指标接口（Prometheus 抓取）
+    METRICS_TOKEN: str = ""  # 抓取令牌（Authorization: Bearer <token>）；为空时指标接口关闭
+
+    # 任务调度配置
+    TASK_TYPE_PRIORITY: dict = {"tryon": 20, "model": 20, "detail": 10}  # 各任务类型的基础优先级
+    TASK_PAID_PRIORITY_BONUS: int = 5  # 付费用户（有充值记录）的优先级加成
+    TASK_PRIORITY_AGING_SECONDS: int = 30  # 等待每满该时长有效优先级 +1，防止低优先级任务饿死
+    TASK_SCHEDULE_WINDOW: int = 200  # 每次调度从数据库读取的候选任务数上限
+
+    # 提示词配置目录缓存
+    PROMPT_CATALOG_TTL_SECONDS: int = 30  # 编译后的提示词配置最长缓存时间（秒），其他进程的修改最迟在此之后生效
+
+    # 批量通道配置（Gemini Batch API）
+    BATCH_LANE_ENABLED: bool = True  # 关闭时 batch 通道的任务按实时任务处理
+    BATCH_LANE_MIN_SIZE: int = 20  # 积压达到该数量立即提交一个批量任务
+    BATCH_LANE_MAX_SIZE: int = 100  # 单个批量任务最多包含的请求数
+    BATCH_LANE_MAX_WAIT_SECONDS: int = 600  # 最早的任务等待超过该时长时，不足 MIN_SIZE 也提交
+    BATCH_LANE_POLL_SECONDS: int = 120  # 查询批量任务状态的间隔（秒）
+
+    # 生成结果缓存（固定 seed 的相同请求复用结果）
+    RESULT_CACHE_ENABLED: bool = True
+    RESULT_CACHE_TTL_SECONDS: int = 7 * 24 * 3600  # 缓存条目有效期（秒）
+    RESULT_CACHE_MAX_ENTRIES: int = 10000  # 缓存条目上限，超出时按最近命中时间淘汰
+
     # 积分配置
     DEFAULT_CREDIT_PER_YUAN: int = 100  # 1元 = 100积分
 
@@ -0,0 +1,23 @@
+"""
+ETag 工具：为可缓存的 GET / 预览类接口生成强 ETag 并处理 If-None-Match
+"""
+
+import hashlib
+from typing import Optional
+
+
+def make_etag(*parts: str) -> str:
+    """由若干内容片段计算强 ETag（带双引号）"""
+    digest = hashlib.sha256("\x1f".join(parts).encode("utf-8")).hexdigest()[:32]
+    return f'"{digest}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """If-None-Match 是否命中（支持多个 ETag、弱校验前缀 W/ 和 *）"""
+    if not if_none_match:
+        return False
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*" or candidate.removeprefix("W/") == etag:
+            return True
+    return False
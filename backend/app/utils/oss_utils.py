@@ -1,8 +1,11 @@
 """
 阿里云 OSS 上传工具模块
 """
+import asyncio
 import os
+import threading
 import uuid
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from typing import Optional, Tuple
 
@@ -20,6 +23,7 @@ class OSSConfig:
         endpoint: str,
         cdn_endpoint: Optional[str] = None,
         use_cdn: bool = False,
+        pool_size: Optional[int] = None,
     ):
         self.access_key_id = access_key_id
         self.access_key_secret = access_key_secret
@@ -27,12 +31,28 @@ class OSSConfig:
         self.endpoint = endpoint
         self.cdn_endpoint = cdn_endpoint
         self.use_cdn = use_cdn
+        self.pool_size = pool_size
+        self._bucket: Optional[oss2.Bucket] = None
+        self._bucket_lock = threading.Lock()
 
     @property
     def bucket(self) -> oss2.Bucket:
-        """获取 OSS Bucket 实例"""
-        auth = oss2.Auth(self.access_key_id, self.access_key_secret)
-        return oss2.Bucket(auth, self.endpoint, self.bucket_name)
+        """获取 OSS Bucket 实例
+
+        首次访问时创建，之后复用同一个 Bucket 及其 HTTP 连接池（pool_size 控制池大小）。
+        """
+        if self._bucket is None:
+            with self._bucket_lock:
+                if self._bucket is None:
+                    auth = oss2.Auth(self.access_key_id, self.access_key_secret)
+                    session = oss2.Session(pool_size=self.pool_size)
+                    self._bucket = oss2.Bucket(auth, self.endpoint, self.bucket_name, session=session)
+        return self._bucket
+
+    def reset_bucket(self):
+        """丢弃缓存的 Bucket（如更换密钥后），下次访问时重建"""
+        with self._bucket_lock:
+            self._bucket = None
 
     @property
     def base_url(self) -> str:
@@ -133,6 +153,38 @@ class OSSUploader:
         except Exception as e:
             return False, str(e)
 
+    async def upload_file_async(
+        self,
+        file_content: bytes,
+        object_name: str,
+        content_type: Optional[str] = None,
+        retries: int = 0,
+        retry_delay: float = 1.0,
+    ) -> Tuple[bool, str]:
+        """在线程池中上传文件内容到 OSS，不阻塞事件循环
+
+        Args:
+            file_content: 文件内容（bytes）
+            object_name: OSS 对象名称
+            content_type: MIME 类型
+            retries: 失败后的重试次数
+            retry_delay: 首次重试等待时间（秒），之后每次翻倍
+
+        Returns:
+            (是否成功, 文件URL或错误信息)
+        """
+        loop = asyncio.get_running_loop()
+        success, result = False, ""
+        for attempt in range(retries + 1):
+            success, result = await loop.run_in_executor(
+                get_oss_executor(), self.upload_file, file_content, object_name, content_type
+            )
+            if success:
+                break
+            if attempt < retries:
+                await asyncio.sleep(retry_delay * (2**attempt))
+        return success, result
+
     def upload_file_path(
         self,
         file_path: str,
@@ -255,6 +307,21 @@ class OSSUploader:
 # 全局 OSS 上传器实例（懒加载）
 _oss_uploader: Optional[OSSUploader] = None
 
+# OSS 上传线程池（懒加载），限制同时进行的上传数
+_oss_executor: Optional[ThreadPoolExecutor] = None
+
+
+def get_oss_executor() -> ThreadPoolExecutor:
+    """获取 OSS 上传线程池"""
+    global _oss_executor
+    if _oss_executor is None:
+        from app.settings.config import settings
+        _oss_executor = ThreadPoolExecutor(
+            max_workers=settings.OSS_UPLOAD_CONCURRENCY,
+            thread_name_prefix="oss-upload",
+        )
+    return _oss_executor
+
 
 def get_oss_uploader() -> OSSUploader:
     """获取全局 OSS 上传器实例"""
@@ -268,6 +335,7 @@ def get_oss_uploader() -> OSSUploader:
             endpoint=settings.OSS_ENDPOINT,
             cdn_endpoint=settings.OSS_CDN_ENDPOINT,
             use_cdn=settings.OSS_USE_CDN,
+            pool_size=settings.OSS_CONNECTION_POOL_SIZE,
         )
         _oss_uploader = OSSUploader(config)
     return _oss_uploader
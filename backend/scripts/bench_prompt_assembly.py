@@ -0,0 +1,126 @@
+#!/usr/bin/env python
+"""
+提示词组装基准测试（纯 CPU，不连接数据库）
+
+构造包含大量组合规则的合成配置目录，分别测量：
+- 倒排索引匹配规则（PromptCatalog.match_rules，组装时使用）
+- 逐条检查规则条件（_check_condition，作为对照）
+以及完整的 PromptAssembler.assemble_with 耗时。
+
+运行方式：
+    cd backend
+    python scripts/bench_prompt_assembly.py --rules 5000
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.services.prompt_assembler import PromptAssembler
+from app.services.prompt_catalog import CatalogOption, CatalogRule, PromptCatalog
+
+
+def build_catalog(groups: int, options: int, rules: int, seed: int) -> PromptCatalog:
+    rng = random.Random(seed)
+    catalog_options = {
+        f"group_{g}": {
+            f"option_{o}": CatalogOption(
+                option_key=f"option_{o}",
+                prompt_text=f"prompt {g}-{o}",
+                negative_prompt=f"negative {g}-{o}" if o % 3 == 0 else None,
+                prompt_order=o % 3 + 1,
+                sort_order=o,
+            )
+            for o in range(options)
+        }
+        for g in range(groups)
+    }
+    catalog_rules = sorted(
+        (
+            CatalogRule(
+                name=f"rule_{r}",
+                condition={
+                    f"group_{rng.randrange(groups)}": frozenset(
+                        f"option_{rng.randrange(options)}" for _ in range(rng.randint(1, 3))
+                    )
+                    for _ in range(rng.randint(1, 2))
+                },
+                action_type=rng.choice(["append", "prepend", "remove"]),
+                target=rng.choice(["positive", "negative", "both"]),
+                action_prompt=f"rule {r}",
+                priority=rng.randrange(100),
+            )
+            for r in range(rules)
+        ),
+        key=lambda rule: -rule.priority,
+    )
+    return PromptCatalog(
+        revision=0,
+        settings={"base_prompt_tryon": "virtual try-on", "global_negative_prompt": "blurry"},
+        options=catalog_options,
+        rules=tuple(catalog_rules),
+    )
+
+
+def random_selections(groups: int, options: int, count: int, seed: int):
+    rng = random.Random(seed + 1)
+    return [
+        {
+            f"group_{g}": [f"option_{rng.randrange(options)}" for _ in range(rng.randint(1, 2))]
+            for g in rng.sample(range(groups), rng.randint(3, 8))
+        }
+        for _ in range(count)
+    ]
+
+
+def measure(func, selections):
+    """返回每次调用的耗时（微秒）"""
+    durations = []
+    for selected in selections:
+        start = time.perf_counter()
+        func(selected)
+        durations.append((time.perf_counter() - start) * 1e6)
+    return durations
+
+
+def report(name: str, durations):
+    durations = sorted(durations)
+    p99 = durations[int(len(durations) * 0.99) - 1]
+    print(f"{name:<28} mean {statistics.mean(durations):9.1f} us   p99 {p99:9.1f} us")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prompt assembly benchmark")
+    parser.add_argument("--rules", type=int, default=5000, help="组合规则数")
+    parser.add_argument("--groups", type=int, default=30, help="配置组数")
+    parser.add_argument("--options", type=int, default=20, help="每组选项数")
+    parser.add_argument("--iterations", type=int, default=2000, help="组装次数")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+
+    catalog = build_catalog(args.groups, args.options, args.rules, args.seed)
+    selections = random_selections(args.groups, args.options, args.iterations, args.seed)
+    assembler = PromptAssembler("tryon", catalog)
+
+    def linear_match(selected):
+        return [rule for rule in catalog.rules if assembler._check_condition(rule.condition, selected)]
+
+    for selected in selections[:100]:
+        assert catalog.match_rules(selected) == linear_match(selected)
+
+    print(f"{args.rules} rules, {args.groups} groups x {args.options} options, {args.iterations} selections")
+    report("match_rules (indexed)", measure(catalog.match_rules, selections))
+    report("match_rules (linear scan)", measure(linear_match, selections))
+    report(
+        "assemble_with",
+        measure(lambda selected: assembler.assemble_with(catalog, selected, "red dress"), selections),
+    )
+
+
+if __name__ == "__main__":
+    main()
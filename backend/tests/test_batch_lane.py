@@ -0,0 +1,205 @@
+"""
+批量通道单元测试
+
+使用 SQLite 内存数据库，Mock 掉 Gemini Batch API 和 OSS 上传。
+
+使用方法:
+    python -m pytest tests/test_batch_lane.py -v
+"""
+
+import sys
+import unittest
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tortoise import timezone
+
+from app.core import batch_lane, image_worker, task_queue
+from app.models.generation_task import GenerationTask, TaskLane, TaskStatus
+from tests.test_image_worker import WorkerTestCase
+
+
+class BatchLaneTestCase(WorkerTestCase):
+    """Mock 掉外部依赖的基类"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.client = MagicMock()
+        self.client._build_request_item.side_effect = lambda prompt, index, **kwargs: {"key": kwargs["key"]}
+        self.client.asubmit_requests = AsyncMock(return_value={"status": "success", "batch_name": "batches/1"})
+        self.client.aget_batch_job = AsyncMock()
+
+        image_client = MagicMock()
+        image_client._aprepare_references = AsyncMock(return_value=[])
+
+        self.upload = AsyncMock(side_effect=lambda content, filename, user_id: {"url": f"https://oss/{filename}"})
+        self.push = AsyncMock()
+        for patcher in (
+            patch.object(batch_lane, "get_batch_client", return_value=self.client),
+            patch.object(batch_lane, "get_image_client", return_value=image_client),
+            patch.object(image_worker, "upload_image_to_oss", self.upload),
+            patch.object(image_worker.ws_manager, "push_task_update", self.push),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    async def submitted_tasks(self, count: int):
+        tasks = await self.create_tasks(count, lane=TaskLane.BATCH)
+        self.assertEqual(await batch_lane.submit_batch(), "batches/1")
+        return tasks
+
+
+class TestBatchCollection(BatchLaneTestCase):
+    """测试批量任务的收集与提交"""
+
+    async def test_interactive_worker_skips_batch_tasks(self):
+        await self.create_tasks(2, lane=TaskLane.BATCH)
+        (interactive,) = await self.create_tasks(1)
+
+        claimed = await task_queue.claim_tasks(5)
+        self.assertEqual([task.id for task in claimed], [interactive.id])
+
+    async def test_submit_by_size_or_age(self):
+        tasks = await self.create_tasks(2, lane=TaskLane.BATCH)
+        with patch.dict(batch_lane.CONFIG, {"min_size": 3, "max_wait": 600}):
+            self.assertFalse(await batch_lane.should_submit())
+
+            await GenerationTask.filter(id=tasks[0].id).update(created_at=timezone.now() - timedelta(minutes=20))
+            self.assertTrue(await batch_lane.should_submit())
+
+        with patch.dict(batch_lane.CONFIG, {"min_size": 2}):
+            self.assertTrue(await batch_lane.should_submit())
+
+    async def test_submitted_tasks_wait_without_lease(self):
+        tasks = await self.submitted_tasks(3)
+
+        requests = self.client.asubmit_requests.call_args.args[0]
+        self.assertEqual({request["key"] for request in requests}, {str(task.id) for task in tasks})
+        for row in await GenerationTask.all():
+            self.assertEqual(row.status, TaskStatus.PROCESSING)
+            self.assertEqual(row.batch_job, "batches/1")
+            self.assertIsNone(row.lease_expires_at)
+
+        # 等待 Gemini 结果期间不会被当作崩溃遗留任务回收
+        await GenerationTask.all().update(started_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(await task_queue.reap_expired_tasks(), ([], []))
+
+    async def test_submit_failure_returns_tasks_to_queue(self):
+        await self.create_tasks(2, lane=TaskLane.BATCH)
+        self.client.asubmit_requests.return_value = {"status": "error", "error": "quota"}
+
+        self.assertIsNone(await batch_lane.submit_batch())
+        for row in await GenerationTask.all():
+            self.assertEqual(row.status, TaskStatus.QUEUED)
+            self.assertEqual(row.attempts, 0)
+
+    async def test_failing_task_does_not_block_the_rest(self):
+        bad, good = await self.create_tasks(2, lane=TaskLane.BATCH)
+        await GenerationTask.filter(id=bad.id).update(prompt="bad")
+
+        async def build(client, index, task, prompt, reference_images):
+            if prompt == "bad":
+                raise ValueError("Reference image download timed out")
+            return {"key": str(task.id)}
+
+        with patch.object(batch_lane, "_build_request", build):
+            self.assertEqual(await batch_lane.submit_batch(), "batches/1")
+
+        ((requests,), _) = self.client.asubmit_requests.call_args
+        self.assertEqual(requests, [{"key": str(good.id)}])
+        bad_row = await GenerationTask.get(id=bad.id)
+        self.assertEqual(bad_row.status, TaskStatus.QUEUED)
+        self.assertEqual(bad_row.attempts, 1)
+        self.assertEqual((await GenerationTask.get(id=good.id)).batch_job, "batches/1")
+
+    async def test_repeatedly_failing_task_eventually_fails(self):
+        (task,) = await self.create_tasks(1, lane=TaskLane.BATCH)
+        batch_lane.get_image_client()._aprepare_references.side_effect = ValueError("dead reference")
+
+        for _ in range(batch_lane.CONFIG["max_attempts"]):
+            self.assertIsNone(await batch_lane.submit_batch())
+
+        row = await GenerationTask.get(id=task.id)
+        self.assertEqual(row.status, TaskStatus.FAILED)
+        self.assertEqual(row.error["code"], "PREPARE_FAILED")
+        self.client.asubmit_requests.assert_not_called()
+
+
+class TestBatchResults(BatchLaneTestCase):
+    """测试批量任务结果写回"""
+
+    async def test_results_mapped_back_by_key(self):
+        ok, blocked = await self.submitted_tasks(2)
+        self.client.aget_batch_job.return_value = {
+            "status": "success",
+            "state": "SUCCEEDED",
+            "results": [
+                {"key": str(blocked.id), "status": "error", "error": "Finish reason: SAFETY", "image_data": []},
+                {"key": str(ok.id), "status": "success", "image_data": [{"data": b"png", "mime_type": "image/png"}]},
+            ],
+        }
+
+        self.assertEqual(await batch_lane.poll_batches(), 2)
+
+        ok = await GenerationTask.get(id=ok.id)
+        self.assertEqual(ok.status, TaskStatus.SUCCEEDED)
+        self.assertEqual(ok.result["images"], [f"https://oss/task_{ok.id}_0.png"])
+        blocked = await GenerationTask.get(id=blocked.id)
+        self.assertEqual(blocked.status, TaskStatus.FAILED)
+        self.assertIn("SAFETY", blocked.error["message"])
+
+        # 已写回的批量任务不再查询
+        self.client.aget_batch_job.reset_mock()
+        self.assertEqual(await batch_lane.poll_batches(), 0)
+        self.client.aget_batch_job.assert_not_awaited()
+
+    async def test_tasks_leased_one_at_a_time_while_writing_back(self):
+        first, second, third = await self.submitted_tasks(3)
+        # 第三个任务已由其他进程接手
+        await GenerationTask.filter(id=third.id).update(lease_expires_at=task_queue.lease_deadline())
+        self.client.aget_batch_job.return_value = {
+            "status": "success",
+            "state": "SUCCEEDED",
+            "results": [
+                {"key": str(task.id), "status": "success", "image_data": [{"data": b"png", "mime_type": "image/png"}]}
+                for task in (first, second, third)
+            ],
+        }
+        leased = []
+
+        async def upload(content, filename, user_id):
+            rows = await GenerationTask.filter(id__in=[first.id, second.id], lease_expires_at__isnull=False)
+            leased.append(len(rows))
+            return {"url": f"https://oss/{filename}"}
+
+        self.upload.side_effect = upload
+        self.assertEqual(await batch_lane.poll_batches(), 2)
+
+        # 写回第一个任务时另一个任务仍未加租约，不会因写回耗时被回收
+        self.assertEqual(leased[0], 1)
+        self.assertEqual((await GenerationTask.get(id=second.id)).status, TaskStatus.SUCCEEDED)
+        self.assertEqual((await GenerationTask.get(id=third.id)).status, TaskStatus.PROCESSING)
+
+    async def test_running_job_is_left_alone(self):
+        await self.submitted_tasks(1)
+        self.client.aget_batch_job.return_value = {"status": "success", "state": "RUNNING", "results": []}
+
+        self.assertEqual(await batch_lane.poll_batches(), 0)
+        self.assertEqual((await GenerationTask.first()).status, TaskStatus.PROCESSING)
+
+    async def test_failed_job_requeues_tasks(self):
+        await self.submitted_tasks(2)
+        self.client.aget_batch_job.return_value = {"status": "success", "state": "EXPIRED", "results": []}
+
+        self.assertEqual(await batch_lane.poll_batches(), 2)
+        for row in await GenerationTask.all():
+            self.assertEqual(row.status, TaskStatus.QUEUED)
+            self.assertIsNone(row.batch_job)
+            self.assertEqual(row.attempts, 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,648 @@
+"""
+图像生成 Worker 单元测试
+
+使用 SQLite 内存数据库，Mock 掉实际的图像生成调用。
+
+使用方法:
+    python -m pytest tests/test_image_worker.py -v
+"""
+
+import asyncio
+import sys
+import unittest
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tortoise import Tortoise, timezone
+
+from app.core import image_worker, task_queue
+from app.core.task_notifier import get_task_notifier
+from app.core.task_scheduler import task_priority
+from app.models.generation_task import GenerationTask, TaskStatus, TaskType
+
+
+class WorkerTestCase(unittest.IsolatedAsyncioTestCase):
+    """初始化内存数据库的基类"""
+
+    async def asyncSetUp(self):
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        await Tortoise.generate_schemas()
+
+    async def asyncTearDown(self):
+        await Tortoise._drop_databases()
+
+    async def create_tasks(self, count: int, user_id: str = "1", **kwargs):
+        tasks = []
+        task_type = kwargs.pop("task_type", TaskType.MODEL)
+        for _ in range(count):
+            task = await GenerationTask.create(
+                id=uuid.uuid4(),
+                user_id=user_id,
+                task_type=task_type,
+                status=TaskStatus.QUEUED,
+                prompt="test prompt",
+                **kwargs,
+            )
+            tasks.append(task)
+        return tasks
+
+
+class TestWorkerConcurrency(WorkerTestCase):
+    """测试 worker_loop 的并发调度"""
+
+    async def test_tasks_run_in_parallel_within_limit(self):
+        await self.create_tasks(6)
+        active = 0
+        peak = 0
+        done = []
+
+        async def fake_process(task):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05)
+            active -= 1
+            await GenerationTask.filter(id=task.id).update(status=TaskStatus.SUCCEEDED)
+            done.append(task.id)
+
+        with patch.object(image_worker, "process_single_task", fake_process):
+            loop_task = asyncio.create_task(image_worker.worker_loop(concurrency=3))
+            for _ in range(100):
+                if len(done) == 6:
+                    break
+                await asyncio.sleep(0.02)
+            loop_task.cancel()
+            await asyncio.gather(loop_task, return_exceptions=True)
+
+        self.assertEqual(len(done), 6)
+        self.assertEqual(len(set(done)), 6)
+        self.assertEqual(peak, 3)
+
+
+class TestGracefulShutdown(WorkerTestCase):
+    """测试停止 Worker 时的收尾"""
+
+    async def run_until_stopped(self, fake_process, count, drain_timeout):
+        started = []
+
+        async def process(task):
+            started.append(task.id)
+            await fake_process(task)
+
+        with patch.object(image_worker, "process_single_task", process):
+            loop_task = asyncio.create_task(image_worker.worker_loop(concurrency=count, drain_timeout=drain_timeout))
+            for _ in range(100):
+                if len(started) == count:
+                    break
+                await asyncio.sleep(0.01)
+            loop_task.cancel()
+            await asyncio.wait_for(loop_task, 2)
+        return started
+
+    async def test_in_flight_tasks_finish_during_drain(self):
+        await self.create_tasks(2)
+
+        async def fake_process(task):
+            await asyncio.sleep(0.1)
+            await GenerationTask.filter(id=task.id).update(status=TaskStatus.SUCCEEDED)
+
+        await self.run_until_stopped(fake_process, 2, drain_timeout=5)
+        self.assertEqual(await GenerationTask.filter(status=TaskStatus.SUCCEEDED).count(), 2)
+
+    async def test_unfinished_tasks_released_after_drain_timeout(self):
+        (task,) = await self.create_tasks(1)
+
+        async def fake_process(task):
+            await asyncio.sleep(60)
+
+        await self.run_until_stopped(fake_process, 1, drain_timeout=0.05)
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.QUEUED)
+        self.assertIsNone(saved.worker_id)
+        self.assertEqual(saved.attempts, 0)
+
+    async def test_claimed_but_undispatched_tasks_released(self):
+        await self.create_tasks(2)
+        claimed = asyncio.Event()
+        real_claim_tasks = image_worker.claim_tasks
+
+        async def slow_claim_tasks(limit, **kwargs):
+            # 认领后、返回前收到停止信号
+            tasks = await real_claim_tasks(limit, **kwargs)
+            claimed.set()
+            await asyncio.sleep(0.2)
+            return tasks
+
+        process = AsyncMock()
+        with (
+            patch.object(image_worker, "claim_tasks", slow_claim_tasks),
+            patch.object(image_worker, "process_single_task", process),
+        ):
+            loop_task = asyncio.create_task(image_worker.worker_loop(concurrency=2, drain_timeout=1))
+            await asyncio.wait_for(claimed.wait(), 2)
+            loop_task.cancel()
+            await asyncio.wait_for(loop_task, 2)
+
+        process.assert_not_awaited()
+        for row in await GenerationTask.all():
+            self.assertEqual(row.status, TaskStatus.QUEUED)
+            self.assertIsNone(row.worker_id)
+            self.assertEqual(row.attempts, 0)
+
+
+class TestTaskNotify(WorkerTestCase):
+    """测试新任务通知即时唤醒 Worker"""
+
+    async def test_idle_worker_wakes_on_notify(self):
+        done = asyncio.Event()
+
+        async def fake_process(task):
+            done.set()
+
+        with (
+            patch.object(image_worker, "process_single_task", fake_process),
+            patch.dict(image_worker.CONFIG, {"poll_interval": 30}),
+        ):
+            loop_task = asyncio.create_task(image_worker.worker_loop(concurrency=2))
+            # 等待 Worker 进入空闲等待
+            await asyncio.sleep(0.1)
+
+            (task,) = await self.create_tasks(1)
+            await get_task_notifier().notify(str(task.id))
+
+            await asyncio.wait_for(done.wait(), timeout=2)
+            loop_task.cancel()
+            await asyncio.gather(loop_task, return_exceptions=True)
+
+
+class TestProcessSingleTask(WorkerTestCase):
+    """测试单个任务的处理流程"""
+
+    async def test_generated_images_uploaded_concurrently(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        images = [{"data": b"image-%d" % i, "mime_type": "image/png"} for i in range(3)]
+        active = 0
+        peak = 0
+
+        async def fake_upload(content, object_name, content_type=None, retries=0, retry_delay=1.0):
+            nonlocal active, peak
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.05)
+            active -= 1
+            return True, f"https://oss/{content.decode()}"
+
+        uploader = MagicMock()
+        uploader.generate_object_name.side_effect = lambda filename, **kwargs: filename
+        uploader.upload_file_async = fake_upload
+
+        with (
+            patch.object(
+                image_worker, "agenerate_image", AsyncMock(return_value={"status": "success", "image_data": images})
+            ),
+            patch.object(image_worker, "get_oss_uploader", return_value=uploader),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+        ):
+            self.assertTrue(await image_worker.process_single_task(task))
+
+        self.assertEqual(peak, 3)
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.SUCCEEDED)
+        self.assertEqual(saved.result["images"], ["https://oss/image-0", "https://oss/image-1", "https://oss/image-2"])
+
+    async def test_object_name_and_content_type_follow_mime_type(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        images = [{"data": b"jpeg", "mime_type": "image/jpeg"}, {"data": b"webp", "mime_type": "image/webp"}]
+        uploader = MagicMock()
+        uploader.generate_object_name.side_effect = lambda filename, **kwargs: filename
+        uploader.upload_file_async = AsyncMock(return_value=(True, "https://oss/x"))
+
+        with (
+            patch.object(
+                image_worker, "agenerate_image", AsyncMock(return_value={"status": "success", "image_data": images})
+            ),
+            patch.object(image_worker, "get_oss_uploader", return_value=uploader),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+        ):
+            self.assertTrue(await image_worker.process_single_task(task))
+
+        uploads = {call.args[1]: call.kwargs["content_type"] for call in uploader.upload_file_async.await_args_list}
+        self.assertEqual(uploads, {f"task_{task.id}_0.jpg": "image/jpeg", f"task_{task.id}_1.webp": "image/webp"})
+
+    async def test_permanent_error_is_not_retried(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        blocked = {"status": "error", "error": "Generation prevented. Finish reason: SAFETY", "safety_ratings": "[]"}
+        mock_generate = AsyncMock(return_value=blocked)
+        with (
+            patch.object(image_worker, "agenerate_image", mock_generate),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+            patch.object(image_worker.asyncio, "sleep", AsyncMock()) as mock_sleep,
+        ):
+            self.assertFalse(await image_worker.process_single_task(task))
+
+        mock_generate.assert_awaited_once()
+        mock_sleep.assert_not_awaited()
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.FAILED)
+        self.assertEqual(saved.error["kind"], "permanent")
+
+    async def test_transient_error_retried_with_backoff(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        outcomes = [
+            {"status": "error", "error": "503 UNAVAILABLE", "status_code": 503},
+            {"status": "success", "image_data": []},
+        ]
+        mock_generate = AsyncMock(side_effect=outcomes)
+        with (
+            patch.object(image_worker, "agenerate_image", mock_generate),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+            patch.object(image_worker.asyncio, "sleep", AsyncMock()) as mock_sleep,
+        ):
+            self.assertTrue(await image_worker.process_single_task(task))
+
+        self.assertEqual(mock_generate.await_count, 2)
+        mock_sleep.assert_awaited_once()
+
+    async def test_reference_reupload_retried_only_once(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        expired = {
+            "status": "error",
+            "error": "400 INVALID_ARGUMENT. File files/abc is not found",
+            "status_code": 400,
+            "references_invalidated": True,
+        }
+        mock_generate = AsyncMock(return_value=expired)
+        with (
+            patch.dict(image_worker.CONFIG, {"retry_times": 3}),
+            patch.object(image_worker, "agenerate_image", mock_generate),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+            patch.object(image_worker.asyncio, "sleep", AsyncMock()),
+        ):
+            self.assertFalse(await image_worker.process_single_task(task))
+
+        self.assertEqual(mock_generate.await_count, 2)
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.error["kind"], "permanent")
+
+    async def test_stage_timings_and_metrics_recorded(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        outcomes = [
+            {"status": "error", "error": "503 UNAVAILABLE", "status_code": 503, "timings": {"generate_content": 1.5}},
+            {"status": "success", "image_data": [], "timings": {"generate_content": 2.0, "parse_response": 0.1}},
+        ]
+        retries_before = image_worker.RETRIES_TOTAL.value(kind="transient")
+        with (
+            patch.object(image_worker, "agenerate_image", AsyncMock(side_effect=outcomes)),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+            patch.object(image_worker.asyncio, "sleep", AsyncMock()),
+        ):
+            self.assertTrue(await image_worker.process_single_task(task))
+
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.timings["generate_content"], 3.5)
+        for stage in ("queue_wait", "prompt_assembly", "retry_backoff", "oss_upload", "total"):
+            self.assertIn(stage, saved.timings)
+        self.assertEqual(image_worker.RETRIES_TOTAL.value(kind="transient"), retries_before + 1)
+        self.assertGreater(image_worker.STAGE_SECONDS.count(stage="db_save"), 0)
+
+    async def test_exhausted_retries_not_counted_as_retry(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        unavailable = {"status": "error", "error": "503 UNAVAILABLE", "status_code": 503}
+        retries_before = image_worker.RETRIES_TOTAL.value(kind="transient")
+        with (
+            patch.dict(image_worker.CONFIG, {"retry_times": 3}),
+            patch.object(image_worker, "agenerate_image", AsyncMock(return_value=unavailable)),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+            patch.object(image_worker.asyncio, "sleep", AsyncMock()),
+        ):
+            self.assertFalse(await image_worker.process_single_task(task))
+
+        # 3 次尝试之间只有 2 次重试
+        self.assertEqual(image_worker.RETRIES_TOTAL.value(kind="transient"), retries_before + 2)
+
+    async def test_stage_timings_kept_when_references_fail(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        error = ValueError("Reference image not found: a.jpg")
+        error.timings = {"references": 0.75}
+        with (
+            patch.object(image_worker, "agenerate_image", AsyncMock(side_effect=error)),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+        ):
+            self.assertFalse(await image_worker.process_single_task(task))
+
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.FAILED)
+        self.assertEqual(saved.timings["references"], 0.75)
+        self.assertIn("total", saved.timings)
+
+    async def test_progress_stages_pushed_before_final_status(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        async def fake_generate(on_stage=None, **kwargs):
+            await on_stage("generating")
+            return {"status": "success", "image_data": []}
+
+        with (
+            patch.object(image_worker, "agenerate_image", fake_generate),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()) as mock_push,
+            patch.object(image_worker.settings, "TASK_PROGRESS_MIN_INTERVAL", 0),
+        ):
+            self.assertTrue(await image_worker.process_single_task(task))
+
+        updates = [(call.kwargs["status"], call.kwargs.get("stage")) for call in mock_push.await_args_list]
+        self.assertEqual(
+            updates,
+            [("processing", None), ("processing", "generating"), ("processing", "uploading"), ("succeeded", None)],
+        )
+
+    async def test_queue_position(self):
+        high, low = await self.create_tasks(2, priority=20)
+        (detail,) = await self.create_tasks(1, priority=10)
+
+        self.assertEqual(await task_queue.queue_position(high), 1)
+        self.assertEqual(await task_queue.queue_position(low), 2)
+        self.assertEqual(await task_queue.queue_position(detail), 3)
+
+    async def test_queue_depth_metrics(self):
+        await self.create_tasks(3)
+        await self.create_tasks(2, lane="batch")
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        await image_worker.refresh_queue_metrics()
+
+        self.assertEqual(image_worker.QUEUE_DEPTH.value(lane="interactive"), 3)
+        self.assertEqual(image_worker.QUEUE_DEPTH.value(lane="batch"), 2)
+        self.assertEqual(image_worker.PROCESSING.value(), 1)
+
+
+class TestTaskClaim(WorkerTestCase):
+    """测试任务认领的互斥性"""
+
+    async def test_concurrent_workers_never_claim_same_task(self):
+        await self.create_tasks(5)
+
+        results = await asyncio.gather(
+            task_queue.claim_tasks(5, worker_id="worker-a"),
+            task_queue.claim_tasks(5, worker_id="worker-b"),
+            task_queue.claim_tasks(5, worker_id="worker-c"),
+        )
+
+        claimed_ids = [task.id for batch in results for task in batch]
+        self.assertEqual(len(claimed_ids), 5)
+        self.assertEqual(len(set(claimed_ids)), 5)
+
+        rows = await GenerationTask.all()
+        for row in rows:
+            self.assertEqual(row.status, TaskStatus.PROCESSING)
+            self.assertIn(row.worker_id, {"worker-a", "worker-b", "worker-c"})
+            self.assertIsNotNone(row.lease_expires_at)
+
+    async def test_claimed_task_is_not_claimed_again(self):
+        (task,) = await self.create_tasks(1)
+        self.assertTrue(await task_queue.claim_task(task, "worker-a"))
+        self.assertFalse(await task_queue.claim_task(task, "worker-b"))
+        self.assertEqual(await task_queue.claim_tasks(5, worker_id="worker-b"), [])
+
+
+class TestFairScheduling(WorkerTestCase):
+    """测试优先级通道、老化与用户公平调度"""
+
+    async def test_other_users_not_starved_by_bulk_submitter(self):
+        await self.create_tasks(50, user_id="bulk")
+        await self.create_tasks(1, user_id="alice")
+        await self.create_tasks(1, user_id="bob")
+
+        claimed = await task_queue.claim_tasks(3, worker_id="worker-a")
+        self.assertEqual({task.user_id for task in claimed}, {"bulk", "alice", "bob"})
+
+    async def test_running_tasks_count_towards_user_share(self):
+        bulk = await self.create_tasks(5, user_id="bulk")
+        await task_queue.claim_task(bulk[0], "worker-a")
+        await self.create_tasks(1, user_id="alice")
+
+        (claimed,) = await task_queue.claim_tasks(1, worker_id="worker-b")
+        self.assertEqual(claimed.user_id, "alice")
+
+    async def test_higher_priority_lane_first_and_fifo_within_user(self):
+        detail = await self.create_tasks(3, user_id="1", task_type=TaskType.DETAIL, priority=10)
+        (tryon,) = await self.create_tasks(1, user_id="1", task_type=TaskType.TRYON, priority=20)
+
+        claimed = await task_queue.claim_tasks(4, worker_id="worker-a")
+        self.assertEqual([task.id for task in claimed], [tryon.id] + [task.id for task in detail])
+
+    async def test_aging_prevents_starvation(self):
+        (old_detail,) = await self.create_tasks(1, user_id="1", priority=10)
+        await GenerationTask.filter(id=old_detail.id).update(created_at=timezone.now() - timedelta(minutes=10))
+        await self.create_tasks(1, user_id="2", priority=20)
+
+        (claimed,) = await task_queue.claim_tasks(1, worker_id="worker-a")
+        self.assertEqual(claimed.id, old_detail.id)
+
+    async def test_aged_backlog_does_not_jump_ahead_of_new_tryon(self):
+        backlog = await self.create_tasks(500, user_id="bulk", task_type=TaskType.DETAIL, priority=10)
+        await GenerationTask.filter(user_id="bulk").update(created_at=timezone.now() - timedelta(minutes=15))
+        for task in backlog[:4]:
+            await task_queue.claim_task(task, "worker-a")
+        (tryon,) = await self.create_tasks(1, user_id="alice", task_type=TaskType.TRYON, priority=20)
+
+        (claimed,) = await task_queue.claim_tasks(1, worker_id="worker-b")
+        self.assertEqual(claimed.id, tryon.id)
+
+    async def test_users_outside_priority_window_are_candidates(self):
+        await self.create_tasks(5, user_id="bulk")
+        (late,) = await self.create_tasks(1, user_id="alice")
+
+        with patch.object(task_queue.settings, "TASK_SCHEDULE_WINDOW", 3):
+            candidates = await task_queue.fetch_candidates()
+        self.assertIn(late.id, {task.id for task in candidates})
+
+    def test_task_priority_lanes(self):
+        paid = MagicMock(total_recharged=100)
+        free = MagicMock(total_recharged=0)
+        self.assertGreater(task_priority(TaskType.TRYON, free), task_priority(TaskType.DETAIL, free))
+        self.assertGreater(task_priority(TaskType.DETAIL, paid), task_priority(TaskType.DETAIL, free))
+
+
+class TestLeaseRecovery(WorkerTestCase):
+    """测试租约续约与过期任务回收"""
+
+    async def expire(self, task):
+        await GenerationTask.filter(id=task.id).update(lease_expires_at=timezone.now() - timedelta(seconds=1))
+
+    async def test_claim_counts_attempts(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task, "worker-a")
+        self.assertEqual(task.attempts, 1)
+        self.assertEqual((await GenerationTask.get(id=task.id)).attempts, 1)
+
+    async def test_expired_task_is_requeued_and_claimable(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task, "dead-worker")
+        await self.expire(task)
+
+        requeued, failed = await task_queue.reap_expired_tasks(max_attempts=3)
+        self.assertEqual([t.id for t in requeued], [task.id])
+        self.assertEqual(failed, [])
+
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.QUEUED)
+        self.assertIsNone(saved.worker_id)
+
+        (reclaimed,) = await task_queue.claim_tasks(1, worker_id="worker-b")
+        self.assertEqual(reclaimed.attempts, 2)
+
+    async def test_task_fails_after_max_attempts(self):
+        (task,) = await self.create_tasks(1, attempts=2)
+        await task_queue.claim_task(task, "dead-worker")
+        await self.expire(task)
+
+        with patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()) as mock_push:
+            self.assertEqual(await image_worker.reap_expired(max_attempts=3), 1)
+
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.FAILED)
+        self.assertEqual(saved.error["code"], "LEASE_EXPIRED")
+        self.assertEqual(mock_push.call_args.kwargs["status"], "failed")
+
+    async def test_live_and_legacy_tasks(self):
+        live, legacy = await self.create_tasks(2)
+        await task_queue.claim_task(live, "worker-a")
+        # 租约机制上线前遗留的 processing 任务：没有租约，开始时间很早
+        await GenerationTask.filter(id=legacy.id).update(
+            status=TaskStatus.PROCESSING, started_at=timezone.now() - timedelta(days=1)
+        )
+
+        requeued, _ = await task_queue.reap_expired_tasks()
+        self.assertEqual([t.id for t in requeued], [legacy.id])
+        self.assertEqual((await GenerationTask.get(id=live.id)).status, TaskStatus.PROCESSING)
+
+    async def test_heartbeat_extends_lease(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task, task_queue.WORKER_ID)
+        await self.expire(task)
+
+        with patch.dict(image_worker.CONFIG, {"heartbeat_interval": 0.01}):
+            heartbeat = asyncio.create_task(image_worker._heartbeat(task))
+            await asyncio.sleep(0.05)
+            heartbeat.cancel()
+
+        saved = await GenerationTask.get(id=task.id)
+        self.assertGreater(saved.lease_expires_at, timezone.now())
+        self.assertEqual(await task_queue.reap_expired_tasks(), ([], []))
+
+    async def test_heartbeat_stops_when_lease_lost(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task, "other-worker")
+
+        with patch.dict(image_worker.CONFIG, {"heartbeat_interval": 0.01}):
+            await asyncio.wait_for(image_worker._heartbeat(task), 1)
+
+
+class TestCancellation(WorkerTestCase):
+    """测试任务取消与超时中止"""
+
+    async def test_cancelled_and_deleted_tasks_are_not_claimed(self):
+        cancelled, deleted, live = await self.create_tasks(3)
+        self.assertTrue(await task_queue.cancel_task(cancelled))
+        await GenerationTask.filter(id=deleted.id).update(is_deleted=True)
+
+        claimed = await task_queue.claim_tasks(3, worker_id="worker-a")
+        self.assertEqual([task.id for task in claimed], [live.id])
+        self.assertFalse(await task_queue.claim_task(deleted, "worker-a"))
+        self.assertEqual((await GenerationTask.get(id=cancelled.id)).status, TaskStatus.CANCELLED)
+
+    async def test_finished_task_cannot_be_cancelled(self):
+        (task,) = await self.create_tasks(1)
+        await GenerationTask.filter(id=task.id).update(status=TaskStatus.SUCCEEDED)
+        self.assertFalse(await task_queue.cancel_task(task))
+        self.assertEqual((await GenerationTask.get(id=task.id)).status, TaskStatus.SUCCEEDED)
+
+    async def test_result_does_not_overwrite_cancellation(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+        await task_queue.cancel_task(GenerationTask(id=task.id))
+
+        with patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()) as mock_push:
+            await image_worker.finish_task(task, {"images": ["https://oss/late.png"]})
+
+        mock_push.assert_not_awaited()
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.CANCELLED)
+        self.assertIsNone(saved.result)
+
+    async def test_running_task_aborted_when_cancelled(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+        started = asyncio.Event()
+        aborted = asyncio.Event()
+
+        async def hung_generate(**kwargs):
+            started.set()
+            try:
+                await asyncio.sleep(60)
+            except asyncio.CancelledError:
+                aborted.set()
+                raise
+
+        semaphore = asyncio.Semaphore(1)
+        await semaphore.acquire()
+        with (
+            patch.object(image_worker, "agenerate_image", hung_generate),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+            patch.dict(image_worker.CONFIG, {"heartbeat_interval": 0.01}),
+        ):
+            run = asyncio.create_task(image_worker._run_task(task, semaphore, {task.id}))
+            await asyncio.wait_for(started.wait(), 1)
+            await task_queue.cancel_task(GenerationTask(id=task.id))
+            await asyncio.wait_for(run, 1)
+
+        self.assertTrue(aborted.is_set())
+        self.assertFalse(semaphore.locked())
+        self.assertEqual((await GenerationTask.get(id=task.id)).status, TaskStatus.CANCELLED)
+
+    async def test_task_past_deadline_fails(self):
+        (task,) = await self.create_tasks(1)
+        await task_queue.claim_task(task)
+
+        async def hung_generate(**kwargs):
+            await asyncio.sleep(60)
+
+        semaphore = asyncio.Semaphore(1)
+        await semaphore.acquire()
+        with (
+            patch.object(image_worker, "agenerate_image", hung_generate),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()) as mock_push,
+            patch.dict(image_worker.CONFIG, {"task_timeout": 0.05}),
+        ):
+            await asyncio.wait_for(image_worker._run_task(task, semaphore, {task.id}), 1)
+
+        saved = await GenerationTask.get(id=task.id)
+        self.assertEqual(saved.status, TaskStatus.FAILED)
+        self.assertEqual(saved.error["code"], "TIMEOUT")
+        self.assertEqual(mock_push.call_args.kwargs["status"], "failed")
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
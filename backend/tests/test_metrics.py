@@ -0,0 +1,127 @@
+"""
+进程内指标测试
+
+运行方式：
+    cd backend && python -m pytest tests/test_metrics.py -v
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import HTTPException
+
+from app.core.dependency import ScrapeControl
+from app.core.metrics import MetricsRegistry, StageTimer, registry
+from app.core.metrics_server import serve_metrics
+from app.settings.config import settings
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def test_render_prometheus_text(self):
+        registry = MetricsRegistry()
+        counter = registry.counter("tasks_total", "Tasks", ["status"])
+        gauge = registry.gauge("in_flight", "In flight")
+        histogram = registry.histogram("stage_seconds", "Stage", ["stage"], buckets=(1, 5))
+
+        counter.inc(status="failed")
+        counter.inc(2, status="succeeded")
+        gauge.inc()
+        histogram.observe(0.5, stage="generate")
+        histogram.observe(3, stage="generate")
+
+        text = registry.render()
+        self.assertIn("# TYPE tasks_total counter", text)
+        self.assertIn('tasks_total{status="succeeded"} 2', text)
+        self.assertIn("in_flight 1", text)
+        self.assertIn('stage_seconds_bucket{stage="generate",le="1"} 1', text)
+        self.assertIn('stage_seconds_bucket{stage="generate",le="5"} 2', text)
+        self.assertIn('stage_seconds_bucket{stage="generate",le="+Inf"} 2', text)
+        self.assertIn('stage_seconds_sum{stage="generate"} 3.5', text)
+        self.assertIn('stage_seconds_count{stage="generate"} 2', text)
+
+    def test_same_name_returns_same_metric(self):
+        registry = MetricsRegistry()
+        self.assertIs(registry.counter("c", "doc"), registry.counter("c", "doc"))
+        with self.assertRaises(ValueError):
+            registry.gauge("c", "doc")
+
+    def test_labels_must_match(self):
+        counter = MetricsRegistry().counter("c", "doc", ["status"])
+        with self.assertRaises(ValueError):
+            counter.inc(kind="x")
+
+
+class TestStageTimer(unittest.TestCase):
+    def test_stages_accumulate_and_merge(self):
+        timer = StageTimer()
+        with timer.stage("upload"):
+            pass
+        timer.add("generate", 1.0)
+        timer.merge({"generate": 0.5, "parse": 0.25})
+
+        self.assertIn("upload", timer.timings)
+        self.assertEqual(timer.timings["generate"], 1.5)
+        self.assertEqual(timer.timings["parse"], 0.25)
+        self.assertGreaterEqual(timer.elapsed(), 0)
+
+
+class TestScrapeControl(unittest.IsolatedAsyncioTestCase):
+    """测试 /metrics 的抓取认证"""
+
+    async def test_static_token(self):
+        with patch.object(settings, "METRICS_TOKEN", "scrape-secret"):
+            await ScrapeControl.is_allowed("Bearer scrape-secret")
+            for authorization in (None, "Bearer wrong", "scrape-secret"):
+                with self.assertRaises(HTTPException) as context:
+                    await ScrapeControl.is_allowed(authorization)
+                self.assertEqual(context.exception.status_code, 401)
+
+    async def test_disabled_without_token(self):
+        # 经 nginx 代理的请求都来自本机，未配置令牌时一律拒绝
+        with patch.object(settings, "METRICS_TOKEN", ""):
+            for authorization in (None, "Bearer "):
+                with self.assertRaises(HTTPException) as context:
+                    await ScrapeControl.is_allowed(authorization)
+                self.assertEqual(context.exception.status_code, 403)
+
+
+class TestWorkerMetricsServer(unittest.IsolatedAsyncioTestCase):
+    """测试独立 Worker 进程的指标接口"""
+
+    @staticmethod
+    async def get(port, path, authorization=None):
+        reader, writer = await asyncio.open_connection("127.0.0.1", port)
+        headers = f"Authorization: {authorization}\r\n" if authorization else ""
+        writer.write(f"GET {path} HTTP/1.1\r\nHost: worker\r\n{headers}\r\n".encode())
+        response = (await reader.read()).decode()
+        writer.close()
+        status_line, _, body = response.partition("\r\n")
+        return int(status_line.split()[1]), body.split("\r\n\r\n", 1)[1]
+
+    async def test_serves_process_metrics_with_token(self):
+        registry.counter("worker_server_test_total", "Test").inc()
+        with patch.object(settings, "METRICS_TOKEN", "scrape-secret"):
+            server = await serve_metrics(0, host="127.0.0.1")
+            port = server.sockets[0].getsockname()[1]
+            try:
+                status, body = await self.get(port, "/metrics", "Bearer scrape-secret")
+                self.assertEqual(status, 200)
+                self.assertIn("worker_server_test_total 1", body)
+                self.assertEqual((await self.get(port, "/metrics", "Bearer wrong"))[0], 401)
+                self.assertEqual((await self.get(port, "/other", "Bearer scrape-secret"))[0], 404)
+            finally:
+                server.close()
+                await server.wait_closed()
+
+    async def test_not_started_without_token(self):
+        with patch.object(settings, "METRICS_TOKEN", ""):
+            self.assertIsNone(await serve_metrics(0, host="127.0.0.1"))
+
+
+if __name__ == "__main__":
+    unittest.main()
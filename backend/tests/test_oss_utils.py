@@ -0,0 +1,80 @@
+"""
+OSS 上传工具单元测试
+
+使用方法:
+    python -m pytest tests/test_oss_utils.py -v
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.utils.oss_utils import OSSConfig, OSSUploader
+
+
+def make_config(**kwargs) -> OSSConfig:
+    return OSSConfig(
+        access_key_id="id",
+        access_key_secret="secret",
+        bucket_name="bucket",
+        endpoint="oss-cn-hangzhou.aliyuncs.com",
+        **kwargs,
+    )
+
+
+class TestBucketReuse(unittest.TestCase):
+    """测试 Bucket 复用"""
+
+    def test_bucket_built_once(self):
+        config = make_config(pool_size=32)
+        with (
+            patch("app.utils.oss_utils.oss2.Session") as mock_session,
+            patch("app.utils.oss_utils.oss2.Bucket") as mock_bucket,
+        ):
+            first = config.bucket
+            second = config.bucket
+
+        self.assertIs(first, second)
+        mock_bucket.assert_called_once()
+        mock_session.assert_called_once_with(pool_size=32)
+
+    def test_reset_bucket(self):
+        config = make_config()
+        with patch("app.utils.oss_utils.oss2.Bucket") as mock_bucket:
+            config.bucket
+            config.reset_bucket()
+            config.bucket
+        self.assertEqual(mock_bucket.call_count, 2)
+
+
+class TestUploadFileAsync(unittest.TestCase):
+    """测试异步上传与重试"""
+
+    def test_retries_until_success(self):
+        uploader = OSSUploader(make_config())
+        outcomes = [(False, "timeout"), (True, "https://bucket/a.png")]
+        uploader.upload_file = MagicMock(side_effect=outcomes)
+
+        success, url = asyncio.run(uploader.upload_file_async(b"data", "a.png", retries=2, retry_delay=0))
+
+        self.assertTrue(success)
+        self.assertEqual(url, "https://bucket/a.png")
+        self.assertEqual(uploader.upload_file.call_count, 2)
+
+    def test_gives_up_after_retries(self):
+        uploader = OSSUploader(make_config())
+        uploader.upload_file = MagicMock(return_value=(False, "denied"))
+
+        success, error = asyncio.run(uploader.upload_file_async(b"data", "a.png", retries=1, retry_delay=0))
+
+        self.assertFalse(success)
+        self.assertEqual(error, "denied")
+        self.assertEqual(uploader.upload_file.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
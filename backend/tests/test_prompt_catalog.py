@@ -0,0 +1,295 @@
+"""
+提示词配置目录与 PromptAssembler 测试
+
+运行方式：
+    cd backend && python -m pytest tests/test_prompt_catalog.py -v
+"""
+
+import json
+import random
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from fastapi import HTTPException
+from tortoise import Tortoise
+
+from app.api.v1.prompt_config.prompt_config import get_catalog, preview_prompt
+from app.models.prompt_config import (
+    PromptCombinationRule,
+    PromptConfigGroup,
+    PromptConfigOption,
+    PromptConfigSetting,
+)
+from app.schemas.prompt_config import PromptPreviewRequest
+from app.services import prompt_catalog
+from app.services.prompt_assembler import PromptAssembler
+from app.services.prompt_catalog import CatalogRule, PromptCatalog
+
+
+class PromptConfigTestCase(unittest.IsolatedAsyncioTestCase):
+    """初始化内存数据库和示例提示词配置的基类"""
+
+    async def asyncSetUp(self):
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        await Tortoise.generate_schemas()
+        prompt_catalog.invalidate_prompt_catalog()
+
+        await PromptConfigSetting.create(key="base_prompt_tryon", value="virtual try-on", value_type="text")
+        await PromptConfigSetting.create(key="global_negative_prompt", value="blurry", value_type="text")
+
+        style = await PromptConfigGroup.create(group_key="style", group_name="风格", input_type="radio")
+        scene = await PromptConfigGroup.create(group_key="scene", group_name="场景", input_type="checkbox")
+        hidden = await PromptConfigGroup.create(
+            group_key="hidden", group_name="停用", input_type="radio", is_active=False
+        )
+        await PromptConfigOption.create(
+            group=style, option_key="street", option_label="街拍", prompt_text="street style", prompt_order=1
+        )
+        await PromptConfigOption.create(
+            group=style, option_key="retired", option_label="停用", prompt_text="retired", is_active=False
+        )
+        await PromptConfigOption.create(
+            group=scene, option_key="beach", option_label="海滩", prompt_text="beach", prompt_order=3, sort_order=2
+        )
+        await PromptConfigOption.create(
+            group=scene,
+            option_key="sunset",
+            option_label="日落",
+            prompt_text="sunset light",
+            negative_prompt="overexposed",
+            sort_order=1,
+        )
+        await PromptConfigOption.create(group=hidden, option_key="x", option_label="x", prompt_text="hidden")
+
+        await PromptCombinationRule.create(
+            name="beach-negative",
+            condition_json={"scene": ["beach"]},
+            action_type="append",
+            target="negative",
+            action_prompt="snow",
+            priority=1,
+        )
+        await PromptCombinationRule.create(
+            name="street-prefix",
+            condition_json={"style": ["street"]},
+            action_type="prepend",
+            target="positive",
+            action_prompt="urban",
+            priority=5,
+        )
+
+    async def asyncTearDown(self):
+        await Tortoise._drop_databases()
+        prompt_catalog.invalidate_prompt_catalog()
+
+
+class TestPromptAssembler(PromptConfigTestCase):
+    async def test_assemble(self):
+        selections = {"scene": ["beach", "sunset"], "style": ["street", "retired"], "hidden": ["x"]}
+        assembled = await PromptAssembler("tryon").assemble(selections, "red dress")
+
+        self.assertEqual(
+            assembled.positive_prompt, "urban, virtual try-on, street style, red dress, sunset light, beach"
+        )
+        self.assertEqual(assembled.negative_prompt, "blurry, overexposed, snow")
+        self.assertEqual(assembled.raw_selections, selections)
+
+    async def test_assemble_does_not_query_database_once_loaded(self):
+        await PromptAssembler("tryon").assemble({"style": ["street"]})
+
+        with (
+            patch.object(prompt_catalog, "load_prompt_catalog") as mock_load,
+            patch.object(PromptConfigOption, "filter") as mock_filter,
+        ):
+            for _ in range(3):
+                await PromptAssembler("tryon").assemble({"style": ["street"], "scene": ["beach"]})
+
+        mock_load.assert_not_called()
+        mock_filter.assert_not_called()
+
+    async def test_assemble_many_matches_assemble(self):
+        selections = [
+            {"scene": ["beach", "sunset"], "style": ["street"]},
+            {"style": ["street"]},
+            {"scene": ["sunset", "beach", "beach"], "style": ["street"]},
+            {"scene": ["beach", "sunset"], "style": ["street"]},
+        ]
+        user_prompts = ["red dress", None, "red dress", "blue coat"]
+
+        results = await PromptAssembler.assemble_many("tryon", selections, user_prompts)
+
+        assembler = PromptAssembler("tryon")
+        for selected, user_prompt, result in zip(selections, user_prompts, results):
+            self.assertEqual(result, await assembler.assemble(selected, user_prompt))
+
+    async def test_assemble_many_memoizes_identical_selections(self):
+        selections = [{"scene": ["beach"]}, {"scene": ["beach"]}, {"scene": ["beach"]}, {"style": ["street"]}]
+        with patch.object(PromptAssembler, "_compose", wraps=PromptAssembler("tryon")._compose) as mock_compose:
+            results = await PromptAssembler.assemble_many("tryon", selections)
+
+        self.assertEqual(mock_compose.call_count, 2)
+        self.assertEqual(len({result.positive_prompt for result in results[:3]}), 1)
+
+
+class TestPromptCatalog(PromptConfigTestCase):
+    async def test_catalog_compiled(self):
+        catalog = await prompt_catalog.get_prompt_catalog()
+
+        self.assertEqual(set(catalog.options), {"style", "scene"})
+        self.assertEqual(list(catalog.options["scene"]), ["sunset", "beach"])
+        self.assertNotIn("retired", catalog.options["style"])
+        self.assertEqual([rule.name for rule in catalog.rules], ["street-prefix", "beach-negative"])
+        self.assertEqual(catalog.rules[1].condition, {"scene": frozenset({"beach"})})
+
+    async def test_invalidate_reloads_changes(self):
+        first = await prompt_catalog.get_prompt_catalog()
+        self.assertIs(await prompt_catalog.get_prompt_catalog(), first)
+
+        await PromptConfigSetting.filter(key="base_prompt_tryon").update(value="try-on v2")
+        self.assertIs(await prompt_catalog.get_prompt_catalog(), first)
+
+        prompt_catalog.invalidate_prompt_catalog()
+        second = await prompt_catalog.get_prompt_catalog()
+        self.assertEqual(second.settings["base_prompt_tryon"], "try-on v2")
+        self.assertEqual(second.revision, prompt_catalog.prompt_catalog_revision())
+
+    async def test_expired_catalog_reloaded(self):
+        first = await prompt_catalog.get_prompt_catalog()
+        with patch.object(prompt_catalog.settings, "PROMPT_CATALOG_TTL_SECONDS", 0):
+            self.assertIsNot(await prompt_catalog.get_prompt_catalog(), first)
+
+
+class TestRuleIndex(unittest.TestCase):
+    """倒排索引匹配与逐条检查条件的结果一致（含优先级顺序）"""
+
+    def test_index_matches_linear_scan(self):
+        rng = random.Random(7)
+        keys = [(f"g{g}", f"o{o}") for g in range(6) for o in range(6)]
+
+        def condition():
+            return {
+                group: frozenset(f"o{rng.randrange(6)}" for _ in range(rng.randint(0, 3)))
+                for group in {f"g{rng.randrange(6)}" for _ in range(rng.randint(0, 3))}
+            }
+
+        rules = tuple(
+            sorted(
+                (
+                    CatalogRule(f"r{i}", condition(), "append", "positive", f"p{i}", rng.randrange(10))
+                    for i in range(300)
+                ),
+                key=lambda rule: -rule.priority,
+            )
+        )
+        catalog = PromptCatalog(revision=0, rules=rules)
+        assembler = PromptAssembler("tryon", catalog)
+
+        for _ in range(500):
+            selected = {}
+            for group, option in rng.sample(keys, rng.randint(0, 8)):
+                selected.setdefault(group, []).append(option)
+            expected = [rule for rule in rules if assembler._check_condition(rule.condition, selected)]
+            self.assertEqual(catalog.match_rules(selected), expected)
+
+    def test_rules_without_condition_never_match(self):
+        catalog = PromptCatalog(revision=0, rules=(CatalogRule("empty", {}, "append", "positive", "x", 0),))
+        self.assertEqual(catalog.match_rules({"g": ["o"]}), [])
+
+
+class TestPromptPreview(PromptConfigTestCase):
+    request = PromptPreviewRequest(prompt_configs={"style": ["street"]}, prompt="red dress")
+
+    @staticmethod
+    async def preview(request, if_none_match=None):
+        return await preview_prompt(
+            request.task_type, json.dumps(request.prompt_configs), request.prompt, if_none_match
+        )
+
+    async def test_preview_returns_assembled_prompt_with_etag(self):
+        response = await self.preview(self.request)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.headers["ETag"].startswith('"'))
+        self.assertEqual(response.headers["Cache-Control"], "no-cache")
+        data = json.loads(response.body)["data"]
+        self.assertEqual(data["positive_prompt"], "urban, virtual try-on, street style, red dress")
+        self.assertEqual(data["negative_prompt"], "blurry")
+        self.assertEqual(data["raw_selections"], {"style": ["street"]})
+
+    async def test_invalid_prompt_configs_rejected(self):
+        for prompt_configs in ("not json", '["style"]', '{"style": "street"}'):
+            with self.assertRaises(HTTPException) as context:
+                await preview_prompt("tryon", prompt_configs, None, None)
+            self.assertEqual(context.exception.status_code, 400)
+
+    async def test_matching_etag_returns_not_modified(self):
+        etag = (await self.preview(self.request)).headers["ETag"]
+
+        with patch("app.api.v1.prompt_config.prompt_config.PromptAssembler") as mock_assembler:
+            response = await self.preview(self.request, f'W/"other", {etag}')
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        mock_assembler.assert_not_called()
+
+    async def test_etag_changes_with_request_and_catalog_content(self):
+        etag = (await self.preview(self.request)).headers["ETag"]
+
+        other = PromptPreviewRequest(prompt_configs={"style": ["street"]}, prompt="blue dress")
+        self.assertNotEqual((await self.preview(other, etag)).status_code, 304)
+
+        # 仅失效不改内容：指纹不变，ETag 仍然有效
+        prompt_catalog.invalidate_prompt_catalog()
+        self.assertEqual((await self.preview(self.request, etag)).status_code, 304)
+
+        await PromptConfigOption.filter(option_key="street").update(prompt_text="street wear")
+        prompt_catalog.invalidate_prompt_catalog()
+        response = await self.preview(self.request, etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response.headers["ETag"], etag)
+
+
+class TestCatalogEndpoint(PromptConfigTestCase):
+    async def test_catalog_returns_active_groups_with_options(self):
+        response = await get_catalog(None)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.media_type, "application/json")
+        data = json.loads(response.body)["data"]
+        self.assertEqual([group["group_key"] for group in data], ["style", "scene"])
+        self.assertEqual([option["option_key"] for option in data[0]["options"]], ["street"])
+        self.assertEqual([option["option_key"] for option in data[1]["options"]], ["sunset", "beach"])
+        self.assertEqual(data[1]["options"][0]["option_label"], "日落")
+
+    async def test_serialized_body_cached_until_invalidated(self):
+        first = await get_catalog(None)
+
+        with patch.object(prompt_catalog, "load_catalog_payload") as mock_load:
+            second = await get_catalog(None)
+        mock_load.assert_not_called()
+        self.assertIs(second.body, first.body)
+
+        await PromptConfigOption.filter(option_key="beach").update(option_label="沙滩")
+        prompt_catalog.invalidate_prompt_catalog()
+        third = await get_catalog(None)
+        self.assertIn("沙滩", third.body.decode("utf-8"))
+        self.assertNotEqual(third.headers["ETag"], first.headers["ETag"])
+
+    async def test_matching_etag_returns_not_modified(self):
+        etag = (await get_catalog(None)).headers["ETag"]
+
+        response = await get_catalog(etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.headers["ETag"], etag)
+        self.assertEqual(response.body, b"")
+
+        # 内容未变化的失效（如其他进程重新加载）不改变 ETag
+        prompt_catalog.invalidate_prompt_catalog()
+        self.assertEqual((await get_catalog(etag)).status_code, 304)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+"""
+Gemini 限流器单元测试
+
+使用方法:
+    python -m pytest tests/test_rate_limiter.py -v
+"""
+
+import asyncio
+import sys
+import time
+import unittest
+from unittest.mock import patch
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tortoise import Tortoise
+
+from app.core.rate_limiter import DatabaseRateLimiter, LocalRateLimiter, RateBudget, load_budgets
+
+
+class TestLocalRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """测试进程内令牌桶"""
+
+    async def test_requests_over_rpm_wait_instead_of_failing(self):
+        # 600 RPM = 每 0.1 秒一个令牌，桶容量 1
+        limiter = LocalRateLimiter(RateBudget(rpm=600, burst=1))
+        started = time.monotonic()
+        for _ in range(4):
+            async with limiter.limit("m"):
+                pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.28)
+
+    async def test_concurrency_budget_and_fifo_order(self):
+        limiter = LocalRateLimiter(RateBudget(max_concurrent=2))
+        active = 0
+        peak = 0
+        order = []
+
+        async def call(i):
+            nonlocal active, peak
+            async with limiter.limit("m"):
+                order.append(i)
+                active += 1
+                peak = max(peak, active)
+                await asyncio.sleep(0.01)
+                active -= 1
+
+        await asyncio.gather(*(call(i) for i in range(8)))
+        self.assertEqual(peak, 2)
+        self.assertEqual(order, list(range(8)))
+
+    async def test_budgets_are_per_model(self):
+        limiter = LocalRateLimiter(RateBudget(rpm=60, burst=1), budgets={"fast": RateBudget(rpm=0)})
+        async with limiter.limit("slow"):
+            pass
+        # fast 模型不限速，不受 slow 令牌耗尽影响
+        await asyncio.wait_for(limiter.acquire("fast"), 0.1)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(limiter.acquire("slow"), 0.1)
+
+    async def test_penalize_pauses_model(self):
+        limiter = LocalRateLimiter(RateBudget(rpm=6000, burst=10))
+        await limiter.penalize("m", 0.2)
+        started = time.monotonic()
+        async with limiter.limit("m"):
+            pass
+        self.assertGreaterEqual(time.monotonic() - started, 0.18)
+
+    def test_load_budgets_from_env(self):
+        with patch.dict("os.environ", {"GEMINI_RATE_LIMITS": '{"pro": {"rpm": 20, "max_concurrent": 4}}'}):
+            budgets = load_budgets()
+        self.assertEqual(budgets["pro"].rpm, 20)
+        self.assertEqual(budgets["pro"].max_concurrent, 4)
+
+
+class TestDatabaseRateLimiter(unittest.IsolatedAsyncioTestCase):
+    """测试数据库共享令牌桶"""
+
+    async def asyncSetUp(self):
+        await Tortoise.init(db_url="sqlite://:memory:", modules={"models": ["app.models"]})
+        await Tortoise.generate_schemas()
+
+    async def asyncTearDown(self):
+        await Tortoise._drop_databases()
+
+    async def test_limiters_share_one_quota(self):
+        # 两个限流器实例模拟两个 Worker 进程，共享容量为 2 的桶
+        budget = RateBudget(rpm=60, burst=2)
+        first = DatabaseRateLimiter(budget)
+        second = DatabaseRateLimiter(budget)
+
+        await asyncio.wait_for(first.acquire("m"), 0.5)
+        await asyncio.wait_for(second.acquire("m"), 0.5)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(first.acquire("m"), 0.2)
+
+    async def test_penalize_is_shared(self):
+        budget = RateBudget(rpm=6000, burst=10)
+        first = DatabaseRateLimiter(budget)
+        second = DatabaseRateLimiter(budget)
+
+        await first.penalize("m", 0.3)
+        with self.assertRaises(asyncio.TimeoutError):
+            await asyncio.wait_for(second.acquire("m"), 0.1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,143 @@
+"""
+生成结果缓存与提交幂等单元测试
+
+使用方法:
+    python -m pytest tests/test_result_cache.py -v
+"""
+
+import sys
+import unittest
+import uuid
+from datetime import timedelta
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from tortoise import timezone
+from tortoise.exceptions import IntegrityError
+
+from app.api.v1.tasks import tasks as tasks_api
+from app.core import image_worker, task_queue
+from app.models.generation_task import GenerationResultCache, GenerationTask, TaskStatus, TaskTryon, TaskType
+from app.schemas.generation_task import CreateTaskRequest
+from app.services import result_cache
+from tests.test_image_worker import WorkerTestCase
+
+
+class TestCacheKey(unittest.TestCase):
+    """测试缓存键的规范化"""
+
+    def test_key_is_stable_and_sensitive(self):
+        params = {"aspect_ratio": "3:4", "quality": "1K", "seed": 7}
+        key = result_cache.build_cache_key("a prompt", ["d1", "d2"], params)
+        self.assertEqual(key, result_cache.build_cache_key(" a prompt ", ["d1", "d2"], dict(reversed(params.items()))))
+        self.assertNotEqual(key, result_cache.build_cache_key("a prompt", ["d2", "d1"], params))
+        self.assertNotEqual(key, result_cache.build_cache_key("a prompt", ["d1", "d2"], {**params, "seed": 8}))
+
+
+class TestResultCacheStore(WorkerTestCase):
+    """测试缓存读写、过期与淘汰"""
+
+    async def test_store_and_hit(self):
+        await result_cache.store_result("k1", {"images": ["https://oss/a.png"], "local_paths": ["/tmp/a.png"]})
+        self.assertEqual(await result_cache.get_cached_result("k1"), {"images": ["https://oss/a.png"]})
+        self.assertEqual((await GenerationResultCache.get(cache_key="k1")).hits, 1)
+        self.assertIsNone(await result_cache.get_cached_result("missing"))
+
+    async def test_expired_entries_are_ignored(self):
+        await result_cache.store_result("k1", {"images": ["u"]})
+        await GenerationResultCache.filter(cache_key="k1").update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertIsNone(await result_cache.get_cached_result("k1"))
+
+    async def test_eviction_keeps_recently_hit_entries(self):
+        with patch.object(result_cache.settings, "RESULT_CACHE_MAX_ENTRIES", 2):
+            await result_cache.store_result("old", {"images": ["u1"]})
+            await result_cache.store_result("hot", {"images": ["u2"]})
+            await GenerationResultCache.filter(cache_key="old").update(last_hit_at=timezone.now() - timedelta(hours=1))
+            await result_cache.store_result("new", {"images": ["u3"]})
+
+        self.assertEqual(set(await GenerationResultCache.all().values_list("cache_key", flat=True)), {"hot", "new"})
+
+
+class TestWorkerResultCache(WorkerTestCase):
+    """测试 Worker 命中缓存时跳过生成"""
+
+    async def create_tryon(self, seed: int, use_cache: bool = True):
+        (task,) = await self.create_tasks(1, task_type=TaskType.TRYON, use_cache=use_cache)
+        await TaskTryon.create(
+            id=uuid.uuid4(),
+            task=task,
+            person_image="https://a/p.png",
+            garment_image="https://a/g.png",
+            category="top",
+            seed=seed,
+        )
+        await task_queue.claim_task(task)
+        return task
+
+    async def run_task(self, task, generate):
+        client = MagicMock(model="test-model")
+        client.areference_digests = AsyncMock(return_value=["person", "garment"])
+        upload = AsyncMock(return_value={"url": "https://oss/x.png"})
+        with (
+            patch.object(image_worker, "agenerate_image", generate),
+            patch.object(image_worker, "get_image_client", return_value=client),
+            patch.object(image_worker, "upload_image_to_oss", upload),
+            patch.object(image_worker.ws_manager, "push_task_update", AsyncMock()),
+        ):
+            return await image_worker.process_single_task(task)
+
+    async def test_identical_fixed_seed_request_served_from_cache(self):
+        generated = {"status": "success", "image_data": [{"data": b"png", "mime_type": "image/png"}]}
+        generate = AsyncMock(return_value=generated)
+
+        self.assertTrue(await self.run_task(await self.create_tryon(seed=42), generate))
+        second = await self.create_tryon(seed=42)
+        self.assertTrue(await self.run_task(second, generate))
+
+        generate.assert_awaited_once()
+        saved = await GenerationTask.get(id=second.id)
+        self.assertEqual(saved.status, TaskStatus.SUCCEEDED)
+        self.assertEqual(saved.result, {"images": ["https://oss/x.png"], "cached": True})
+
+    async def test_random_seed_and_bypass_skip_cache(self):
+        generate = AsyncMock(return_value={"status": "success", "image_data": []})
+        await self.run_task(await self.create_tryon(seed=-1), generate)
+        await self.run_task(await self.create_tryon(seed=42, use_cache=False), generate)
+
+        self.assertEqual(generate.await_count, 2)
+        self.assertEqual(await GenerationResultCache.all().count(), 0)
+
+
+class TestIdempotentSubmit(WorkerTestCase):
+    """测试 POST /tasks/generate 的幂等键"""
+
+    async def submit(self, key):
+        request = CreateTaskRequest(task_type=TaskType.MODEL, prompt="p")
+        user = MagicMock(id=1, total_recharged=0)
+        with patch.object(tasks_api, "get_task_notifier") as notifier:
+            notifier.return_value.notify = AsyncMock()
+            response = await tasks_api.create_task(request, current_user=user, idempotency_key=key)
+        return response.body
+
+    async def test_retry_with_same_key_returns_same_task(self):
+        first = await self.submit("client-retry-1")
+        second = await self.submit("client-retry-1")
+        self.assertEqual(first, second)
+        self.assertEqual(await GenerationTask.all().count(), 1)
+
+        await self.submit("client-retry-2")
+        await self.submit(None)
+        await self.submit(None)
+        self.assertEqual(await GenerationTask.all().count(), 4)
+
+    async def test_integrity_error_without_key_is_raised(self):
+        await self.submit(None)
+        with patch.object(tasks_api.GenerationTask, "create", AsyncMock(side_effect=IntegrityError("duplicate"))):
+            with self.assertRaises(IntegrityError):
+                await self.submit(None)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,128 @@
+"""
+重试策略单元测试
+
+使用方法:
+    python -m pytest tests/test_retry_policy.py -v
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import httpx
+
+from app.core.image_client import genai_errors
+from app.core.retry_policy import (
+    ErrorKind,
+    classify_exception,
+    classify_result,
+    compute_backoff,
+)
+
+
+def api_error(code: int, headers=None, details=None) -> genai_errors.APIError:
+    response = MagicMock()
+    response.headers = headers or {}
+    error_cls = genai_errors.ClientError if code < 500 else genai_errors.ServerError
+    return error_cls(code, details or {"error": {"code": code, "message": "error", "status": "ERROR"}}, response)
+
+
+class TestClassifyResult(unittest.TestCase):
+    """测试 ImageClient 错误结果分类"""
+
+    def test_safety_block_is_permanent(self):
+        result = {"status": "error", "error": "Generation prevented. Finish reason: SAFETY", "safety_ratings": "[]"}
+        self.assertEqual(classify_result(result).kind, ErrorKind.PERMANENT)
+
+    def test_rate_limit_keeps_retry_after(self):
+        result = {"status": "error", "error": "429 RESOURCE_EXHAUSTED", "status_code": 429, "retry_after": 12.0}
+        classified = classify_result(result)
+        self.assertEqual(classified.kind, ErrorKind.RATE_LIMITED)
+        self.assertEqual(classified.retry_after, 12.0)
+
+    def test_server_error_is_transient(self):
+        result = {"status": "error", "error": "503 UNAVAILABLE", "status_code": 503}
+        self.assertEqual(classify_result(result).kind, ErrorKind.TRANSIENT)
+
+    def test_bad_request_is_permanent(self):
+        result = {"status": "error", "error": "400 INVALID_ARGUMENT", "status_code": 400}
+        self.assertFalse(classify_result(result).retryable)
+
+    def test_bad_request_after_reference_invalidation_is_transient(self):
+        result = {
+            "status": "error",
+            "error": "400 INVALID_ARGUMENT",
+            "status_code": 400,
+            "references_invalidated": True,
+        }
+        self.assertEqual(classify_result(result).kind, ErrorKind.TRANSIENT)
+        self.assertEqual(classify_result(result, allow_reupload=False).kind, ErrorKind.PERMANENT)
+
+
+class TestClassifyException(unittest.TestCase):
+    """测试异常分类"""
+
+    def test_value_error_is_permanent(self):
+        self.assertEqual(classify_exception(ValueError("Invalid aspect_ratio: 7:3")).kind, ErrorKind.PERMANENT)
+
+    def test_wrapped_network_error_is_transient(self):
+        try:
+            try:
+                raise httpx.ConnectTimeout("timed out")
+            except httpx.ConnectTimeout as e:
+                raise ValueError("Failed to upload reference image from URL x: timed out") from e
+        except ValueError as wrapped:
+            classified = classify_exception(wrapped)
+        self.assertEqual(classified.kind, ErrorKind.TRANSIENT)
+        self.assertIn("Failed to upload reference image", classified.message)
+
+    def test_timeout_is_transient(self):
+        self.assertEqual(classify_exception(asyncio.TimeoutError()).kind, ErrorKind.TRANSIENT)
+
+    def test_api_error_retry_after_header(self):
+        classified = classify_exception(api_error(429, headers={"retry-after": "7"}))
+        self.assertEqual(classified.kind, ErrorKind.RATE_LIMITED)
+        self.assertEqual(classified.retry_after, 7.0)
+
+    def test_api_error_retry_info_details(self):
+        details = {
+            "error": {
+                "code": 429,
+                "message": "quota",
+                "status": "RESOURCE_EXHAUSTED",
+                "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": "21s"}],
+            }
+        }
+        classified = classify_exception(api_error(429, details=details))
+        self.assertEqual(classified.retry_after, 21.0)
+
+    def test_server_api_error_is_transient(self):
+        self.assertEqual(classify_exception(api_error(500)).kind, ErrorKind.TRANSIENT)
+
+    def test_forbidden_api_error_is_permanent(self):
+        self.assertEqual(classify_exception(api_error(403)).kind, ErrorKind.PERMANENT)
+
+
+class TestComputeBackoff(unittest.TestCase):
+    """测试退避时间计算"""
+
+    def test_exponential_with_jitter_bounds(self):
+        for attempt in range(6):
+            for _ in range(50):
+                delay = compute_backoff(attempt, base_delay=2, max_delay=30)
+                self.assertGreaterEqual(delay, 0)
+                self.assertLessEqual(delay, min(30, 2 * 2**attempt))
+
+    def test_retry_after_is_honored_and_capped(self):
+        delay = compute_backoff(0, base_delay=2, max_delay=60, retry_after=10)
+        self.assertGreaterEqual(delay, 10)
+        self.assertLessEqual(delay, 11)
+        self.assertEqual(compute_backoff(0, base_delay=2, max_delay=60, retry_after=600), 60)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
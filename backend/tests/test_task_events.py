@@ -0,0 +1,104 @@
+"""
+跨进程任务事件测试
+
+运行方式：
+    cd backend && python -m pytest tests/test_task_events.py -v
+"""
+
+import asyncio
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core import task_events
+from app.core.task_events import DatabaseTaskNotifier, PollBackoff
+from app.core.ws_manager import ws_manager
+from app.models.task_event import TaskEvent
+from tests.test_image_worker import WorkerTestCase
+
+
+class TestPushRelay(WorkerTestCase):
+    """Worker 进程的推送经事件表由 API 进程转发"""
+
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.addCleanup(ws_manager.set_publisher, None)
+
+    async def test_worker_push_relayed_to_connected_user(self):
+        last_id = await task_events.latest_event_id()
+
+        # Worker 进程：推送写入事件表，不直接发送
+        ws_manager.set_publisher(task_events.publish_push)
+        with patch.object(ws_manager, "send_message", AsyncMock()) as worker_send:
+            await ws_manager.push_task_update(user_id="1", task_id="t1", status="processing", stage="generating")
+            await ws_manager.push_task_update(user_id="2", task_id="t2", status="succeeded")
+        worker_send.assert_not_awaited()
+        ws_manager.set_publisher(None)
+
+        # API 进程：只转发给本进程持有连接的用户
+        with (
+            patch.dict(ws_manager.connections, {"1": object()}),
+            patch.object(ws_manager, "send_message", AsyncMock()) as api_send,
+        ):
+            last_id = await task_events.relay_once(last_id)
+            self.assertEqual(await task_events.relay_once(last_id), last_id)
+
+        api_send.assert_awaited_once()
+        user_id, message = api_send.await_args.args
+        self.assertEqual(user_id, "1")
+        self.assertEqual(message["stage"], "generating")
+        self.assertEqual(last_id, await task_events.latest_event_id())
+
+    async def test_new_task_wakes_idle_relay(self):
+        # 转发已退避到最长间隔，本进程创建新任务时立即恢复轮询
+        with (
+            patch.object(task_events.settings, "TASK_EVENTS_POLL_SECONDS", 10),
+            patch.object(task_events.settings, "TASK_EVENTS_POLL_MAX_SECONDS", 10),
+            patch.dict(ws_manager.connections, {"1": object()}),
+            patch.object(ws_manager, "send_message", AsyncMock()) as api_send,
+        ):
+            relay = asyncio.create_task(task_events.relay_loop())
+            await asyncio.sleep(0.05)
+            await task_events.publish_push("1", {"type": "task_update"})
+            await DatabaseTaskNotifier().notify("t1")
+            await asyncio.sleep(0.05)
+            relay.cancel()
+            await relay
+
+        api_send.assert_awaited_once_with("1", {"type": "task_update"})
+
+    async def test_expired_events_purged(self):
+        await task_events.publish_push("1", {"type": "task_update"})
+        with patch.object(task_events.settings, "TASK_EVENTS_RETENTION_SECONDS", -1):
+            self.assertEqual(await task_events.purge_expired(), 1)
+        self.assertEqual(await TaskEvent.all().count(), 0)
+
+
+class TestDatabaseTaskNotifier(WorkerTestCase):
+    """新任务通知经事件表唤醒其他进程的 Worker"""
+
+    async def test_notify_wakes_waiter_in_other_process(self):
+        worker_side = DatabaseTaskNotifier(poll_interval=0.01)
+        api_side = DatabaseTaskNotifier(poll_interval=0.01)
+
+        self.assertFalse(await worker_side.wait(0.05))
+        waiter = asyncio.create_task(worker_side.wait(2))
+        await asyncio.sleep(0.02)
+        await api_side.notify("t1")
+        self.assertTrue(await asyncio.wait_for(waiter, 1))
+
+        # 已消费的通知不会再次唤醒
+        self.assertFalse(await worker_side.wait(0.05))
+
+    def test_poll_backoff(self):
+        backoff = PollBackoff(1, 5)
+        self.assertEqual([backoff.next() for _ in range(5)], [1, 2, 4, 5, 5])
+        backoff.reset()
+        self.assertEqual(backoff.next(), 1)
+
+
+if __name__ == "__main__":
+    unittest.main(verbosity=2)
@@ -0,0 +1,69 @@
+"""
+任务进度推送测试
+
+运行方式：
+    cd backend && python -m pytest tests/test_task_progress.py -v
+"""
+
+import asyncio
+import sys
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from app.core import task_progress
+from app.core.task_progress import ProgressReporter
+
+
+class TestProgressReporter(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.task = MagicMock(id=uuid.uuid4(), user_id="1")
+        self.push = AsyncMock()
+        patcher = patch.object(task_progress.ws_manager, "push_task_update", self.push)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def pushed_stages(self):
+        return [call.kwargs["stage"] for call in self.push.await_args_list]
+
+    async def test_first_stage_sent_immediately(self):
+        reporter = ProgressReporter(self.task, min_interval=10)
+        await reporter.report("generating", attempt=1)
+
+        self.push.assert_awaited_once()
+        self.assertEqual(self.push.call_args.kwargs["status"], "processing")
+        self.assertEqual(self.push.call_args.kwargs["details"], {"attempt": 1})
+        reporter.close()
+
+    async def test_stages_within_interval_are_coalesced(self):
+        reporter = ProgressReporter(self.task, min_interval=0.05)
+        await reporter.report("references_uploaded")
+        await reporter.report("generating", attempt=1)
+        await reporter.report("generating", attempt=2)
+        self.assertEqual(self.pushed_stages(), ["references_uploaded"])
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.pushed_stages(), ["references_uploaded", "generating"])
+        self.assertEqual(self.push.call_args.kwargs["details"], {"attempt": 2})
+
+    async def test_close_drops_pending_progress(self):
+        reporter = ProgressReporter(self.task, min_interval=0.05)
+        await reporter.report("generating")
+        await reporter.report("uploading")
+        reporter.close()
+        await reporter.report("uploading")
+
+        await asyncio.sleep(0.1)
+        self.assertEqual(self.pushed_stages(), ["generating"])
+
+    async def test_push_errors_are_swallowed(self):
+        self.push.side_effect = RuntimeError("socket closed")
+        reporter = ProgressReporter(self.task, min_interval=0)
+        await reporter.report("generating")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,123 @@
+"""
+独立图像生成 Worker
+
+与 API 进程分开部署，按需扩展生成能力（API 进程设置 WORKER_EMBEDDED=false 关闭内嵌 Worker）：
+
+    python worker.py --processes 4 --concurrency 8
+
+每个进程独立认领任务（条件 UPDATE，见 app/core/task_queue.py），同时处理最多 concurrency 个任务。
+主进程收到 SIGTERM / SIGINT 后转发给所有子进程：子进程停止认领新任务，
+等待处理中的任务完成（最多 --drain-timeout 秒），仍未完成的任务放回队列后退出。
+子进程异常退出时由主进程重新拉起。
+
+指标（耗时、重试、in-flight）保存在各进程内存中，API 的 /api/v1/metrics 看不到。设置 --metrics-port
+（或 WORKER_METRICS_PORT）与 METRICS_TOKEN 后，第 i 个进程在 port + i 上提供 GET /metrics 供 Prometheus 抓取。
+
+Worker 进程没有客户端的 WebSocket 连接，也收不到 API 进程内的新任务通知。须在 API 与 Worker 上都设置
+TASK_EVENTS_BACKEND=database（见 app/core/task_events.py）：状态推送写入 task_event 表由 API 进程转发，
+新任务通知经同一张表唤醒 Worker。保持默认的 local 时推送（包括进度）会被丢弃，新任务最长等待
+兜底轮询间隔（30 秒）才被处理。
+"""
+
+import argparse
+import multiprocessing
+import os
+import signal
+import time
+
+from app.settings.config import settings
+
+# 子进程异常退出后重新拉起前的等待时间（秒）
+RESTART_DELAY = 5
+
+
+def _run_process(index: int, concurrency: int, drain_timeout: float, metrics_port: int):
+    """子进程入口：批量通道只在第一个进程中运行，指标端口按进程序号递增"""
+    import asyncio
+
+    from app.core.image_worker import run_worker
+
+    print(f"[Worker] Process {index} started (pid={os.getpid()}, concurrency={concurrency})")
+    asyncio.run(
+        run_worker(
+            concurrency,
+            drain_timeout,
+            with_batch_lane=index == 0,
+            metrics_port=metrics_port + index if metrics_port else None,
+        )
+    )
+    print(f"[Worker] Process {index} exited (pid={os.getpid()})")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Image generation worker",
+        epilog="API 与 Worker 都需设置 TASK_EVENTS_BACKEND=database，否则 Worker 的 WebSocket 推送会丢失，"
+        "新任务要等轮询（30 秒）才被处理",
+    )
+    parser.add_argument("--processes", type=int, default=settings.WORKER_PROCESSES, help="Worker 进程数")
+    parser.add_argument(
+        "--concurrency", type=int, default=settings.IMAGE_WORKER_CONCURRENCY, help="每个进程同时处理的任务数"
+    )
+    parser.add_argument(
+        "--drain-timeout",
+        type=float,
+        default=settings.IMAGE_WORKER_DRAIN_SECONDS,
+        help="停止时等待处理中任务完成的最长时间（秒）",
+    )
+    parser.add_argument(
+        "--metrics-port",
+        type=int,
+        default=settings.WORKER_METRICS_PORT,
+        help="指标端口，第 i 个进程监听 port + i（需设置 METRICS_TOKEN），0 为关闭",
+    )
+    args = parser.parse_args()
+
+    # spawn：子进程重新导入模块，各自生成独立的 WORKER_ID 和数据库连接
+    context = multiprocessing.get_context("spawn")
+    processes = {}
+    stopping = False
+
+    def spawn(index: int):
+        process = context.Process(
+            target=_run_process,
+            args=(index, args.concurrency, args.drain_timeout, args.metrics_port),
+            name=f"worker-{index}",
+        )
+        process.start()
+        processes[index] = process
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        print(f"[Worker] Received signal {signum}, stopping {len(processes)} processes...")
+        for process in processes.values():
+            if process.is_alive():
+                os.kill(process.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+
+    if settings.TASK_EVENTS_BACKEND.lower() != "database":
+        print("[Worker] Warning: TASK_EVENTS_BACKEND is not 'database', WebSocket pushes will not reach clients")
+    print(f"[Worker] Starting {args.processes} processes x {args.concurrency} concurrency")
+    for index in range(args.processes):
+        spawn(index)
+
+    while processes:
+        for index, process in list(processes.items()):
+            process.join(timeout=1)
+            if process.is_alive():
+                continue
+            del processes[index]
+            if not stopping:
+                print(f"[Worker] Process {index} exited with code {process.exitcode}, restarting...")
+                time.sleep(RESTART_DELAY)
+                if not stopping:
+                    spawn(index)
+
+    print("[Worker] All processes stopped")
+
+
+if __name__ == "__main__":
+    main()